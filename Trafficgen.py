@@ -1,10 +1,21 @@
 #!/usr/bin/env python3
 """FEATURES
 - Generates test traffic:modes: ICMP, HTTP, DNS, TCP, and UDP.
-- Logs each probe to CSV
+- Logs each probe to CSV (buffered; a background thread batches the writes)
 - Optional live packet capture to a .pcap file using tcpdump
+- Optional in-process analysis of the capture stream (protocol mix + ICMP RTT) while it runs
 - refuses non-local targets unless --allow-external
 -Tune sampling: --samples, --interval, --timeout, UDP payload size, and reply-wait.
+- Load mode (--rate/--workers): open-loop, rate-controlled probing on a worker pool
+  (DNS, TCP and UDP load run pipelined on one non-blocking socket engine instead, thousands of probes/s)
+- UDP probes reuse one socket with sequence-tagged payloads; --udp-sweep reports throughput vs payload size
+- Latency from perf_counter_ns deltas; samples on absolute deadlines (no drift); ICMP and UDP replies
+  timed by the kernel's receive timestamp (SO_TIMESTAMPNS) where available, see timing.py
+- Latency quantiles (p50..p99.9) from a fixed-memory sketch, optionally merged across runs (--sketch)
+- Target resolved once up front and pinned for the run (resolver.py); no probe times a DNS lookup.
+  Plain HTTP mode is the exception: requests resolves (and follows redirects) on every sample, so
+  its latency includes name resolution; use --http-pool for pinned, phase-timed HTTP
+- Optional live feed of every result into a running ts_store query API (--push URL)
 
 CLI USAGE:
   --mode {icmp,http,dns,tcp,udp}
@@ -13,15 +24,47 @@ CLI USAGE:
   --samples INT             (default: 10)
   --interval FLOAT seconds  (default: 1.0)
   --timeout INT ms          (default: 1000)
-  --output FILE.csv         (default: traffic_log.csv)
+  --output FILE.csv         (default: traffic_log.csv; *.rtlog writes the columnar format)
   --allow-external          (permit non-local targets)
   --udp-payload-size INT    (default: 128)
   --udp-await-reply         (wait for UDP response path)
+  --udp-sweep SIZES         (echo throughput/RTT per payload size, e.g. 64,512,1400,8192)
+  --udp-window INT          (datagrams in flight during a sweep, default: 32)
+  --tcp-ports LIST          (tcp mode: cycle over ports, e.g. 22,80,8000-8010)
   --dns-name NAME           (default: example.com)
+  --dns-names LIST|@FILE    (names to cycle through, e.g. for cache-miss testing)
+  --dns-cache-miss          (unique random label per query)
+  --dns-port INT            (default: 53, or 853 for tls)
+  --dns-transport {udp,tcp,tls}   --dns-fallback {tcp,tls,none}   (TC answers retried over fallback)
   --pcap-out FILE.pcap      (enable live capture)
   --iface IFACE             (override interface for capture)
-  --capture-filter BPF      (default: "icmp or icmp6")"""
-import argparse, csv, time, socket, sys, ipaddress, subprocess, os, signal, shutil
+  --capture-filter BPF      (default: "icmp or icmp6")
+  --http-pool               (HTTP keep-alive pool; logs connect/TLS/TTFB/total)
+  --http-pool-size INT      (default: 4)
+  --http-prewarm INT        (connections opened before the first sample)
+  --rate FLOAT              (load mode: target probes/sec, open-loop)
+  --workers INT             (load mode worker threads, default: 32)
+  --flush-interval FLOAT    (seconds between CSV flushes, default: 1.0)
+  --flush-rows INT          (flush after this many rows, default: 500)
+  --live-analysis           (analyze the capture while it runs, no re-read needed)
+  --summary-interval FLOAT  (seconds between live summaries, default: 5)
+  --sketch FILE.json        (merge this run's latency sketch into FILE under "<mode>:<target>")
+  --push URL                (POST results to a ts_store, e.g. http://127.0.0.1:8765)"""
+import argparse, itertools, time, socket, sys, ipaddress, subprocess, os, signal, shutil, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from http_pool import HttpPool, redirect_info
+from log_writer import open_writer
+from latency_sketch import LatencySketch, merge_into
+import dns_probe
+import probe_engine
+import resolver
+import socket_engine
+import timing
+import ts_store
+
+from pcap_parser import PcapStream
+from analyze_pcap import LiveAnalyzer
 
 try:
     from ping3 import ping
@@ -31,16 +74,13 @@ try:
     import requests
 except Exception:
     requests = None
-try:
-    import dns.resolver, dns.message, dns.query
-except Exception:
-    dns = None
 
 def is_local(addr):
     try:
         if addr.lower() in ("localhost", "::1", "127.0.0.1"):
             return True
-        ip = ipaddress.ip_address(socket.gethostbyname(addr))
+        # resolver.address() caches the lookup, so later calls (default_iface, probes) are free
+        ip = ipaddress.ip_address(resolver.address(addr).split("%")[0])
         return ip.is_private or ip.is_loopback
     except Exception:
         return False
@@ -55,11 +95,17 @@ def looks_like_ip(s):
 def now():
     return time.time()
 
-def icmp_mode(target, timeout):
+def icmp_mode(target, timeout, pinger=None):
+    if pinger:
+        try:
+            rtt = pinger.ping(target, timeout / 1000)
+        except OSError as e:
+            return ("error", str(e))
+        return ("ok", rtt) if rtt is not None else ("lost", None)
     if not ping:
         return ("error", "ping3 not installed")
     try:
-        rtt = ping(target, timeout=timeout / 1000)
+        rtt = ping(resolver.address(target, socket.AF_INET), timeout=timeout / 1000)
     except PermissionError:
         return ("error", "ICMP needs sudo on macOS")
     return ("ok", rtt * 1000) if rtt else ("lost", None)
@@ -68,100 +114,257 @@ def http_mode(target, timeout):
     if not requests:
         return ("error", "requests not installed")
     url = target if target.startswith("http") else "http://" + target
-    start = time.time()
+    start = time.perf_counter_ns()
     try:
         r = requests.head(url, timeout=timeout / 1000, allow_redirects=True)
         if 200 <= r.status_code < 400:
-            return ("ok", (time.time() - start) * 1000)
+            return ("ok", timing.elapsed_ms(start))
         return ("error", f"HTTP {r.status_code}")
     except Exception as e:
         return ("error", str(e))
 
-def dns_mode(target, timeout, qname):
-    if dns:
-        try:
-            q = dns.message.make_query(qname, dns.rdatatype.A)
-            start = time.time()
-            if is_local(target) or looks_like_ip(target):
-                dns.query.udp(q, target, timeout=timeout / 1000)
-            else:
-                res = dns.resolver.Resolver()
-                res.resolve(qname, "A", lifetime=timeout / 1000)
-            return ("ok", (time.time() - start) * 1000)
-        except Exception as e:
-            return ("error", str(e))
-    start = time.time()
+HTTP_POOL_COLUMNS = ["connect_ms", "tls_ms", "ttfb_ms", "total_ms", "reused"]
+
+def http_pool_mode(pool):
     try:
-        out = subprocess.run(
-            ["nslookup", qname, target],
-            capture_output=True,
-            text=True,
-            timeout=max(1, timeout / 1000),
-        )
-        rtt = (time.time() - start) * 1000
-        return ("ok", rtt) if out.returncode == 0 else ("error", out.stderr or out.stdout)
+        t = pool.request("HEAD")
     except Exception as e:
         return ("error", str(e))
+    timings = [t[c] for c in HTTP_POOL_COLUMNS[:-1]] + [int(t["reused"])]
+    if t["location"]:
+        # Redirect off the origin (or a loop): total_ms only covers the hops taken.
+        return ("redirect", redirect_info(t), *timings)
+    if 200 <= t["status"] < 400:
+        return ("ok", t["total_ms"], *timings)
+    return ("error", f"HTTP {t['status']}", *timings)
+
+def dns_mode(prober, qname):
+    # dns_probe.DnsProber: one reused socket, answers matched by transaction ID
+    return prober.query(qname)
 
 def tcp_mode(target, port, timeout):
-    start = time.time()
     try:
-        with socket.create_connection((target, port), timeout=timeout / 1000):
-            return ("ok", (time.time() - start) * 1000)
-    except Exception as e:
+        family, addr = resolver.resolve(target, port)
+    except OSError as e:
         return ("error", str(e))
-
-def udp_mode(target, port, payload, timeout, wait=False):
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.settimeout(max(0.01, timeout / 1000))
+    start = time.perf_counter_ns()
     try:
-        start = time.time()
-        s.sendto(payload, (target, port))
-        if wait:
-            try:
-                s.recvfrom(65535)
-                return ("ok-reply", (time.time() - start) * 1000)
-            except socket.timeout:
-                return ("no-reply", None)
-        return ("sent", None)
+        with socket.socket(family, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout / 1000)
+            s.connect(addr)
+            return ("ok", timing.elapsed_ms(start))
     except Exception as e:
         return ("error", str(e))
-    finally:
-        s.close()
 
-def log(writer, seq, mode, status, val):
-    writer.writerow([f"{now():.3f}", seq, mode, status, val])
+def udp_mode(prober, size, wait=False):
+    # socket_engine.UdpEchoProber: one persistent socket, replies matched by sequence number
+    return prober.query(size, wait)
+
+def log(writer, seq, mode, status, val, *extra):
+    # Raw values only; BufferedCsvWriter formats floats on its own thread.
+    writer.writerow([now(), seq, mode, status, val, *extra])
+
+def probe_record(target):
+    """Map a log() row onto probe_log columns (for --output *.rtlog)."""
+    def to_record(row):
+        ts, seq, mode, status, val, *extra = row
+        numeric = isinstance(val, float)
+        return dict(timestamp=ts, seq=seq, latency_ms=val if numeric else None, status=status,
+                    target=target, tag=mode, info="" if numeric or val is None else val, extra=extra)
+    return to_record
+
+def sketch_observer(sketch):
+    """Feed the latency of every logged row into sketch (runs on the writer thread)."""
+    def observe(batch):
+        sketch.update([row[4] for row in batch if isinstance(row[4], float)])
+    return observe
+
+def store_observer(url, target):
+    """POST every logged row to a running ts_store (runs on the writer thread)."""
+    def observe(batch):
+        rows = [(row[0], target, row[2], row[3], row[4] if isinstance(row[4], float) else None)
+                for row in batch]
+        try:
+            ts_store.push(url, rows)
+        except OSError as e:
+            print(f"Warning: push to {url} failed: {e}", file=sys.stderr)
+    return observe
+
+def extra_columns(args):
+    if args.mode == "udp" and args.udp_sweep:
+        return ["payload_bytes"]
+    return HTTP_POOL_COLUMNS if args.mode == "http" and args.http_pool else []
+
+def run_probe(args):
+    """Run one probe; returns (status, value, *extra_columns)."""
+    if args.mode == "icmp":
+        return icmp_mode(args.target, args.timeout, args.pinger)
+    if args.mode == "http":
+        if args.pool:
+            return http_pool_mode(args.pool)
+        return http_mode(args.target, args.timeout)
+    if args.mode == "dns":
+        return dns_mode(args.dns_prober, next(args.dns_names))
+    if args.mode == "tcp":
+        return tcp_mode(args.target, next(args.port_cycle), args.timeout)
+    if args.mode == "udp":
+        return udp_mode(args.udp_prober, args.udp_payload_size, wait=args.udp_await_reply)
+    return ("bad-mode", "")
+
+def run_load(args, w):
+    """
+    Open-loop load generation: probe i is due at t0 + i / rate no matter how
+    long earlier probes take, and runs on a worker thread. If the workers
+    fall behind, the start lag is added to the measured latency (latency is
+    counted from when the probe *should* have been sent), so slow responses
+    cannot hide themselves by delaying the next send (coordinated omission).
+    """
+    period = 1.0 / args.rate
+    lags = []
+
+    blank = [""] * len(extra_columns(args))
+
+    def job(i, due):
+        started = time.perf_counter()
+        lag = started - due
+        try:
+            st, v, *extra = run_probe(args)
+        except Exception as e:
+            st, v, extra = "exception", str(e), []
+        if isinstance(v, float):
+            v += lag * 1000
+        lags.append(lag * 1000)
+        log(w, i, args.mode, st, v, *(extra or blank), lag * 1000)
+        return started
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = []
+        t0 = time.perf_counter()
+        for i in range(args.samples):
+            due = t0 + i * period
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(job, i, due))
+        starts = sorted(f.result() for f in futures)
+    elapsed = time.perf_counter() - t0
+
+    span = starts[-1] - starts[0] if len(starts) > 1 else 0
+    achieved = (len(starts) - 1) / span if span > 0 else float(len(starts))
+    lags.sort()
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    print(f"Requested {args.rate:.1f} probes/s, achieved {achieved:.1f} probes/s "
+          f"({len(starts)} probes in {elapsed:.2f} s, {args.workers} workers)")
+    print(f"Start lag: mean {sum(lags) / max(1, len(lags)):.3f} ms, p99 {p99:.3f} ms")
+
+def run_pipelined(args, w):
+    """
+    Load mode for DNS, TCP and UDP: instead of a worker thread per probe,
+    every probe leaves one non-blocking engine at its open-loop slot and
+    results are matched as they arrive (DNS by transaction ID, UDP by
+    sequence number, TCP handshakes through a selector), so thousands of
+    probes/s need no threads. As in run_load, start lag is added to the
+    logged latency.
+    """
+    lags = []
+
+    def record(i, status, value, lag):
+        if isinstance(value, float):
+            value += lag
+        lags.append(lag)
+        log(w, i, args.mode, status, value, lag)
+
+    if args.mode == "dns":
+        sent, elapsed = args.dns_prober.run(
+            args.dns_names, args.samples, args.rate,
+            lambda i, _name, st, v, lag: record(i, st, v, lag))
+    elif args.mode == "tcp":
+        sent, elapsed = args.tcp_scanner.run(
+            [(args.target, port) for port in args.tcp_ports], args.samples, args.rate,
+            lambda i, _endpoint, st, v, lag: record(i, st, v, lag))
+    else:
+        sent, elapsed = args.udp_prober.run(args.samples, args.udp_payload_size, args.rate, record,
+                                            wait=args.udp_await_reply)
+    lags.sort()
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    print(f"Requested {args.rate:.1f} probes/s, achieved {sent / elapsed:.1f} probes/s "
+          f"({sent} probes in {elapsed:.2f} s, one socket engine)")
+    print(f"Start lag: mean {sum(lags) / max(1, len(lags)):.3f} ms, p99 {p99:.3f} ms")
+
+def run_udp_sweep(args, w):
+    """Echo --samples datagrams per payload size (--udp-window in flight); prints throughput vs size."""
+    seq = itertools.count()
+    rows = socket_engine.payload_sweep(
+        args.udp_prober, socket_engine.parse_ports(args.udp_sweep), args.samples, args.udp_window,
+        on_result=lambda size, _i, st, v: log(w, next(seq), args.mode, st, v, size))
+    print(socket_engine.format_sweep(rows))
 
 def default_iface(target):
     #when local, Wi-Fi usually en0
     return "lo0" if is_local(target) else "en0"
 
 class PcapCapture:
-    def __init__(self, iface, out_path, flt):
+    """
+    tcpdump wrapper. With live=True tcpdump writes the pcap stream to stdout
+    (-w -) and a reader thread parses it as it arrives, printing rolling
+    protocol/RTT summaries every summary_interval seconds; out_path is then
+    optional and only receives a copy of the stream.
+    """
+    def __init__(self, iface, out_path, flt, live=False, summary_interval=5.0):
         self.iface = iface
         self.out_path = out_path
         self.filter = flt
+        self.live = live
+        self.summary_interval = summary_interval
+        self.analyzer = None
         self.proc = None
+        self.reader = None
 
     def start(self):
         if not shutil.which("tcpdump"):
             print("Warning: tcpdump not found", file=sys.stderr)
             return
-        cmd = ["tcpdump", "-i", self.iface, "-s", "0", "-U", "-w", self.out_path, self.filter]
+        dest = "-" if self.live else self.out_path
+        cmd = ["tcpdump", "-i", self.iface, "-s", "0", "-U", "-w", dest, self.filter]
         # Needs root on macOS; if not sudo, tcpdump will likely fail
         try:
             self.proc = subprocess.Popen(
                 cmd,
-                stdout=subprocess.DEVNULL,
+                stdout=subprocess.PIPE if self.live else subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
                 preexec_fn=os.setsid
             )
+            if self.live:
+                self.analyzer = LiveAnalyzer()
+                self.reader = threading.Thread(target=self._read_stream, daemon=True)
+                self.reader.start()
             # ensure file is created
             time.sleep(0.3)
         except Exception as e:
             print(f"Failed to start tcpdump: {e}", file=sys.stderr)
             self.proc = None
 
+    def _read_stream(self):
+        stream = PcapStream()
+        copy = open(self.out_path, "wb") if self.out_path else None
+        next_report = time.monotonic() + self.summary_interval
+        try:
+            while True:
+                chunk = self.proc.stdout.read1(65536)
+                if not chunk:
+                    break
+                if copy:
+                    copy.write(chunk)
+                self.analyzer.feed(stream.feed(chunk))
+                if time.monotonic() >= next_report:
+                    print(f"[live] {self.analyzer.summary()}", file=sys.stderr)
+                    next_report = time.monotonic() + self.summary_interval
+        except Exception as e:
+            print(f"Live analysis stopped: {e}", file=sys.stderr)
+        finally:
+            if copy:
+                copy.close()
+
     def stop(self):
         if not self.proc:
             return
@@ -173,6 +376,10 @@ class PcapCapture:
                 os.killpg(os.getpgid(self.proc.pid), signal.SIGKILL)
         except Exception:
             pass
+        if self.reader:
+            self.reader.join(timeout=2.0)
+            print(f"[live] final: {self.analyzer.summary()}")
+            self.reader = None
         self.proc = None
 
 def main():
@@ -187,53 +394,161 @@ def main():
     p.add_argument("--allow-external", action="store_true")
     p.add_argument("--udp-payload-size", type=int, default=128)
     p.add_argument("--udp-await-reply", action="store_true")
+    p.add_argument("--udp-sweep", default=None, metavar="SIZES",
+                   help="echo --samples datagrams per payload size, e.g. 64,512,1400,8192")
+    p.add_argument("--udp-window", type=int, default=socket_engine.DEFAULT_WINDOW,
+                   help="datagrams in flight during --udp-sweep")
+    p.add_argument("--tcp-ports", default=None,
+                   help="tcp mode: cycle through these ports, e.g. 22,80,8000-8010 (overrides --port)")
     p.add_argument("--dns-name", default="example.com")
+    p.add_argument("--dns-names", default=None,
+                   help="query names to cycle through: a.com,b.org or @FILE (overrides --dns-name)")
+    p.add_argument("--dns-cache-miss", action="store_true",
+                   help="prefix every query with a unique random label (resolver cache misses)")
+    p.add_argument("--dns-port", type=int, default=None, help="default 53 (853 for tls)")
+    p.add_argument("--dns-transport", choices=dns_probe.TRANSPORTS, default="udp")
+    p.add_argument("--dns-fallback", choices=["tcp", "tls", "none"], default="tcp",
+                   help="retry truncated UDP answers over this transport")
     # New: pcap capture options
     p.add_argument("--pcap-out", default=None, help="write live capture to this pcap")
     p.add_argument("--iface", default=None, help="interface for tcpdump (default: lo0 if local else en0)")
     p.add_argument("--capture-filter", default="icmp or icmp6", help="tcpdump filter")
+    p.add_argument("--http-pool", action="store_true",
+                   help="http: reuse keep-alive connections and log connect/TLS/TTFB/total columns")
+    p.add_argument("--http-pool-size", type=int, default=4, help="max idle pooled connections")
+    p.add_argument("--http-prewarm", type=int, default=0,
+                   help="open this many pooled connections before the first sample")
+    p.add_argument("--rate", type=float, default=None,
+                   help="load mode: target probes/sec, open-loop (replaces --interval)")
+    p.add_argument("--workers", type=int, default=32, help="load mode: worker threads")
+    p.add_argument("--flush-interval", type=float, default=1.0,
+                   help="seconds between CSV flushes (rows are written by a background thread)")
+    p.add_argument("--flush-rows", type=int, default=500, help="flush after this many buffered rows")
+    p.add_argument("--live-analysis", action="store_true",
+                   help="parse the capture while tcpdump runs and print rolling protocol/RTT summaries")
+    p.add_argument("--summary-interval", type=float, default=5.0, help="seconds between live summaries")
+    p.add_argument("--sketch", default=None,
+                   help="merge this run's latency sketch into this JSON file (accumulates across runs)")
+    p.add_argument("--push", default=None,
+                   help="POST every result to a running ts_store API at this URL")
     args = p.parse_args()
 
     if not args.allow_external and not is_local(args.target):
         print(f"Refusing external address {args.target}")
         sys.exit(1)
+    # Resolve the target once, before the first sample, and probe that address for the
+    # whole run: no sample waits on (or is timed with) a DNS lookup. Plain HTTP mode
+    # (requests.head) does its own resolution per sample; HttpPool resolves through the
+    # pinned cache on its first connection.
+    if args.mode != "http":
+        family = socket.AF_INET if args.mode == "icmp" else socket.AF_UNSPEC
+        try:
+            print(f"Target {args.target} -> {resolver.address(args.target, family)}")
+        except OSError as e:
+            print(f"Cannot resolve {args.target}: {e}")
+            sys.exit(1)
+    resolver.default_cache.pin()
 
     # live capture if requested
     cap = None
-    if args.pcap_out:
+    if args.pcap_out or args.live_analysis:
         iface = args.iface or default_iface(args.target)
-        cap = PcapCapture(iface, args.pcap_out, args.capture_filter)
+        cap = PcapCapture(iface, args.pcap_out, args.capture_filter,
+                          live=args.live_analysis, summary_interval=args.summary_interval)
         cap.start()
 
+    args.pool = None
+    args.pinger = None
+    # One reusable, kernel-timestamped ICMP socket for sequential sampling; load mode keeps
+    # ping3 (a socket per probe), since concurrent workers cannot share one reply stream.
+    if args.mode == "icmp" and not args.rate and probe_engine.icmp_available():
+        args.pinger = probe_engine.IcmpPinger()
+    args.dns_prober = None
+    if args.mode == "dns":
+        # As before: an IP (or local) target is the nameserver to query; any other hostname
+        # is probed through the system resolver's nameserver.
+        server = args.target
+        if not (looks_like_ip(args.target) or is_local(args.target)):
+            try:
+                server = dns_probe.system_nameserver()
+            except ValueError as e:
+                print(f"{args.target} is not a nameserver address and {e}")
+                sys.exit(1)
+            print(f"DNS: {args.target} is not a nameserver address, querying system nameserver {server}")
+        args.dns_prober = dns_probe.DnsProber(server, args.dns_port, args.timeout / 1000,
+                                              args.dns_transport, args.dns_fallback)
+        args.dns_names = dns_probe.qnames(dns_probe.load_names(args.dns_names or args.dns_name),
+                                          args.dns_cache_miss)
+    args.tcp_scanner = args.udp_prober = None
+    if args.mode == "tcp":
+        args.tcp_ports = socket_engine.parse_ports(args.tcp_ports or args.port)
+        args.port_cycle = itertools.cycle(args.tcp_ports)
+        if args.rate:
+            args.tcp_scanner = socket_engine.TcpConnectScanner(args.timeout / 1000)
+    if args.mode == "udp":
+        args.udp_prober = socket_engine.UdpEchoProber(args.target, args.port, args.timeout / 1000)
+    if args.mode == "http" and args.http_pool:
+        args.pool = HttpPool(args.target, size=args.http_pool_size, timeout=args.timeout / 1000)
+        if args.http_prewarm:
+            try:
+                args.pool.prewarm(args.http_prewarm)
+            except Exception as e:
+                print(f"Warning: HTTP pre-warm failed: {e}", file=sys.stderr)
+    extra = extra_columns(args)
+    blank = [""] * len(extra)
+    header = ["timestamp", "seq", "mode", "status", "latency_ms_or_info"] + extra
+    sweep = args.mode == "udp" and args.udp_sweep
+    if args.rate and not sweep:
+        header.append("start_lag_ms")
+    formats = [".3f", None, None, None] + [".3f"] * (len(header) - 4)
+    sketch = LatencySketch()
+    observers = [sketch_observer(sketch)]
+    if args.push:
+        observers.append(store_observer(args.push, args.target))
+
+    def observe(batch):
+        for fn in observers:
+            fn(batch)
+
     try:
-        with open(args.output, "w", newline="") as f:
-            w = csv.writer(f)
-            w.writerow(["timestamp", "seq", "mode", "status", "latency_ms_or_info"])
-            for i in range(args.samples):
-                try:
-                    if args.mode == "icmp":
-                        st, v = icmp_mode(args.target, args.timeout)
-                    elif args.mode == "http":
-                        st, v = http_mode(args.target, args.timeout)
-                    elif args.mode == "dns":
-                        st, v = dns_mode(args.target, args.timeout, args.dns_name)
-                    elif args.mode == "tcp":
-                        st, v = tcp_mode(args.target, args.port, args.timeout)
-                    elif args.mode == "udp":
-                        data = b"A" * max(1, args.udp_payload_size)
-                        st, v = udp_mode(args.target, args.port, data, args.timeout, wait=args.udp_await_reply)
-                    else:
-                        st, v = ("bad-mode", "")
-                    log(w, i, args.mode, st, f"{v:.3f}" if isinstance(v, float) else v)
-                except Exception as e:
-                    log(w, i, args.mode, "exception", str(e))
-                f.flush()
-                if i < args.samples - 1:
-                    time.sleep(args.interval)
+        with open_writer(args.output, header, formats=formats,
+                         to_record=probe_record(args.target), extra=header[5:],
+                         flush_interval=args.flush_interval, flush_rows=args.flush_rows,
+                         observe=observe) as w:
+            if sweep:
+                run_udp_sweep(args, w)
+            elif args.rate and args.mode in ("dns", "tcp", "udp"):
+                run_pipelined(args, w)
+            elif args.rate:
+                run_load(args, w)
+            else:
+                schedule = timing.Schedule(args.interval)
+                for i in range(args.samples):
+                    schedule.wait()
+                    try:
+                        st, v, *cols = run_probe(args)
+                        log(w, i, args.mode, st, v, *(cols or blank))
+                    except Exception as e:
+                        log(w, i, args.mode, "exception", str(e), *blank)
     finally:
         if cap:
             cap.stop()
+        if args.pool:
+            args.pool.close()
+        if args.pinger:
+            args.pinger.close()
+        if args.dns_prober:
+            args.dns_prober.close()
+        if args.tcp_scanner:
+            args.tcp_scanner.close()
+        if args.udp_prober:
+            args.udp_prober.close()
 
+    print(f"Latency: {sketch.format()}")
+    if args.sketch:
+        merged = merge_into(args.sketch, {f"{args.mode}:{args.target}": sketch})
+        print(f"Sketch {args.sketch} [{args.mode}:{args.target}]: "
+              f"{merged[f'{args.mode}:{args.target}'].format()}")
     print(f"Done. Output: {args.output}")
     if args.pcap_out:
         print(f"PCAP saved: {args.pcap_out}")
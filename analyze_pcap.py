@@ -6,88 +6,721 @@ transport-layer protocols, and computes ICMP RTTs by matching Echo Requests
 and Echo Replies. This replicates the logic of the `ping` utility, but using
 packet timestamps directly from the network capture.
 
+Engines:
+    • native   – reads the capture bytes directly with pcap_parser.py (default)
+    • mmap     – same decoder, but memory-maps the file and walks it in place
+                 with no per-packet copies (flat memory use on huge captures)
+    • parallel – splits the file into record-aligned shards and runs the
+                 mmap scan for each one in a process pool (--jobs N)
+    • columnar – mmap scan into typed columns, then vectorized NumPy
+                 request/reply matching (rtt_stats.py) with loss,
+                 duplicate and retransmission accounting
+    • flows    – mmap scan that also keeps a bounded TCP flow table:
+                 per-flow bytes, retransmissions, out-of-order segments,
+                 handshake RTT (SYN -> SYN/ACK) and throughput, replacing
+                 a separate `tshark -Y tcp.analysis.retransmission` run
+    • pyshark  – the original PyShark/tshark loop, kept for comparison
+
 The output includes:
     • A protocol distribution summary (TCP / UDP / ICMP / Unknown)
     • An average RTT calculation based solely on observed packets
+    • RTT distribution statistics (mean, p50/p90/p99, jitter, and loss
+      for the columnar engine)
+    • Throughput of the chosen engine in packets/sec
+
+Packets without a timestamp (pcapng Simple Packet Blocks) are counted by
+protocol but cannot be timed, so every engine leaves them out of RTT
+matching and the flow table and reports how many there were.
+
+With --sketch FILE.json the RTTs of each capture are merged into a latency
+sketch (latency_sketch.py) named after the capture, so p50..p99.9 can be
+accumulated over many captures without keeping their RTTs.
+
+Usage:
+    python3 analyze_pcap.py [capture.pcap] [--engine {native,mmap,parallel,columnar,flows,pyshark}] [--jobs N]
+                            [--sketch FILE.json] [--max-flows N] [--flow-idle-timeout SECONDS] [--top-flows N]
+    python3 analyze_pcap.py --benchmark [capture.pcap ...]
 """
 
-import pyshark
-from collections import Counter
+import argparse
+import glob
+import heapq
+import os
+import sys
+import time
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from latency_sketch import LatencySketch, merge_into
+import pcap_parser
+import rtt_stats
+
+try:
+	import pyshark
+except Exception:
+	pyshark = None
+try:
+	import numpy as np
+except Exception:
+	np = None
 
 
 # -----------------------------------------------------------
-# Load the capture file produced by tcpdump.
-# This reads packets lazily, so large files do not overwhelm memory.
-# You can change the .pcap file it analyzes by changing the cap variable.
+# Default capture file produced by tcpdump.
+# You can change the .pcap file it analyzes on the command line.
 # capture_cs_server.pcap, capture_google.pcap, capture_localhost.pcap
 # -----------------------------------------------------------
-cap = pyshark.FileCapture("capture_cs_server.pcap")
-# Tracks frequency of each protocol observed in the capture.
-protocol_counts = Counter()
-# ICMP tracking tables:
-#  requests[(id, seq)] = timestamp of ICMP Echo Request
-#  rtts = list of computed round-trip times (milliseconds)
-requests = {}
-rtts = []
-
-# -----------------------------------------------------------
-# Iterate through every packet in the capture file.
-# PyShark decodes packet layers in real time as they are accessed.
-# -----------------------------------------------------------
-for pkt in cap:
-	# ------------------------------
-	# Determine the packet's protocol.
-	# ------------------------------
-	# If the packet has a well-defined transport layer (TCP/UDP/ICMP),
-	# PyShark exposes it as `pkt.transport_layer`.
-	#
-	# Many packets (ARP, ICMP, encapsulated or encrypted traffic)
-	# do not have traditional transport-layer headers. In those cases,
-	# we fall back to `pkt.highest_layer`, which is PyShark's best guess
-	# at the primary protocol.
-	# ------------------------------
-	protocol_counts[pkt.transport_layer if hasattr(pkt, "transport_layer") else pkt.highest_layer] += 1
+DEFAULT_CAPTURE = "capture_cs_server.pcap"
+
+
+def analyze_pyshark(path):
+	"""Original PyShark loop. Returns (protocol_counts, rtts)."""
+	if not pyshark:
+		raise RuntimeError("pyshark not installed")
+	# This reads packets lazily, so large files do not overwhelm memory.
+	cap = pyshark.FileCapture(path)
+	# Tracks frequency of each protocol observed in the capture.
+	protocol_counts = Counter()
+	# ICMP tracking tables:
+	#  requests[(id, seq)] = timestamp of ICMP Echo Request
+	#  rtts = list of computed round-trip times (milliseconds)
+	requests = {}
+	rtts = []
 
 	# -----------------------------------------------------------
-	# ICMP RTT COMPUTATION
-	# -----------------------------------------------------------
-	# Only proceed if this packet contains an ICMP layer.
-	# (PyShark allows `"ICMP" in pkt` as a convenient layer check.)
+	# Iterate through every packet in the capture file.
+	# PyShark decodes packet layers in real time as they are accessed.
 	# -----------------------------------------------------------
-	if "ICMP" in pkt:
-		# ICMP type field:
-		#   8 = Echo Request
-		#   0 = Echo Reply
-		icmp_type = int(pkt.icmp.type)
-		# ICMP Echo packets contain an (id, seq) pair that uniquely identifies
-		# the request–reply relationship. These fields allow us to match them.
-		ident = getattr(pkt.icmp, "id", None)
-		seq = getattr(pkt.icmp, "seq", None)
-		key = (ident, seq)
-		# Timestamp of when this packet was sniffed (float, seconds).
-		t = pkt.sniff_time.timestamp()
+	for pkt in cap:
+		# ------------------------------
+		# Determine the packet's protocol.
+		# ------------------------------
+		# If the packet has a well-defined transport layer (TCP/UDP/ICMP),
+		# PyShark exposes it as `pkt.transport_layer`.
+		#
+		# Many packets (ARP, ICMP, encapsulated or encrypted traffic)
+		# do not have traditional transport-layer headers. In those cases,
+		# we fall back to `pkt.highest_layer`, which is PyShark's best guess
+		# at the primary protocol.
+		# ------------------------------
+		protocol_counts[pkt.transport_layer if hasattr(pkt, "transport_layer") else pkt.highest_layer] += 1
 
 		# -----------------------------------------------------------
-		# If packet is an Echo Request (type 8), record its timestamp.
-		# -----------------------------------------------------------
-		if icmp_type == 8:
-			requests[key] = t
+		# ICMP RTT COMPUTATION
 		# -----------------------------------------------------------
-		# If packet is an Echo Reply (type 0), compute delta time.
+		# Only proceed if this packet contains an ICMP layer.
+		# (PyShark allows `"ICMP" in pkt` as a convenient layer check.)
 		# -----------------------------------------------------------
-		elif icmp_type == 0:
+		if "ICMP" in pkt:
+			# ICMP type field:
+			#   8 = Echo Request
+			#   0 = Echo Reply
+			icmp_type = int(pkt.icmp.type)
+			# ICMP Echo packets contain an (id, seq) pair that uniquely identifies
+			# the request–reply relationship. These fields allow us to match them.
+			ident = getattr(pkt.icmp, "id", None)
+			seq = getattr(pkt.icmp, "seq", None)
+			key = (ident, seq)
+			# Timestamp of when this packet was sniffed (float, seconds).
+			t = pkt.sniff_time.timestamp()
+
+			# -----------------------------------------------------------
+			# If packet is an Echo Request (type 8), record its timestamp.
+			# -----------------------------------------------------------
+			if icmp_type == 8:
+				requests[key] = t
+			# -----------------------------------------------------------
+			# If packet is an Echo Reply (type 0), compute delta time.
+			# -----------------------------------------------------------
+			elif icmp_type == 0:
+				if key in requests:
+					# RTT = (reply_time - request_time)
+					# Convert seconds to milliseconds.
+					rtts.append((t- requests[key]) * 1000)
+	cap.close()
+	return protocol_counts, rtts
+
+
+def analyze_packets(packets):
+	"""
+	Count protocols and match ICMP echoes over an iterable of
+	pcap_parser (timestamp, protocol, icmp_type, icmp_id, icmp_seq) tuples.
+	Returns (protocol_counts, rtts).
+	"""
+	protocol_counts = Counter()
+	requests = {}
+	rtts = []
+	for t, proto, icmp_type, ident, seq in packets:
+		protocol_counts[proto] += 1
+		if icmp_type is None or t is None:
+			continue
+		key = (ident, seq)
+		if icmp_type in pcap_parser.ICMP_ECHO_REQUEST:
+			requests[key] = t
+		elif icmp_type in pcap_parser.ICMP_ECHO_REPLY:
 			if key in requests:
-				# RTT = (reply_time - request_time)
-				# Convert seconds to milliseconds.
-				rtts.append((t- requests[key]) * 1000)
+				rtts.append((t - requests[key]) * 1000)
+	return protocol_counts, rtts
+
 
+def analyze_native(path):
+	"""
+	Same analysis as analyze_pyshark, but the headers are decoded straight
+	from the file bytes by pcap_parser. Returns (protocol_counts, rtts).
+	"""
+	return analyze_packets(pcap_parser.iter_packets(path))
+
+
+def analyze_mmap(path):
+	"""Zero-copy variant of analyze_native using pcap_parser.scan_mmap."""
+	return analyze_packets(pcap_parser.scan_mmap(path))
+
+
+# -----------------------------------------------------------
+# PARALLEL (SHARDED) ANALYSIS
+# -----------------------------------------------------------
+# The capture is cut into byte ranges on record boundaries and each range
+# is scanned in its own process. A shard cannot match a reply whose request
+# lives in an earlier shard, so it returns those replies unmatched together
+# with the last request it saw per (id, seq). Merging the shards in file
+# order then reproduces the single-pass result exactly:
+#   • protocol Counters are simply added
+#   • each shard's unmatched replies are matched against the requests
+#     carried over from all previous shards, then that shard's own
+#     requests overwrite the carried table (latest request wins, as in
+#     the sequential loop)
 # -----------------------------------------------------------
-# OUTPUT RESULTS
+def analyze_shard(path, start, stop, state=None):
+	"""
+	Scan one byte range. Returns (protocol_counts, rtts, unmatched_replies,
+	last_requests) where unmatched_replies is an ordered list of
+	((id, seq), timestamp) and last_requests maps (id, seq) -> timestamp.
+	"""
+	protocol_counts = Counter()
+	requests = {}
+	rtts = []
+	unmatched = []
+	for t, proto, icmp_type, ident, seq in pcap_parser.scan_mmap(path, start, stop, state=state):
+		protocol_counts[proto] += 1
+		if icmp_type is None or t is None:
+			continue
+		key = (ident, seq)
+		if icmp_type in pcap_parser.ICMP_ECHO_REQUEST:
+			requests[key] = t
+		elif icmp_type in pcap_parser.ICMP_ECHO_REPLY:
+			if key in requests:
+				rtts.append((t - requests[key]) * 1000)
+			else:
+				unmatched.append((key, t))
+	return protocol_counts, rtts, unmatched, requests
+
+
+def merge_shards(shards):
+	"""Combine analyze_shard results (in file order) into (counts, rtts)."""
+	protocol_counts = Counter()
+	carried = {}
+	rtts = []
+	for counts, shard_rtts, unmatched, last_requests in shards:
+		protocol_counts.update(counts)
+		for key, t in unmatched:
+			if key in carried:
+				rtts.append((t - carried[key]) * 1000)
+		rtts.extend(shard_rtts)
+		carried.update(last_requests)
+	return protocol_counts, rtts
+
+
+def analyze_parallel(path, jobs=None):
+	"""Sharded mmap analysis across `jobs` processes (default: all cores)."""
+	jobs = jobs or os.cpu_count() or 1
+	ranges = pcap_parser.shard_ranges(path, jobs)
+	if len(ranges) <= 1:
+		return analyze_mmap(path)
+	with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+		futures = [pool.submit(analyze_shard, path, start, stop, state)
+		           for start, stop, state in ranges]
+		return merge_shards(f.result() for f in futures)
+
+
+# -----------------------------------------------------------
+# COLUMNAR (NumPy) RTT MATCHING
+# -----------------------------------------------------------
+# Instead of matching inside the packet loop, collect every echo packet
+# into compact typed columns (file position, timestamp, reply flag, key,
+# payload CRC) and let rtt_stats.match_echoes join them in one vectorized
+# pass.
+# -----------------------------------------------------------
+def analyze_columnar(path, max_rtt=rtt_stats.DEFAULT_MAX_RTT):
+	"""Returns (protocol_counts, rtt_stats.EchoMatch)."""
+	if np is None:
+		raise RuntimeError("numpy not installed")
+	protocol_counts = Counter()
+	index, ts, is_reply, keys, payloads = array("q"), array("d"), array("b"), array("q"), array("q")
+	for i, (t, proto, icmp_type, ident, seq, crc) in enumerate(
+			pcap_parser.scan_mmap(path, decode=pcap_parser.decode_echo)):
+		protocol_counts[proto] += 1
+		if icmp_type is None or t is None:
+			continue
+		if icmp_type in pcap_parser.ICMP_ECHO_REQUEST:
+			is_reply.append(0)
+		elif icmp_type in pcap_parser.ICMP_ECHO_REPLY:
+			is_reply.append(1)
+		else:
+			continue
+		index.append(i)
+		ts.append(t)
+		keys.append(rtt_stats.echo_key(ident, seq))
+		payloads.append(crc)
+	# array.array exposes the buffer protocol, so these are zero-copy views.
+	echo = rtt_stats.match_echoes(
+		np.frombuffer(index, dtype=np.int64),
+		np.frombuffer(ts, dtype=np.float64),
+		np.frombuffer(is_reply, dtype=np.int8).astype(bool),
+		np.frombuffer(keys, dtype=np.int64),
+		max_rtt=max_rtt,
+		payloads=np.frombuffer(payloads, dtype=np.int64),
+	)
+	return protocol_counts, echo
+
+
+def _columnar_engine(path):
+	protocol_counts, echo = analyze_columnar(path)
+	return protocol_counts, echo.rtts
+
+
+# -----------------------------------------------------------
+# LIVE (STREAMING) ANALYSIS
+# -----------------------------------------------------------
+# Used by Trafficgen.py --live-analysis: packets arrive from tcpdump's
+# stdout through pcap_parser.PcapStream while the capture is running, so
+# the state has to stay bounded. Answered requests are dropped at once,
+# unanswered ones once they are older than max_rtt, and only the latest
+# `window` RTTs are kept for the rolling summary. Quantiles over the whole
+# run come from a fixed-size LatencySketch.
+# -----------------------------------------------------------
+class LiveAnalyzer:
+	def __init__(self, window=1000, max_rtt=rtt_stats.DEFAULT_MAX_RTT):
+		self.protocol_counts = Counter()
+		self.requests = {}
+		self.recent = deque(maxlen=window)
+		self.sketch = LatencySketch()
+		self.sent = 0
+		self.answered = 0
+		self.max_rtt = max_rtt
+		self._pruned_at = None
+
+	def feed(self, packets):
+		for t, proto, icmp_type, ident, seq in packets:
+			self.protocol_counts[proto] += 1
+			if icmp_type is None or t is None:
+				continue
+			key = (ident, seq)
+			if icmp_type in pcap_parser.ICMP_ECHO_REQUEST:
+				self.requests[key] = t
+				self.sent += 1
+			elif icmp_type in pcap_parser.ICMP_ECHO_REPLY:
+				sent_at = self.requests.pop(key, None)
+				if sent_at is not None:
+					rtt = (t - sent_at) * 1000
+					self.recent.append(rtt)
+					self.sketch.add(rtt)
+					self.answered += 1
+			if self._pruned_at is None:
+				self._pruned_at = t
+			elif t - self._pruned_at > self.max_rtt:
+				cutoff = t - self.max_rtt
+				self.requests = {k: v for k, v in self.requests.items() if v >= cutoff}
+				self._pruned_at = t
+
+	def summary(self):
+		"""One-line rolling summary of everything seen so far."""
+		counts = ", ".join(f"{k or 'Unknown'}={v}" for k, v in self.protocol_counts.most_common())
+		rtt = rtt_stats.format_summary(rtt_stats.summarize(list(self.recent)))
+		total = " ".join(f"{k}={v:.3f}" for k, v in self.sketch.summary().items() if k.startswith("p"))
+		return (f"packets: {sum(self.protocol_counts.values())} ({counts or 'none'}) | "
+				f"RTT(last {len(self.recent)}): {rtt} | RTT(all): {total or 'none'} | "
+				f"echo answered {self.answered}/{self.sent}")
+
+
 # -----------------------------------------------------------
-print("Protocol counts: ", protocol_counts)
+# TCP FLOW ANALYSIS
+# -----------------------------------------------------------
+# One pass with pcap_parser.decode_segment. Each TCP segment is looked up
+# in a flow table keyed by its 5-tuple packed into a single int: both
+# endpoints as (address << 16 | port), the lower one in the high bits, so
+# the two directions of a connection share one entry (the protocol is
+# always TCP). Per direction a flow counts packets and payload bytes and
+# tracks the next expected sequence number:
+#   • a segment starting below it repeats data already seen; it is
+#     out-of-order when it arrives within OOO_THRESHOLD (or the flow's
+#     handshake RTT, once known) of the last in-order segment, and a
+#     retransmission otherwise (Wireshark's tcp.analysis rule)
+#   • keep-alives (at most one byte at next - 1) are not counted
+#   • the handshake RTT is SYN -> SYN/ACK, from the last SYN, so a
+#     retransmitted SYN does not inflate it
+# The table stays bounded on long captures. Flows are kept in
+# least-recently-active order; closed ones (FIN both ways, or RST) leave
+# after `linger` seconds of capture time, idle ones after `idle_timeout`,
+# and beyond `max_flows` the least recently active flow is evicted. An
+# evicted flow is folded into the totals and its handshake RTT into a
+# LatencySketch; only the `top` largest flows are kept in full.
+# -----------------------------------------------------------
+OOO_THRESHOLD = 0.003           # s, Wireshark's default out-of-order window
+FLOW_IDLE_TIMEOUT = 300.0       # s of capture time
+FLOW_LINGER = 2.0               # s a closed flow waits for its last ACKs
+MAX_FLOWS = 65536
+TOP_FLOWS = 10
+
+_SEQ_MASK = 0xFFFFFFFF
+_SEQ_HALF = 0x80000000          # sequence numbers compare modulo 2**32
+
+
+def format_endpoint(endpoint):
+	addr, port = endpoint >> 16, endpoint & 0xFFFF
+	text = pcap_parser.format_addr(addr)
+	return f"[{text}]:{port}" if addr & pcap_parser.IPV6_TAG else f"{text}:{port}"
+
+
+class Flow:
+	"""One TCP connection; list fields are [client -> server, server -> client]."""
+
+	__slots__ = ("client", "server", "first", "last", "packets", "bytes", "nxt", "advanced",
+				 "retrans", "retrans_bytes", "ooo", "syn_at", "rtt", "fin", "rst")
+
+	def __init__(self, client, server, t):
+		self.client = client        # endpoints as address << 16 | port
+		self.server = server
+		self.first = self.last = t
+		self.packets = [0, 0]
+		self.bytes = [0, 0]         # TCP payload
+		self.nxt = [None, None]     # next expected sequence number
+		self.advanced = [t, t]      # when nxt last moved forward
+		self.retrans = [0, 0]
+		self.retrans_bytes = [0, 0]
+		self.ooo = [0, 0]
+		self.syn_at = None
+		self.rtt = None             # handshake RTT, s
+		self.fin = [False, False]
+		self.rst = False
+
+	def closed(self):
+		return self.rst or (self.fin[0] and self.fin[1])
+
+	def summary(self):
+		duration = self.last - self.first
+		total = self.bytes[0] + self.bytes[1]
+		return {
+			"client": format_endpoint(self.client),
+			"server": format_endpoint(self.server),
+			"packets": self.packets[0] + self.packets[1],
+			"bytes": total,
+			"bytes_up": self.bytes[0],
+			"bytes_down": self.bytes[1],
+			"retransmissions": self.retrans[0] + self.retrans[1],
+			"retransmitted_bytes": self.retrans_bytes[0] + self.retrans_bytes[1],
+			"out_of_order": self.ooo[0] + self.ooo[1],
+			"handshake_rtt_ms": self.rtt * 1000 if self.rtt is not None else None,
+			"duration_s": duration,
+			"throughput_mbps": total * 8 / duration / 1e6 if duration > 0 else None,
+			"state": "reset" if self.rst else "closed" if self.closed() else "open",
+		}
+
+
+class FlowTable:
+	def __init__(self, max_flows=MAX_FLOWS, idle_timeout=FLOW_IDLE_TIMEOUT, linger=FLOW_LINGER,
+				 top=TOP_FLOWS):
+		self.flows = OrderedDict()
+		self.max_flows = max_flows
+		self.idle_timeout = idle_timeout
+		self.linger = linger
+		self.top = top
+		self.largest = []           # min-heap of (bytes, n, summary)
+		self.handshake = LatencySketch()
+		self.totals = Counter()
+		self.evicted = Counter()    # closed / idle / overflow
+		self.peak = 0
+		self._retired = 0
+		self._swept = None
+
+	def add(self, t, segment):
+		"""Account one pcap_parser.decode_segment() segment seen at time t."""
+		src, dst, sport, dport, seq, _ack, flags, payload = segment
+		a = (src << 16) | sport
+		b = (dst << 16) | dport
+		key = (a << 145) | b if a < b else (b << 145) | a
+		flows = self.flows
+		flow = flows.get(key)
+		if flow is None:
+			# A SYN/ACK first means the SYN was not captured: its receiver is the client.
+			# Mid-connection, the endpoint with the higher (ephemeral) port is taken as the client.
+			if flags & pcap_parser.TCP_SYN:
+				flow = Flow(b, a, t) if flags & pcap_parser.TCP_ACK else Flow(a, b, t)
+			else:
+				flow = Flow(a, b, t) if sport >= dport else Flow(b, a, t)
+			flows[key] = flow
+			if len(flows) > self.max_flows:
+				self._retire(next(iter(flows)), "overflow")
+			elif len(flows) > self.peak:
+				self.peak = len(flows)
+		else:
+			flows.move_to_end(key)
+		d = 0 if a == flow.client else 1
+		flow.last = t
+		flow.packets[d] += 1
+		flow.bytes[d] += payload
+
+		if flags & pcap_parser.TCP_SYN:
+			if not flags & pcap_parser.TCP_ACK:
+				flow.syn_at = t
+			elif d == 1 and flow.rtt is None and flow.syn_at is not None:
+				flow.rtt = t - flow.syn_at
+		if flags & pcap_parser.TCP_FIN:
+			flow.fin[d] = True
+		if flags & pcap_parser.TCP_RST:
+			flow.rst = True
+
+		# SYN and FIN each take one sequence number.
+		length = payload + (flags & pcap_parser.TCP_SYN and 1) + (flags & pcap_parser.TCP_FIN)
+		if length:
+			nxt = flow.nxt[d]
+			end = (seq + length) & _SEQ_MASK
+			if nxt is None or (seq - nxt) & _SEQ_MASK < _SEQ_HALF:
+				flow.nxt[d] = end
+				flow.advanced[d] = t
+			elif payload <= 1 and length == payload and (nxt - seq) & _SEQ_MASK == 1:
+				pass        # keep-alive
+			else:
+				threshold = flow.rtt if flow.rtt is not None else OOO_THRESHOLD
+				if t - flow.advanced[d] < threshold:
+					flow.ooo[d] += 1
+				else:
+					flow.retrans[d] += 1
+					flow.retrans_bytes[d] += payload
+				if 0 < (end - nxt) & _SEQ_MASK < _SEQ_HALF:
+					flow.nxt[d] = end       # partly new data
+
+		if self._swept is None:
+			self._swept = t
+		elif t - self._swept >= 1.0:
+			self.expire(t)
+
+	def expire(self, now):
+		"""Retire closed flows older than linger and idle ones; the oldest are at the front."""
+		self._swept = now
+		flows = self.flows
+		while flows:
+			key, flow = next(iter(flows.items()))
+			idle = now - flow.last
+			if flow.closed() and idle >= self.linger:
+				self._retire(key, "closed")
+			elif idle >= self.idle_timeout:
+				self._retire(key, "idle")
+			else:
+				break
+
+	def _retire(self, key, reason=None):
+		flow = self.flows.pop(key)
+		if reason:
+			self.evicted[reason] += 1
+		totals = self.totals
+		totals["flows"] += 1
+		totals["packets"] += flow.packets[0] + flow.packets[1]
+		total = flow.bytes[0] + flow.bytes[1]
+		totals["bytes"] += total
+		totals["retransmissions"] += flow.retrans[0] + flow.retrans[1]
+		totals["retransmitted_bytes"] += flow.retrans_bytes[0] + flow.retrans_bytes[1]
+		totals["out_of_order"] += flow.ooo[0] + flow.ooo[1]
+		if flow.rtt is not None:
+			self.handshake.add(flow.rtt * 1000)
+		self._retired += 1
+		# Summaries (address formatting) only for flows that make the top list.
+		if len(self.largest) < self.top:
+			heapq.heappush(self.largest, (total, self._retired, flow.summary()))
+		elif self.top and total > self.largest[0][0]:
+			heapq.heapreplace(self.largest, (total, self._retired, flow.summary()))
+
+	def finish(self):
+		"""Fold the flows still open at the end of the capture into the totals."""
+		while self.flows:
+			self._retire(next(iter(self.flows)))
+		return self
+
+	def top_flows(self):
+		return [s for _b, _n, s in sorted(self.largest, reverse=True)]
+
+	def format(self):
+		t = self.totals
+		lines = [f"TCP flows: {t['flows']} ({t['packets']} packets, {t['bytes']} payload bytes, "
+				 f"peak {self.peak} in the table)"]
+		share = f", {t['retransmitted_bytes'] / t['bytes']:.2%} of payload" if t["bytes"] else ""
+		lines.append(f"Retransmissions: {t['retransmissions']} ({t['retransmitted_bytes']} bytes{share})  "
+					 f"Out-of-order: {t['out_of_order']}")
+		lines.append(f"Handshake RTT (SYN -> SYN/ACK): {self.handshake.format()}")
+		if self.evicted:
+			lines.append(f"Evicted: {self.evicted['closed']} closed, {self.evicted['idle']} idle, "
+						 f"{self.evicted['overflow']} over the {self.max_flows}-flow cap")
+		for s in self.top_flows():
+			rtt = f"{s['handshake_rtt_ms']:.3f} ms" if s["handshake_rtt_ms"] is not None else "-"
+			rate = f"{s['throughput_mbps']:.3f} Mbit/s" if s["throughput_mbps"] is not None else "-"
+			lines.append(f"  {s['client']} -> {s['server']}  {s['bytes']} B ({s['packets']} pkts)  "
+						 f"{rate}  rtt {rtt}  retrans {s['retransmissions']}  "
+						 f"ooo {s['out_of_order']}  {s['duration_s']:.3f} s  {s['state']}")
+		return "\n".join(lines)
+
+
+def analyze_flows(path, max_flows=MAX_FLOWS, idle_timeout=FLOW_IDLE_TIMEOUT, top=TOP_FLOWS):
+	"""
+	Protocol counts, ICMP RTTs and the TCP flow table from one mmap scan.
+	Returns (protocol_counts, rtts, FlowTable).
+	"""
+	table = FlowTable(max_flows, idle_timeout, top=top)
+	add = table.add
+
+	def packets():
+		for t, proto, icmp_type, ident, seq, segment in pcap_parser.scan_mmap(
+				path, decode=pcap_parser.decode_segment):
+			if segment is not None and t is not None:
+				add(t, segment)
+			yield t, proto, icmp_type, ident, seq
+
+	protocol_counts, rtts = analyze_packets(packets())
+	return protocol_counts, rtts, table.finish()
+
+
+def _flows_engine(path):
+	protocol_counts, rtts, _table = analyze_flows(path)
+	return protocol_counts, rtts
+
+
+ENGINES = {
+	"native": analyze_native,
+	"mmap": analyze_mmap,
+	"parallel": analyze_parallel,
+	"columnar": _columnar_engine,
+	"flows": _flows_engine,
+	"pyshark": analyze_pyshark,
+}
+
+
+def peak_rss_mb():
+	"""Peak resident set size of this process in MB (None if unavailable)."""
+	try:
+		import resource
+	except ImportError:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# ru_maxrss is bytes on macOS and kilobytes on Linux.
+	return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def print_results(protocol_counts, rtts, elapsed=None, echo=None):
+	# -----------------------------------------------------------
+	# OUTPUT RESULTS
+	# -----------------------------------------------------------
+	print("Protocol counts: ", protocol_counts)
+
+	if len(rtts):
+		print("Average RTT (ms): ", sum(rtts)/len(rtts))
+		# Retransmitted copies are not separate probes, so they do not count towards loss.
+		probes = echo.sent - echo.retransmits if echo is not None else None
+		print("RTT distribution: ", rtt_stats.format_summary(rtt_stats.summarize(rtts, probes)))
+		if echo is not None:
+			print(f"Echo requests sent: {echo.sent}  answered: {echo.answered}")
+		if echo is not None and (echo.duplicates or echo.retransmits):
+			print(f"Duplicate replies: {echo.duplicates}  Retransmitted requests: {echo.retransmits}")
+	else:
+		print("No RTTs computed")
+
+	if elapsed:
+		packets = sum(protocol_counts.values())
+		print(f"Throughput: {packets} packets in {elapsed:.3f} s ({packets / elapsed:.0f} pkts/s)")
+
+
+# -----------------------------------------------------------
+# BENCHMARK: native parser vs PyShark on the same captures
+# -----------------------------------------------------------
+def benchmark(paths, repeat=3):
+	for path in paths:
+		print(f"== {path}")
+		results = {}
+		for name, fn in ENGINES.items():
+			if name == "pyshark" and not pyshark:
+				print(f"  {name:8s} skipped (pyshark not installed)")
+				continue
+			if name == "columnar" and np is None:
+				print(f"  {name:8s} skipped (numpy not installed)")
+				continue
+			best = None
+			for _ in range(repeat):
+				start = time.perf_counter()
+				counts, rtts = fn(path)
+				elapsed = time.perf_counter() - start
+				best = elapsed if best is None else min(best, elapsed)
+			packets = sum(counts.values())
+			results[name] = (counts, rtts)
+			print(f"  {name:8s} {best * 1000:10.2f} ms  {packets / best:12.0f} pkts/s  "
+				  f"({packets} packets, {len(rtts)} RTTs)")
+		if len(results) > 1:
+			counts, rtts = results["native"]
+			same = all(c == counts and len(r) == len(rtts) for c, r in results.values())
+			print(f"  results match: {same}")
+	rss = peak_rss_mb()
+	if rss is not None:
+		print(f"Peak RSS: {rss:.1f} MB")
+
+
+def main():
+	p = argparse.ArgumentParser()
+	p.add_argument("pcap", nargs="*", default=None)
+	p.add_argument("--engine", choices=sorted(ENGINES), default="native")
+	p.add_argument("--jobs", type=int, default=None,
+				   help="worker processes for --engine parallel (default: CPU count)")
+	p.add_argument("--max-rtt", type=float, default=rtt_stats.DEFAULT_MAX_RTT,
+				   help="--engine columnar: oldest request (s) a reply may match")
+	p.add_argument("--max-flows", type=int, default=MAX_FLOWS,
+				   help="--engine flows: flows kept in the table before the least recently active is evicted")
+	p.add_argument("--flow-idle-timeout", type=float, default=FLOW_IDLE_TIMEOUT,
+				   help="--engine flows: seconds of capture time before an idle flow is evicted")
+	p.add_argument("--top-flows", type=int, default=TOP_FLOWS,
+				   help="--engine flows: largest flows listed in full")
+	p.add_argument("--sketch", default=None,
+				   help="merge each capture's RTTs into this JSON sketch file (keyed by file name)")
+	p.add_argument("--benchmark", action="store_true",
+				   help="time every engine (default: all bundled capture_*.pcap files)")
+	args = p.parse_args()
+
+	if args.benchmark:
+		benchmark(args.pcap or sorted(glob.glob("capture_*.pcap")))
+		return
+
+	for path in args.pcap or [DEFAULT_CAPTURE]:
+		start = time.perf_counter()
+		echo = flows = None
+		if args.engine == "parallel":
+			protocol_counts, rtts = analyze_parallel(path, args.jobs)
+		elif args.engine == "columnar":
+			protocol_counts, echo = analyze_columnar(path, args.max_rtt)
+			rtts = echo.rtts
+		elif args.engine == "flows":
+			protocol_counts, rtts, flows = analyze_flows(path, args.max_flows, args.flow_idle_timeout,
+														 args.top_flows)
+		else:
+			protocol_counts, rtts = ENGINES[args.engine](path)
+		print_results(protocol_counts, rtts, time.perf_counter() - start, echo)
+		untimed = pcap_parser.count_untimed(path) if args.engine != "pyshark" else 0
+		if untimed:
+			print(f"Untimed packets: {untimed} (pcapng Simple Packet Blocks have no timestamp; "
+				  f"counted by protocol but left out of RTTs and flows)")
+		if flows is not None:
+			print(flows.format())
+		if args.sketch:
+			sketch = LatencySketch()
+			sketch.update(rtts)
+			name = os.path.basename(path)
+			merged = merge_into(args.sketch, {name: sketch})
+			print(f"Sketch {args.sketch} [{name}]: {merged[name].format()}")
 
-if rtts:
-	print("Average RTT (ms): ", sum(rtts)/len(rtts))
-else:
-	print("No RTTs computed")
 
+if __name__ == "__main__":
+	main()
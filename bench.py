@@ -0,0 +1,504 @@
+"""
+bench.py
+--------
+Reproducible benchmarks for the project's own cost, written as JSON so
+two versions can be compared.
+
+Three suites:
+
+    probe   – per-probe client overhead of every Trafficgen.py mode against
+              loopback stand-in servers started here (TCP listener, UDP
+              echo, tiny HTTP server, DNS responder; ICMP pings 127.0.0.1
+              when raw sockets are allowed). For each mode: wall time per
+              call, the latency the probe itself reported, and the
+              difference (client overhead), in µs. Plus pipelined DNS
+              and TCP-connect load and a UDP payload-size sweep
+              (dns_probe.py, socket_engine.py).
+    parser  – analyze_pcap.py engines on synthetic Ethernet captures
+              (ICMP echo pairs plus TCP/UDP filler) of each --pcap-sizes,
+              in packets/s.
+    csv     – load + aggregate time for trace.py (raw pandas path, cold and
+              warm aggregate store) and plot_rtt.py (load, decimation,
+              percentile band) on synthetic CSVs of each --csv-sizes.
+
+Every result is {"suite", "name", "size", "metric", "value", "unit",
+"better"}; --compare OLD.json prints the change of each metric against an
+earlier run and exits 1 if any got worse by more than --tolerance.
+
+Synthetic data goes into a temporary directory (kept with --keep-data),
+so the tracked csv_files/ and graphs/ are never touched.
+
+Usage:
+    python3 bench.py [--suite {probe,parser,csv} ...] [--probes N] [--repeat N]
+                     [--pcap-sizes N ...] [--csv-sizes N ...] [--output JSON]
+                     [--compare OLD.json] [--tolerance FRACTION] [--keep-data DIR]
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import pandas as pd
+except Exception:
+    pd = None
+
+SUITES = ("probe", "parser", "csv")
+DEFAULT_OUTPUT = "bench_output.txt"
+DEFAULT_PROBES = 200
+DEFAULT_REPEAT = 3
+DEFAULT_PCAP_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_CSV_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_TOLERANCE = 0.2
+
+
+def result(suite, name, size, metric, value, unit, better="lower"):
+    return {"suite": suite, "name": name, "size": size, "metric": metric,
+            "value": value, "unit": unit, "better": better}
+
+
+def best_of(fn, repeat):
+    """Smallest wall time (s) of `repeat` calls, and the last return value."""
+    best, out = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+
+def _percentile(sorted_vals, q):
+    return sorted_vals[min(len(sorted_vals) - 1, int(q / 100 * len(sorted_vals)))]
+
+
+# -----------------------------------------------------------
+# LOOPBACK STAND-IN SERVERS
+# -----------------------------------------------------------
+class LoopbackServers:
+    """TCP listener, UDP echo, HTTP and DNS servers on 127.0.0.1 ephemeral ports."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._threads = []
+
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tcp.bind(("127.0.0.1", 0))
+        self.tcp.listen(1024)
+        self._spawn(self._tcp_loop)
+
+        self.udp = self._udp_socket()
+        self._spawn(self._echo_loop, self.udp, lambda data: data)
+
+        self.dns = self._udp_socket()
+        self._spawn(self._echo_loop, self.dns, self._dns_answer)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_GET = do_HEAD
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.http.daemon_threads = True
+        self._spawn(self.http.serve_forever, 0.05)
+
+    def _spawn(self, fn, *args):
+        t = threading.Thread(target=fn, args=args, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    @staticmethod
+    def _udp_socket():
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Large enough for a full sweep window of 8 KB datagrams, so the
+        # stand-in does not drop what the client is being measured on.
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        s.bind(("127.0.0.1", 0))
+        s.settimeout(0.2)
+        return s
+
+    def _tcp_loop(self):
+        self.tcp.settimeout(0.2)
+        while not self._stop.is_set():
+            try:
+                conn, _ = self.tcp.accept()
+            except OSError:
+                continue
+            conn.close()
+
+    def _echo_loop(self, sock, answer):
+        while not self._stop.is_set():
+            try:
+                data, addr = sock.recvfrom(65535)
+            except OSError:
+                continue
+            reply = answer(data)
+            if reply:
+                sock.sendto(reply, addr)
+
+    @staticmethod
+    def _dns_answer(query):
+        """Empty NOERROR response to any query: same ID and question, QR set."""
+        if len(query) < 12:
+            return None
+        ident, flags = struct.unpack("!HH", query[:4])
+        return struct.pack("!HHHHHH", ident, 0x8180 | (flags & 0x0100), 1, 0, 0, 0) + query[12:]
+
+    def port(self, name):
+        sock = {"tcp": self.tcp, "udp": self.udp, "dns": self.dns}.get(name)
+        return sock.getsockname()[1] if sock else self.http.server_address[1]
+
+    def close(self):
+        self._stop.set()
+        self.http.shutdown()
+        for t in self._threads:
+            t.join(timeout=1)
+        for s in (self.tcp, self.udp, self.dns):
+            s.close()
+        self.http.server_close()
+
+
+# -----------------------------------------------------------
+# SUITE: PER-PROBE OVERHEAD
+# -----------------------------------------------------------
+def bench_probes(probes):
+    import Trafficgen
+    from dns_probe import DnsProber
+    from http_pool import HttpPool
+    from socket_engine import UdpEchoProber
+
+    servers = LoopbackServers()
+    pool = HttpPool(f"http://127.0.0.1:{servers.port('http')}", size=1, timeout=1.0)
+    prober = DnsProber("127.0.0.1", servers.port("dns"), timeout=1.0)
+    udp = UdpEchoProber("127.0.0.1", servers.port("udp"), timeout=1.0)
+    calls = {
+        "icmp": lambda: Trafficgen.icmp_mode("127.0.0.1", 1000),
+        "tcp": lambda: Trafficgen.tcp_mode("127.0.0.1", servers.port("tcp"), 1000),
+        "udp": lambda: Trafficgen.udp_mode(udp, 64, wait=True),
+        "http": lambda: Trafficgen.http_mode(f"127.0.0.1:{servers.port('http')}", 1000),
+        "http-pool": lambda: Trafficgen.http_pool_mode(pool),
+        "dns": lambda: Trafficgen.dns_mode(prober, "example.com"),
+    }
+    out = []
+    try:
+        for mode, call in calls.items():
+            status, _value, *_ = call()
+            if status not in ("ok", "ok-reply"):
+                print(f"  probe {mode:9s} skipped ({status}: {_value})")
+                continue
+            wall, overhead = [], []
+            for _ in range(probes):
+                start = time.perf_counter_ns()
+                status, value, *_ = call()
+                elapsed = (time.perf_counter_ns() - start) / 1000
+                wall.append(elapsed)
+                if isinstance(value, float):
+                    overhead.append(elapsed - value * 1000)
+            wall.sort()
+            overhead.sort()
+            mean = sum(wall) / len(wall)
+            print(f"  probe {mode:9s} wall mean={mean:9.1f} µs p50={_percentile(wall, 50):9.1f} "
+                  f"p99={_percentile(wall, 99):9.1f}"
+                  + (f"  overhead p50={_percentile(overhead, 50):8.1f} µs" if overhead else ""))
+            out += [result("probe", mode, probes, "wall_mean", mean, "us"),
+                    result("probe", mode, probes, "wall_p50", _percentile(wall, 50), "us"),
+                    result("probe", mode, probes, "wall_p99", _percentile(wall, 99), "us")]
+            if overhead:
+                out.append(result("probe", mode, probes, "overhead_p50",
+                                  _percentile(overhead, 50), "us"))
+        out += bench_dns_load(prober, probes * 50)
+        out += bench_tcp_load(servers.port("tcp"), probes * 10)
+        out += bench_udp_sweep(udp, probes * 10)
+    finally:
+        pool.close()
+        prober.close()
+        udp.close()
+        servers.close()
+    return out
+
+
+def bench_dns_load(prober, count, qps=5000):
+    """Pipelined DNS load (Trafficgen --mode dns --rate) against the stand-in responder."""
+    from dns_probe import qnames
+
+    answered = []
+    sent, elapsed = prober.run(qnames(["example.com"]), count, qps,
+                               lambda i, n, status, v, lag: answered.append(status == "ok"))
+    print(f"  probe dns-load  {sent / elapsed:9.0f} q/s requested {qps}, "
+          f"answered {sum(answered)}/{sent}")
+    return [result("probe", "dns-load", count, "queries_per_s", sent / elapsed, "q/s", better="higher"),
+            result("probe", "dns-load", count, "answered", sum(answered) / sent, "fraction",
+                   better="higher")]
+
+
+def bench_tcp_load(port, count, rate=2000):
+    """Pipelined TCP handshakes (Trafficgen --mode tcp --rate) against the stand-in listener."""
+    from socket_engine import TcpConnectScanner
+
+    ok = []
+    with TcpConnectScanner(timeout=1.0) as scanner:
+        sent, elapsed = scanner.run([("127.0.0.1", port)], count, rate,
+                                    lambda i, e, status, v, lag: ok.append(status == "ok"))
+    print(f"  probe tcp-load  {sent / elapsed:9.0f} conn/s requested {rate}, ok {sum(ok)}/{sent}")
+    return [result("probe", "tcp-load", count, "connects_per_s", sent / elapsed, "conn/s",
+                   better="higher"),
+            result("probe", "tcp-load", count, "ok", sum(ok) / sent, "fraction", better="higher")]
+
+
+def bench_udp_sweep(prober, count, sizes=(64, 512, 1400, 8192)):
+    """UDP echo throughput per payload size (Trafficgen --udp-sweep)."""
+    from socket_engine import payload_sweep
+
+    out = []
+    for row in payload_sweep(prober, sizes, count):
+        print(f"  probe udp-sweep {row['size']:6d} B {row['msgs_per_s']:9.0f} msgs/s "
+              f"{row['mb_per_s']:8.2f} MB/s p50={row['p50']:.3f} ms")
+        out.append(result("probe", f"udp-sweep-{row['size']}", count, "msgs_per_s",
+                          row["msgs_per_s"], "msgs/s", better="higher"))
+    return out
+
+
+# -----------------------------------------------------------
+# SUITE: PCAP PARSER THROUGHPUT
+# -----------------------------------------------------------
+RECORD = 16 + 14 + 20 + 20      # pcap record header + Ethernet + IPv4 + 20-byte L4 area
+
+
+def write_synthetic_pcap(path, packets):
+    """
+    Ethernet capture of `packets` fixed-size records: 80% ICMP echo
+    request/reply pairs (0.5 ms apart), 10% TCP, 10% UDP.
+    """
+    if np is None:
+        raise RuntimeError("numpy not installed")
+    rec = np.zeros((packets, RECORD), dtype=np.uint8)
+    ip = bytes.fromhex("4500002800004000") + b"\x40\x01" + b"\x00\x00" \
+        + socket.inet_aton("127.0.0.1") * 2
+    template = struct.pack("<IIII", 0, 0, RECORD - 16, RECORD - 16) \
+        + b"\x00" * 12 + b"\x08\x00" + ip + b"\x00" * 20
+    rec[:] = np.frombuffer(template, dtype=np.uint8)
+
+    i = np.arange(packets)
+    ts_us = i.astype(np.int64) * 500
+    rec[:, 0:4] = (ts_us // 1_000_000).astype("<u4").view(np.uint8).reshape(-1, 4)
+    rec[:, 4:8] = (ts_us % 1_000_000).astype("<u4").view(np.uint8).reshape(-1, 4)
+
+    kind = i % 10                     # 0..7 ICMP, 8 TCP, 9 UDP
+    proto = np.where(kind == 8, 6, np.where(kind == 9, 17, 1)).astype(np.uint8)
+    rec[:, 16 + 14 + 9] = proto
+    l4 = 16 + 14 + 20
+    icmp = kind < 8
+    rec[icmp, l4] = np.where(kind[icmp] % 2 == 0, 8, 0)               # request, then reply
+    seq = (i // 2).astype(">u2").view(np.uint8).reshape(-1, 2)
+    rec[icmp, l4 + 4:l4 + 6] = [0x12, 0x34]
+    rec[icmp, l4 + 6:l4 + 8] = seq[icmp]
+    rec[kind == 8, l4 + 12] = 0x50                                    # TCP data offset
+    rec[kind == 9, l4 + 5] = 20                                       # UDP length
+
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        f.write(rec.tobytes())
+
+
+def bench_parser(sizes, workdir, repeat):
+    import analyze_pcap
+
+    engines = {k: v for k, v in analyze_pcap.ENGINES.items() if k != "pyshark"}
+    if np is None:
+        engines.pop("columnar", None)
+    out = []
+    for size in sizes:
+        path = os.path.join(workdir, f"synthetic_{size}.pcap")
+        write_synthetic_pcap(path, size)
+        for name, fn in engines.items():
+            elapsed, (counts, rtts) = best_of(lambda: fn(path), repeat)
+            packets = sum(counts.values())
+            print(f"  parser {name:9s} {size:>10d} pkts {elapsed * 1000:10.1f} ms "
+                  f"{packets / elapsed:12.0f} pkts/s ({len(rtts)} RTTs)")
+            out += [result("parser", name, size, "seconds", elapsed, "s"),
+                    result("parser", name, size, "packets_per_s", packets / elapsed, "pkts/s",
+                           better="higher")]
+        os.remove(path)
+    return out
+
+
+# -----------------------------------------------------------
+# SUITE: CSV LOAD + AGGREGATE
+# -----------------------------------------------------------
+CONDITIONS = ("baseline", "VPN1(france)", "VPN2(newyork)")
+
+
+def write_synthetic_combined(path, rows, sites=100):
+    """collector.py-style website,rtt,condition rows, ~3% NaN."""
+    rng = np.random.default_rng(1)
+    site = np.array([f"site{k}.example" for k in range(sites)])[np.arange(rows) % sites]
+    cond = np.array(CONDITIONS)[(np.arange(rows) // sites) % len(CONDITIONS)]
+    rtt = rng.lognormal(3.5, 0.6, rows)
+    rtt[rng.random(rows) < 0.03] = np.nan
+    pd.DataFrame({"website": site, "rtt": rtt, "condition": cond}).to_csv(path, index=False)
+
+
+def write_synthetic_ping(path, rows):
+    """Trafficgen-style timestamp,seq,mode,status,latency_ms_or_info rows."""
+    rng = np.random.default_rng(2)
+    lost = rng.random(rows) < 0.01
+    pd.DataFrame({
+        "timestamp": 1.7e9 + np.arange(rows) * 0.01,
+        "seq": np.arange(rows),
+        "mode": "icmp",
+        "status": np.where(lost, "lost", "ok"),
+        "latency_ms_or_info": np.where(lost, np.nan, rng.gamma(2.0, 5.0, rows)),
+    }).to_csv(path, index=False)
+
+
+def bench_csv(sizes, workdir, repeat):
+    if np is None or pd is None:
+        print("  csv suite skipped (numpy/pandas not installed)")
+        return []
+    import plot_rtt
+    import rtt_aggregates
+    import trace
+
+    out = []
+    for size in sizes:
+        combined = os.path.join(workdir, f"combined_{size}.csv")
+        write_synthetic_combined(combined, size)
+
+        def raw():
+            df = trace.load_rtts(combined)
+            return trace.site_condition_matrix(df), trace.condition_summary(df)
+
+        def cold():
+            agg = rtt_aggregates.store_path(combined)
+            if os.path.exists(agg):
+                os.remove(agg)
+            return trace.aggregate_tables(combined)
+
+        timings = {"trace_raw": best_of(raw, repeat)[0],
+                   "trace_store_cold": best_of(cold, repeat)[0],
+                   "trace_store_warm": best_of(lambda: trace.aggregate_tables(combined), repeat)[0]}
+
+        ping_csv = os.path.join(workdir, f"ping_{size}.csv")
+        write_synthetic_ping(ping_csv, size)
+        timings["plot_load"], series = best_of(lambda: plot_rtt.load_ping_csv(ping_csv), repeat)
+        timings["plot_minmax"] = best_of(lambda: plot_rtt.decimate(series, method="minmax"), repeat)[0]
+        timings["plot_lttb"] = best_of(lambda: plot_rtt.decimate(series, method="lttb"), repeat)[0]
+        timings["plot_band"] = best_of(lambda: plot_rtt.rolling_band(series), repeat)[0]
+
+        for name, elapsed in timings.items():
+            print(f"  csv    {name:17s} {size:>10d} rows {elapsed * 1000:10.1f} ms")
+            out.append(result("csv", name, size, "seconds", elapsed, "s"))
+        for path in (combined, rtt_aggregates.store_path(combined), ping_csv):
+            if os.path.exists(path):
+                os.remove(path)
+    return out
+
+
+# -----------------------------------------------------------
+# OUTPUT AND COMPARISON
+# -----------------------------------------------------------
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"time": time.time(), "commit": commit or None, "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": getattr(np, "__version__", None), "pandas": getattr(pd, "__version__", None)}
+
+
+def compare(old_path, results, tolerance):
+    """Print each metric's change against an earlier run; returns the regressions."""
+    with open(old_path) as f:
+        old = {(r["suite"], r["name"], r["size"], r["metric"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"== compared with {old_path}")
+    for r in results:
+        prev = old.get((r["suite"], r["name"], r["size"], r["metric"]))
+        if prev is None or not prev["value"]:
+            continue
+        change = r["value"] / prev["value"] - 1
+        worse = change > tolerance if r["better"] == "lower" else change < -tolerance
+        if worse:
+            regressions.append(r)
+        print(f"  {r['suite']:6s} {r['name']:17s} {r['size']:>10d} {r['metric']:13s} "
+              f"{prev['value']:12.4g} -> {r['value']:12.4g} {r['unit']:6s} {change:+7.1%}"
+              + ("  REGRESSION" if worse else ""))
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description="benchmark probe overhead and analysis throughput")
+    p.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    p.add_argument("--probes", type=int, default=DEFAULT_PROBES, help="probes per mode")
+    p.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                   help="parser/csv: best of this many runs")
+    p.add_argument("--pcap-sizes", type=int, nargs="+", default=list(DEFAULT_PCAP_SIZES))
+    p.add_argument("--csv-sizes", type=int, nargs="+", default=list(DEFAULT_CSV_SIZES))
+    p.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON results file")
+    p.add_argument("--compare", default=None, help="earlier JSON results to compare against")
+    p.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                   help="relative change counted as a regression (default 0.2)")
+    p.add_argument("--keep-data", default=None, help="write synthetic data here and keep it")
+    args = p.parse_args()
+
+    tmp = None
+    if args.keep_data:
+        os.makedirs(args.keep_data, exist_ok=True)
+        workdir = args.keep_data
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="bench-")
+        workdir = tmp.name
+
+    results = []
+    try:
+        if "probe" in args.suite:
+            print("== probe overhead")
+            results += bench_probes(args.probes)
+        if "parser" in args.suite:
+            print("== pcap parser")
+            results += bench_parser(args.pcap_sizes, workdir, args.repeat)
+        if "csv" in args.suite:
+            print("== csv load + aggregate")
+            results += bench_csv(args.csv_sizes, workdir, args.repeat)
+    finally:
+        if tmp:
+            tmp.cleanup()
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=1)
+    print(f"Results: {args.output} ({len(results)} metrics)")
+
+    if args.compare:
+        regressions = compare(args.compare, results, args.tolerance)
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
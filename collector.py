@@ -10,12 +10,51 @@ This script is typically used together with:
     • vpn_on / vpn_off tests
     • plotting scripts for multi-host RTT comparison
     • multi-condition RTT analysis (baseline vs VPN)
+
+All websites are probed concurrently (probe_engine.py). The default
+"batch" engine pings every site through a single ICMP socket; the "async"
+engine gives each site its own asyncio task. Both fall back to TCP connect
+time when ICMP sockets are not permitted or a host ignores pings.
+
+Every individual probe RTT (not just the per-site average) is also fed
+into a latency sketch for the condition (latency_sketch.py). --sketch
+merges it into a JSON file keyed by condition, so p50/p99/p99.9 for a
+condition accumulate over any number of sweeps.
+
+CSV output is append-only: the header is written once, when the file is
+created, and after each sweep the new rows are folded into the aggregate
+store next to the CSV (rtt_aggregates.py), which trace.py reads instead of
+re-scanning the whole history.
+
+Site names are resolved once per run, concurrently and before the first
+probe, through the shared cache in resolver.py; the ICMP sweep and the
+TCP fallback both take their addresses from it, so no probe waits on (or
+is timed with) a DNS lookup.
+
+--push URL sends every probe (and every lost probe) to a running
+ts_store query API, e.g. a monitor.py --serve instance, so a sweep shows
+up on the same live dashboards.
+
+Usage:
+    python3 collector.py [--condition LABEL] [--output CSV] [--method {auto,icmp,tcp}]
+                         [--engine {batch,async}] [--concurrency N] [--count N]
+                         [--timeout SECONDS] [--rate PROBES_PER_SEC] [--sketch JSON]
+                         [--push URL]
 """
 
-import subprocess
+import argparse
 import csv
+import os
+import socket
 import time
 
+from latency_sketch import LatencySketch, merge_into
+import probe_engine
+import probe_log
+import resolver
+import rtt_aggregates
+import ts_store
+
 # -----------------------------------------------------------
 # LIST OF WEBSITES TO TEST
 # -----------------------------------------------------------
@@ -74,39 +113,106 @@ output_csv = "csv_files/combined_rtt_clean.csv"
 condition = "VPN1(france)"
 
 # -----------------------------------------------------------
-# MAIN RTT COLLECTION LOOP
+# MAIN RTT COLLECTION
 # -----------------------------------------------------------
-with open(output_csv, "a", newline="") as f:
-    writer = csv.writer(f)
-    # Write header for readability
-    writer.writerow(["website", "rtt", "condition"])
-
-    for site in websites:
-        print(f"Pinging {site}...")
-
-        result = subprocess.run(
-            ["python3", "ping3", site],
-            capture_output=True,
-            text=True
-        )
-
-        rtts = []
-        for line in result.stdout.splitlines():
-            parts = line.strip().split()
-            if len(parts) == 2:
-                try:
-                    rtts.append(float(parts[1]))
-                except:
-                    pass
-
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--condition", default=condition, help="label stored with every row")
+    p.add_argument("--output", default=output_csv, help="CSV, or *.rtlog for the columnar format")
+    p.add_argument("--method", choices=["auto", "icmp", "tcp"], default="auto",
+                   help="auto = ICMP, falling back to TCP connect time")
+    p.add_argument("--engine", choices=["batch", "async"], default="batch",
+                   help="batch = one ICMP socket for all sites, async = one task per site")
+    p.add_argument("--rate", type=float, default=None,
+                   help="batch engine: cap on ICMP probes sent per second")
+    p.add_argument("--concurrency", type=int, default=probe_engine.DEFAULT_CONCURRENCY,
+                   help="hosts probed at the same time")
+    p.add_argument("--count", type=int, default=probe_engine.DEFAULT_COUNT, help="probes per host")
+    p.add_argument("--timeout", type=float, default=probe_engine.DEFAULT_TIMEOUT,
+                   help="seconds to wait for each probe")
+    p.add_argument("--port", type=int, default=probe_engine.DEFAULT_TCP_PORT,
+                   help="TCP port for the connect fallback")
+    p.add_argument("--sketch", default=None,
+                   help="merge every probe RTT into this JSON sketch file, keyed by condition")
+    p.add_argument("--push", default=None,
+                   help="POST every probe result to a running ts_store API at this URL")
+    args = p.parse_args()
+
+    sketch = LatencySketch()
+
+    def report(site, method, rtts):
+        sketch.update(rtts)
         if rtts:
-            avg_rtt = sum(rtts) / len(rtts)
-            writer.writerow([site, avg_rtt, condition])
+            print(f"{site}: {sum(rtts) / len(rtts):.2f} ms ({method}, {len(rtts)}/{args.count})")
         else:
             print(f"WARNING: No RTT recorded for {site}")
-            writer.writerow([site, "NaN", condition])
-
-        time.sleep(0.2)
-
-print("DONE: Clean RTT saved.")
 
+    start = time.perf_counter()
+    # Every site is resolved once, concurrently, before probing starts; the sweep (and its
+    # TCP fallback) then take addresses from the shared cache instead of the resolver.
+    resolved = resolver.prefetch(websites, socket.AF_INET, args.concurrency)
+    print(f"Resolved {sum(a is not None for a in resolved.values())}/{len(websites)} sites "
+          f"in {time.perf_counter() - start:.2f} s")
+    options = dict(
+        method=args.method,
+        concurrency=args.concurrency,
+        count=args.count,
+        timeout=args.timeout,
+        port=args.port,
+        on_result=report,
+    )
+    if args.engine == "batch":
+        results = probe_engine.sweep_batch(websites, rate=args.rate, **options)
+    else:
+        results = probe_engine.sweep(websites, **options)
+
+    if probe_log.is_probe_log(args.output):
+        # Columnar log: one appended chunk per sweep, website in `target`,
+        # condition in `tag` and the probe method in `info`.
+        now = time.time()
+        with probe_log.ProbeLogWriter(args.output) as log:
+            for seq, site in enumerate(websites):
+                method, rtts = results[site]
+                log.append(now, seq, sum(rtts) / len(rtts) if rtts else None,
+                           "ok" if rtts else "lost", target=site, tag=args.condition, info=method)
+    else:
+        new_file = not os.path.exists(args.output) or os.path.getsize(args.output) == 0
+        with open(args.output, "a", newline="") as f:
+            writer = csv.writer(f)
+            # Header only once, so the file stays one clean table
+            if new_file:
+                writer.writerow(["website", "rtt", "condition"])
+            # Rows keep the order of the websites list, not completion order.
+            for site in websites:
+                _method, rtts = results[site]
+                if rtts:
+                    writer.writerow([site, sum(rtts) / len(rtts), args.condition])
+                else:
+                    writer.writerow([site, "NaN", args.condition])
+        store = rtt_aggregates.open_for_csv(args.output)
+        print(f"Aggregates updated: {store.path} ({len(store.cells)} website/condition cells)")
+
+    if args.push:
+        now = time.time()
+        rows = []
+        for site in websites:
+            method, rtts = results[site]
+            rows += [(now, site, method, "ok", rtt) for rtt in rtts]
+            rows += [(now, site, method, "lost", None)] * (args.count - len(rtts))
+        try:
+            ts_store.push(args.push, rows)
+            print(f"Pushed {len(rows)} probe results to {args.push}")
+        except OSError as e:
+            print(f"WARNING: push to {args.push} failed: {e}")
+
+    print(f"Swept {len(websites)} sites in {time.perf_counter() - start:.1f} s "
+          f"(resolver: {resolver.default_cache.format()})")
+    print(f"RTT over all probes: {sketch.format()}")
+    if args.sketch:
+        merged = merge_into(args.sketch, {args.condition: sketch})
+        print(f"{args.condition} across runs ({args.sketch}): {merged[args.condition].format()}")
+    print("DONE: Clean RTT saved.")
+
+
+if __name__ == "__main__":
+    main()
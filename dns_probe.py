@@ -0,0 +1,402 @@
+"""
+dns_probe.py
+------------
+In-process DNS prober: one reused UDP socket, many queries in flight.
+
+Trafficgen's dns_mode used to build a dnspython message and socket for
+every sample, and without dnspython it forked `nslookup` per query.
+DnsProber instead:
+
+    • builds queries itself (header + one question; no dnspython needed)
+      and sends them from a single connected UDP socket,
+    • keeps any number of queries in flight, matching each response by
+      transaction ID *and* question section, so late or stray replies
+      are never credited to the wrong query,
+    • retries a truncated (TC) response over TCP or DNS-over-TLS
+      (`fallback`), or uses TCP/DoT for every query (`transport`) over one
+      persistent connection,
+    • runs an open-loop load at a target QPS (run()): query i is sent at
+      t0 + i / qps whatever the responses are doing, and the time a send
+      slipped behind its slot is reported as start lag.
+
+Status per query: "ok" (NOERROR or NXDOMAIN; a random cache-miss name is
+expected to be NXDOMAIN), "error" with the RCODE name for other answers,
+or "lost" after `timeout`. RTTs use kernel receive timestamps where
+available (timing.py).
+
+qnames() cycles a name list; with cache_miss=True every name gets a
+unique random first label, so each query misses the resolver's cache.
+system_nameserver() is the first nameserver in /etc/resolv.conf, for
+probing "whatever the system resolver asks" instead of a named server.
+
+Usage (load test against a resolver):
+    python3 dns_probe.py SERVER [--port N] [--names a.com,b.org|@FILE] [--cache-miss]
+                         [--qps N] [--count N] [--transport {udp,tcp,tls}] [--timeout S]
+"""
+
+import argparse
+import itertools
+import random
+import select
+import socket
+import ssl
+import struct
+import time
+
+from latency_sketch import LatencySketch
+import resolver
+import timing
+
+DNS_PORT = 53
+DOT_PORT = 853
+DEFAULT_TIMEOUT = 1.0       # seconds
+QTYPES = {"A": 1, "NS": 2, "CNAME": 5, "SOA": 6, "PTR": 12, "MX": 15, "TXT": 16, "AAAA": 28}
+RCODES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+ANSWERED = (0, 3)           # rcodes counted as "ok"
+TRANSPORTS = ("udp", "tcp", "tls")
+RESOLV_CONF = "/etc/resolv.conf"
+
+_HEADER = struct.Struct("!HHHHHH")
+_FLAG_RD = 0x0100
+_FLAG_QR = 0x8000
+_FLAG_TC = 0x0200
+
+
+# -----------------------------------------------------------
+# WIRE FORMAT
+# -----------------------------------------------------------
+def encode_name(name):
+    out = bytearray()
+    for label in name.rstrip(".").split("."):
+        raw = label.encode("idna")
+        if not 0 < len(raw) < 64:
+            raise ValueError(f"bad DNS label in {name!r}")
+        out.append(len(raw))
+        out += raw
+    out.append(0)
+    return bytes(out)
+
+
+def build_question(qname, qtype="A"):
+    return encode_name(qname) + struct.pack("!HH", QTYPES.get(qtype, qtype), 1)
+
+
+def build_query(txid, question):
+    """One-question recursive query with the given transaction ID."""
+    return _HEADER.pack(txid, _FLAG_RD, 1, 0, 0, 0) + question
+
+
+def parse_header(data):
+    """(txid, truncated, rcode) of a response, or None if it is not one."""
+    if len(data) < _HEADER.size:
+        return None
+    txid, flags, _qd, _an, _ns, _ar = _HEADER.unpack_from(data)
+    if not flags & _FLAG_QR:
+        return None
+    return txid, bool(flags & _FLAG_TC), flags & 0x000F
+
+
+def qnames(names, cache_miss=False):
+    """Endless cycle over names; cache_miss prefixes a unique random label."""
+    for i, name in enumerate(itertools.cycle(names)):
+        yield f"m{i:x}-{random.getrandbits(32):08x}.{name}" if cache_miss else name
+
+
+def load_names(spec):
+    """"a.com,b.org" or "@file" (one name per line, # comments)."""
+    if spec.startswith("@"):
+        with open(spec[1:]) as f:
+            names = [line.split("#")[0].strip() for line in f]
+    else:
+        names = [n.strip() for n in spec.split(",")]
+    names = [n for n in names if n]
+    if not names:
+        raise ValueError(f"no query names in {spec!r}")
+    return names
+
+
+def system_nameserver(path=RESOLV_CONF):
+    """First `nameserver` address in resolv.conf; ValueError if there is none."""
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == "nameserver":
+                    return fields[1]
+    except OSError:
+        pass
+    raise ValueError(f"no nameserver in {path}")
+
+
+def _status(rcode, rtt):
+    if rcode in ANSWERED:
+        return ("ok", rtt)
+    return ("error", RCODES.get(rcode, f"RCODE{rcode}"))
+
+
+# -----------------------------------------------------------
+# PROBER
+# -----------------------------------------------------------
+class DnsProber:
+    def __init__(self, server, port=None, timeout=DEFAULT_TIMEOUT, transport="udp",
+                 fallback="tcp", qtype="A", tls_hostname=None, verify=True):
+        if transport not in TRANSPORTS or fallback not in TRANSPORTS + ("none",):
+            raise ValueError("transport must be udp, tcp or tls")
+        self.server = server
+        self.timeout = timeout
+        self.transport = transport
+        self.fallback = None if fallback in ("none", "udp") else fallback
+        self.qtype = qtype
+        self.tls_hostname = tls_hostname or server
+        self.verify = verify
+        self.port = port
+        self.udp = None
+        self._stream = None
+        self._stream_kind = None
+        self.inflight = {}      # txid -> (question, sent_stamp, tag)
+        self._txid = random.getrandbits(16)
+        if transport == "udp":
+            family, addr = resolver.resolve(server, port or DNS_PORT, kind=socket.SOCK_DGRAM)
+            self.udp = socket.socket(family, socket.SOCK_DGRAM)
+            self.udp.connect(addr)       # the kernel drops datagrams from anyone else
+            self.udp.setblocking(False)
+            try:
+                self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            except OSError:
+                pass
+            timing.enable_rx_timestamps(self.udp)
+
+    def _next_txid(self):
+        while True:
+            self._txid = (self._txid + 1) & 0xFFFF
+            if self._txid not in self.inflight:
+                return self._txid
+
+    # ---- UDP, pipelined ----
+    def send(self, qname, tag=None):
+        """Send one UDP query without waiting; its result comes out of poll()."""
+        txid = self._next_txid()
+        question = build_question(qname, self.qtype)
+        sent = timing.send_stamp()
+        self.udp.send(build_query(txid, question))
+        self.inflight[txid] = (question, sent, tag)
+        return txid
+
+    def poll(self, wait=0.0):
+        """
+        Collect responses for up to `wait` seconds and expire timed-out
+        queries. Returns [(tag, status, value), ...].
+        """
+        done = []
+        if self.inflight and select.select([self.udp], [], [], max(0.0, wait))[0]:
+            while True:
+                try:
+                    data, _addr, rx = timing.recv_timestamped(self.udp)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    break   # e.g. ICMP port unreachable reported on the connected socket
+                header = parse_header(data)
+                entry = self.inflight.get(header[0]) if header else None
+                if entry is None or data[12:12 + len(entry[0])] != entry[0]:
+                    continue
+                del self.inflight[header[0]]
+                question, sent, tag = entry
+                _txid, truncated, rcode = header
+                if truncated and self.fallback:
+                    try:
+                        rcode = self._stream_query(question, self.fallback)
+                        done.append((tag, *_status(rcode, timing.rtt_ms(sent))))
+                    except OSError as e:
+                        done.append((tag, "error", f"{self.fallback} fallback: {e}"))
+                    continue
+                done.append((tag, *_status(rcode, timing.rtt_ms(sent, rx))))
+        elif wait > 0 and not self.inflight:
+            time.sleep(wait)
+        limit = time.perf_counter_ns() - int(self.timeout * 1e9)
+        for txid, (_q, sent, tag) in list(self.inflight.items()):
+            if sent[0] < limit:
+                del self.inflight[txid]
+                done.append((tag, "lost", None))
+        return done
+
+    # ---- TCP / DoT ----
+    def _connect(self, kind):
+        port = self.port or (DOT_PORT if kind == "tls" else DNS_PORT)
+        family, addr = resolver.resolve(self.server, port)
+        # The full sockaddr keeps an IPv6 scope id (link-local servers).
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(addr)
+        except OSError:
+            sock.close()
+            raise
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if kind == "tls":
+            ctx = ssl.create_default_context()
+            if not self.verify:
+                ctx.check_hostname = False
+                ctx.verify_mode = ssl.CERT_NONE
+            sock = ctx.wrap_socket(sock, server_hostname=self.tls_hostname)
+        self._stream, self._stream_kind = sock, kind
+
+    def _read_exact(self, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = self._stream.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("connection closed by server")
+            buf += chunk
+        return buf
+
+    def _stream_query(self, question, kind):
+        """One query over the persistent TCP/DoT connection; returns the rcode."""
+        for attempt in (0, 1):
+            if self._stream is None or self._stream_kind != kind:
+                self._close_stream()
+                self._connect(kind)
+            txid = self._next_txid()
+            msg = build_query(txid, question)
+            try:
+                self._stream.settimeout(self.timeout)
+                self._stream.sendall(struct.pack("!H", len(msg)) + msg)
+                while True:
+                    data = self._read_exact(struct.unpack("!H", self._read_exact(2))[0])
+                    header = parse_header(data)
+                    if header and header[0] == txid:
+                        return header[2]
+            except (OSError, ConnectionError):
+                # Servers close idle connections; reconnect once before giving up.
+                self._close_stream()
+                if attempt:
+                    raise
+
+    def _close_stream(self):
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except OSError:
+                pass
+        self._stream = None
+
+    # ---- blocking single query ----
+    def query(self, qname):
+        """One query, waiting for its answer: (status, rtt_ms or info)."""
+        if self.transport != "udp":
+            start = timing.send_stamp()
+            try:
+                rcode = self._stream_query(build_question(qname, self.qtype), self.transport)
+            except socket.timeout:
+                return ("lost", None)
+            except OSError as e:
+                return ("error", str(e))
+            return _status(rcode, timing.rtt_ms(start))
+        try:
+            txid = self.send(qname, tag="query")
+        except OSError as e:
+            return ("error", str(e))
+        deadline = time.perf_counter() + self.timeout
+        while txid in self.inflight:
+            for tag, status, value in self.poll(max(0.0, deadline - time.perf_counter())):
+                if tag == "query":
+                    return (status, value)
+        return ("lost", None)
+
+    # ---- open-loop load ----
+    def run(self, names, count, qps=None, on_result=None):
+        """
+        Send `count` queries (names from an iterator) at `qps` queries/s,
+        open loop, all on one socket. on_result(i, qname, status, value,
+        lag_ms) is called as results arrive. Without qps (or over TCP/DoT)
+        queries go one at a time. Returns (sent, elapsed_seconds).
+        """
+        start = time.perf_counter()
+        if self.transport != "udp" or not qps:
+            schedule = timing.Schedule(1.0 / qps if qps else 0.0)
+            for i in range(count):
+                lag = schedule.wait()
+                name = next(names)
+                status, value = self.query(name)
+                if on_result:
+                    on_result(i, name, status, value, lag)
+            return count, time.perf_counter() - start
+
+        period_ns = int(1e9 / qps)
+        t0 = time.perf_counter_ns()
+        pending = {}
+        for i in range(count):
+            due = t0 + i * period_ns
+            # Collect responses until just before the slot, then spin onto it.
+            while True:
+                remaining = (due - time.perf_counter_ns()) / 1e9
+                self._deliver(self.poll(max(0.0, remaining - 0.0002)), pending, on_result)
+                if remaining <= 0.0005:
+                    break
+            timing.sleep_until(due)
+            name = next(names)
+            lag = (time.perf_counter_ns() - due) / 1e6
+            try:
+                self.send(name, tag=i)
+                pending[i] = (name, lag)
+            except OSError as e:
+                if on_result:
+                    on_result(i, name, "error", str(e), lag)
+        while self.inflight:
+            self._deliver(self.poll(0.05), pending, on_result)
+        return count, time.perf_counter() - start
+
+    @staticmethod
+    def _deliver(results, pending, on_result):
+        for tag, status, value in results:
+            name, lag = pending.pop(tag, (None, 0.0))
+            if on_result:
+                on_result(tag, name, status, value, lag)
+
+    def close(self):
+        if self.udp is not None:
+            self.udp.close()
+        self._close_stream()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    p = argparse.ArgumentParser(description="DNS load generator on one socket")
+    p.add_argument("server")
+    p.add_argument("--port", type=int, default=None, help="default 53, or 853 for tls")
+    p.add_argument("--names", default="example.com", help="comma-separated names or @file")
+    p.add_argument("--cache-miss", action="store_true", help="unique random label per query")
+    p.add_argument("--qtype", choices=sorted(QTYPES), default="A")
+    p.add_argument("--qps", type=float, default=None, help="open-loop target queries/s")
+    p.add_argument("--count", type=int, default=100)
+    p.add_argument("--transport", choices=TRANSPORTS, default="udp")
+    p.add_argument("--fallback", choices=["tcp", "tls", "none"], default="tcp",
+                   help="retry truncated UDP answers over this transport")
+    p.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds")
+    p.add_argument("--insecure", action="store_true", help="tls: skip certificate checks")
+    args = p.parse_args()
+
+    sketch = LatencySketch()
+    statuses = {}
+
+    def on_result(_i, _name, status, value, _lag):
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == "ok":
+            sketch.add(value)
+
+    with DnsProber(args.server, args.port, args.timeout, args.transport, args.fallback,
+                   args.qtype, verify=not args.insecure) as prober:
+        sent, elapsed = prober.run(qnames(load_names(args.names), args.cache_miss), args.count,
+                                   args.qps, on_result)
+    print(f"{sent} queries in {elapsed:.2f} s ({sent / elapsed:.0f} q/s) "
+          + " ".join(f"{k}={v}" for k, v in sorted(statuses.items())))
+    print(f"Latency: {sketch.format()}")
+
+
+if __name__ == "__main__":
+    main()
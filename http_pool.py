@@ -0,0 +1,199 @@
+"""
+http_pool.py
+------------
+A small keep-alive HTTP(S) connection pool that times each phase of a
+request separately.
+
+Trafficgen's http_mode calls requests.head() per sample, so every logged
+latency includes a fresh TCP (and TLS) handshake. HttpPool keeps up to
+`size` persistent connections to one origin and reports, per request:
+
+    connect_ms   TCP handshake (0 when an idle connection was reused)
+    tls_ms       TLS handshake (0 for http:// or reused connections)
+    ttfb_ms      request sent -> status line and headers received
+    total_ms     connect + tls + request until the body is fully read
+    reused       whether a pooled connection was used
+
+Steady-state latency is then the ttfb/total of reused requests, while the
+cold-connection cost shows up in connect_ms/tls_ms. The pool can be
+pre-warmed so the first samples are already steady-state.
+
+Like requests.head(..., allow_redirects=True), redirects are followed, but
+only within the pool's origin (same scheme, host and port), up to
+MAX_REDIRECTS. A redirect elsewhere (or past MAX_REDIRECTS) is returned
+as-is: its 3xx status, and the URL it pointed to in `location`; callers
+log it as a "redirect" (redirect_info()), not as a timed response, since
+the chain was not completed. Each hop runs on a pooled connection.
+total_ms spans the whole chain, connect_ms/tls_ms add up every hop's
+handshakes, and ttfb_ms is that of the final response. A reused connection the server had already closed is
+retried once on a newly opened one.
+
+Only the standard library is used (http.client, ssl), since requests does
+not expose handshake timings.
+"""
+
+import http.client
+import queue
+import socket
+import ssl
+import time
+from urllib.parse import urljoin, urlsplit
+
+import resolver
+
+MAX_REDIRECTS = 10
+REDIRECTS = (301, 302, 303, 307, 308)
+
+
+def redirect_info(result):
+    """Info text for a redirect request() did not follow, e.g. "HTTP 301 -> example.org"."""
+    parts = urlsplit(result["location"])
+    return f"HTTP {result['status']} -> {parts.netloc or result['location']}"
+
+
+class HttpPool:
+    def __init__(self, url, size=4, timeout=1.0, verify=True):
+        if not url.startswith("http"):
+            url = "http://" + url
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.size = size
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.ctx = None
+        if self.https:
+            self.ctx = ssl.create_default_context()
+            if not verify:
+                self.ctx.check_hostname = False
+                self.ctx.verify_mode = ssl.CERT_NONE
+
+    def _connect(self):
+        """Open a new connection; returns (conn, connect_ms, tls_ms)."""
+        # Resolved before the clock starts (and cached), so connect_ms is the handshake alone.
+        family, addr = resolver.resolve(self.host, self.port)
+        # The full sockaddr keeps an IPv6 scope id (link-local targets).
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        start = time.perf_counter()
+        try:
+            sock.connect(addr)
+        except OSError:
+            sock.close()
+            raise
+        connected = time.perf_counter()
+        tls_ms = 0.0
+        if self.https:
+            try:
+                sock = self.ctx.wrap_socket(sock, server_hostname=self.host)
+            except Exception:
+                sock.close()
+                raise
+            tls_ms = (time.perf_counter() - connected) * 1000
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        conn.sock = sock
+        return conn, (connected - start) * 1000, tls_ms
+
+    def prewarm(self, n=None):
+        """Open up to n (default: pool size) idle connections ahead of time."""
+        for _ in range(min(self.size, n or self.size)):
+            conn, _, _ = self._connect()
+            try:
+                self.idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+                break
+
+    def _release(self, conn, resp):
+        if resp.will_close:
+            conn.close()
+            return
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _exchange(self, conn, method, path):
+        """One request/response on conn (None: open a new connection)."""
+        connect_ms = tls_ms = 0.0
+        if conn is None:
+            conn, connect_ms, tls_ms = self._connect()
+        sent = time.perf_counter()
+        try:
+            conn.request(method, path, headers={"Connection": "keep-alive"})
+            resp = conn.getresponse()
+            ttfb = time.perf_counter()
+            resp.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            raise
+        self._release(conn, resp)
+        return resp, connect_ms, tls_ms, (ttfb - sent) * 1000
+
+    def _same_origin(self, url):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return (parts.scheme == ("https" if self.https else "http")
+                and parts.hostname == self.host and port == self.port)
+
+    def request(self, method="HEAD"):
+        """
+        Perform one request, following same-origin redirects. Returns a dict
+        with status, connect_ms, tls_ms, ttfb_ms, total_ms, reused (for the
+        first hop), redirects and location (absolute URL of a redirect that
+        was not followed, else None). Raises on connection/protocol errors.
+        """
+        scheme = "https" if self.https else "http"
+        url = f"{scheme}://{self.host}:{self.port}{self.path}"
+        path, redirects, target = self.path, 0, None
+        connect_ms = tls_ms = 0.0
+        start = time.perf_counter()
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = None
+            try:
+                resp, c_ms, t_ms, ttfb_ms = self._exchange(conn, method, path)
+            except (http.client.HTTPException, OSError):
+                # The server may have closed an idle keep-alive connection
+                # (and any other idle one with it): retry on a new connection.
+                if conn is None:
+                    raise
+                conn = None
+                resp, c_ms, t_ms, ttfb_ms = self._exchange(None, method, path)
+            if not redirects:
+                reused = conn is not None
+            connect_ms += c_ms
+            tls_ms += t_ms
+            location = resp.getheader("Location")
+            if resp.status not in REDIRECTS or not location:
+                break
+            url = urljoin(url, location)
+            if redirects >= MAX_REDIRECTS or not self._same_origin(url):
+                target = url
+                break
+            parts = urlsplit(url)
+            path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            if resp.status == 303 and method != "HEAD":
+                method = "GET"
+            redirects += 1
+        return {
+            "status": resp.status,
+            "connect_ms": connect_ms,
+            "tls_ms": tls_ms,
+            "ttfb_ms": ttfb_ms,
+            "total_ms": (time.perf_counter() - start) * 1000,
+            "reused": reused,
+            "redirects": redirects,
+            "location": target,
+        }
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
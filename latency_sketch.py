@@ -0,0 +1,273 @@
+"""
+latency_sketch.py
+-----------------
+Fixed-memory, mergeable latency sketch for streaming RTT quantiles.
+
+Keeping every RTT to compute percentiles stops working once runs reach
+millions of samples, and means cannot be combined into percentiles across
+runs. LatencySketch is a log-bucketed histogram (the idea behind HDR
+histograms and DDSketch): bucket k covers (gamma^(k-1), gamma^k] with
+gamma = (1 + a) / (1 - a), so every quantile it reports is within a
+relative error `a` (default 1%) of the true sample quantile.
+
+The bucket layout is fixed by (accuracy, min_value, max_value), so:
+    • memory is constant (~1150 counters for 1 µs .. 10^7 ms at 1%),
+    • merging two sketches is an element-wise add of their counters, and
+      merged quantiles are exactly as accurate as a single sketch.
+Values at or below min_value share the first bucket and values above
+max_value the last; min, max, count and sum are tracked exactly.
+
+Sketches serialize to small JSON dicts (to_dict / from_dict). Sketch files
+hold {name: sketch} and are updated with merge_into(), so repeated runs and
+different conditions accumulate instead of overwriting each other.
+
+NumPy is optional; update() and quantile() use it for large batches.
+"""
+
+import json
+import math
+import os
+from array import array
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+DEFAULT_ACCURACY = 0.01
+DEFAULT_MIN_VALUE = 1e-3    # ms (1 µs)
+DEFAULT_MAX_VALUE = 1e7     # ms (~2.8 h)
+REPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+FORMAT_VERSION = 1
+
+
+def quantile_label(q):
+    """0.5 -> "p50", 0.999 -> "p99.9"."""
+    return f"p{q * 100:g}"
+
+
+class LatencySketch:
+    def __init__(self, accuracy=DEFAULT_ACCURACY, min_value=DEFAULT_MIN_VALUE,
+                 max_value=DEFAULT_MAX_VALUE):
+        if not 0 < accuracy < 1:
+            raise ValueError("accuracy must be between 0 and 1")
+        self.accuracy = accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._base = math.ceil(math.log(min_value) / self._log_gamma)
+        size = math.ceil(math.log(max_value) / self._log_gamma) - self._base + 1
+        self.counts = array("Q", [0]) * size
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    # -----------------------------------------------------------
+    # ADDING SAMPLES
+    # -----------------------------------------------------------
+    def bucket(self, value):
+        """Index of the counter a value falls into."""
+        if value <= self.min_value:
+            return 0
+        i = math.ceil(math.log(value) / self._log_gamma) - self._base
+        return min(i, len(self.counts) - 1)
+
+    def add(self, value, n=1):
+        """Record one sample (ms); NaN and None are ignored."""
+        if value is None or value != value:
+            return
+        self.counts[self.bucket(value)] += n
+        self.count += n
+        self.sum += value * n
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def update(self, values):
+        """Record many samples at once (any iterable or array of ms values)."""
+        if np is None:
+            for v in values:
+                self.add(v)
+            return
+        arr = np.asarray(values if hasattr(values, "__len__") else list(values), dtype=np.float64)
+        arr = arr[~np.isnan(arr)]
+        if not arr.size:
+            return
+        with np.errstate(divide="ignore"):
+            idx = np.ceil(np.log(np.maximum(arr, self.min_value)) / self._log_gamma) - self._base
+        idx = np.clip(idx, 0, len(self.counts) - 1).astype(np.intp)
+        idx[arr <= self.min_value] = 0
+        np.frombuffer(self.counts, dtype=np.uint64)[:] += np.bincount(
+            idx, minlength=len(self.counts)).astype(np.uint64)
+        self.count += int(arr.size)
+        self.sum += float(arr.sum())
+        self.min = min(self.min, float(arr.min()))
+        self.max = max(self.max, float(arr.max()))
+
+    # -----------------------------------------------------------
+    # MERGING
+    # -----------------------------------------------------------
+    def _layout(self):
+        return (self.accuracy, self.min_value, self.max_value)
+
+    def merge(self, other):
+        """Add another sketch's samples into this one (same layout required)."""
+        if other._layout() != self._layout():
+            raise ValueError(f"cannot merge sketches with layouts {self._layout()} "
+                             f"and {other._layout()}")
+        if np is not None:
+            np.frombuffer(self.counts, dtype=np.uint64)[:] += np.frombuffer(
+                other.counts, dtype=np.uint64)
+        else:
+            for i, c in enumerate(other.counts):
+                if c:
+                    self.counts[i] += c
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def copy(self):
+        return LatencySketch.from_dict(self.to_dict())
+
+    # -----------------------------------------------------------
+    # QUERIES
+    # -----------------------------------------------------------
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else math.nan
+
+    def bucket_value(self, i):
+        """Representative value of bucket i (relative midpoint of its range)."""
+        return 2 * self.gamma ** (i + self._base) / (self.gamma + 1)
+
+    def value_at_rank(self, k, b):
+        """Estimate of the k-th smallest sample (0-based), which lies in bucket b."""
+        if k <= 0:
+            return self.min
+        if k >= self.count - 1:
+            return self.max
+        return min(self.max, max(self.min, self.bucket_value(b)))
+
+    def quantiles(self, qs):
+        """
+        Values at quantiles qs (each 0..1); NaN for an empty sketch. Like
+        numpy's default, a quantile between two ranks is interpolated.
+        """
+        if not self.count:
+            return [math.nan for _ in qs]
+        ranks = [min(max(q, 0.0), 1.0) * (self.count - 1) for q in qs]
+        wanted = sorted({k for r in ranks for k in (math.floor(r), math.ceil(r))})
+        if np is not None:
+            cum = np.cumsum(np.frombuffer(self.counts, dtype=np.uint64))
+            buckets = np.searchsorted(cum, wanted, side="right").tolist()
+        else:
+            buckets, seen, i = [], 0, 0
+            for k in wanted:
+                while seen + self.counts[i] <= k:
+                    seen += self.counts[i]
+                    i += 1
+                buckets.append(i)
+        at = {k: self.value_at_rank(k, b) for k, b in zip(wanted, buckets)}
+        out = []
+        for r in ranks:
+            lo, hi = at[math.floor(r)], at[math.ceil(r)]
+            out.append(lo + (hi - lo) * (r - math.floor(r)))
+        return out
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def summary(self, qs=REPORT_QUANTILES):
+        """Dict with count, mean, min, max and one entry per quantile."""
+        out = {"count": self.count}
+        if self.count:
+            out.update(mean=self.mean, min=self.min, max=self.max)
+            out.update(zip((quantile_label(q) for q in qs), self.quantiles(qs)))
+        return out
+
+    def format(self, qs=REPORT_QUANTILES):
+        """One-line summary, e.g. for end-of-run reports."""
+        if not self.count:
+            return "no samples"
+        values = " ".join(f"{quantile_label(q)}={v:.3f}" for q, v in zip(qs, self.quantiles(qs)))
+        return (f"n={self.count} mean={self.mean:.3f} min={self.min:.3f} {values} "
+                f"max={self.max:.3f} ms")
+
+    # -----------------------------------------------------------
+    # SERIALIZATION
+    # -----------------------------------------------------------
+    def to_dict(self):
+        """JSON-safe dict; only the non-empty span of buckets is stored."""
+        nonzero = [i for i, c in enumerate(self.counts) if c]
+        lo = nonzero[0] if nonzero else 0
+        hi = nonzero[-1] + 1 if nonzero else 0
+        return {
+            "version": FORMAT_VERSION,
+            "accuracy": self.accuracy,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "offset": lo,
+            "counts": list(self.counts[lo:hi]),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported sketch version {d.get('version')}")
+        sketch = cls(d["accuracy"], d["min_value"], d["max_value"])
+        for i, c in enumerate(d["counts"], d["offset"]):
+            sketch.counts[i] = c
+        sketch.count = d["count"]
+        sketch.sum = d["sum"]
+        if sketch.count:
+            sketch.min, sketch.max = d["min"], d["max"]
+        return sketch
+
+    def __repr__(self):
+        return f"<LatencySketch {self.format()}>"
+
+
+# -----------------------------------------------------------
+# SKETCH FILES: {name: sketch} as JSON
+# -----------------------------------------------------------
+def load_sketches(path):
+    """Load a sketch file as {name: LatencySketch}; {} if it does not exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {name: LatencySketch.from_dict(d) for name, d in json.load(f).items()}
+
+
+def save_sketches(path, sketches):
+    """Write {name: LatencySketch} atomically (temp file + rename)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({name: s.to_dict() for name, s in sketches.items()}, f)
+    os.replace(tmp, path)
+
+
+def merge_into(path, sketches):
+    """
+    Merge {name: LatencySketch} into the sketch file at path, creating it if
+    needed. Returns the merged {name: LatencySketch} now stored in the file.
+    """
+    stored = load_sketches(path)
+    for name, sketch in sketches.items():
+        if name in stored:
+            stored[name].merge(sketch)
+        else:
+            stored[name] = sketch.copy()
+    save_sketches(path, stored)
+    return stored
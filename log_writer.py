@@ -0,0 +1,193 @@
+"""
+log_writer.py
+-------------
+Buffered, background CSV logging shared by Trafficgen.py and ping.py.
+
+Both scripts used to format a timestamp string and call f.flush() after
+every row, i.e. one write syscall per probe on the probing thread. With
+BufferedCsvWriter the probing code only appends the raw row to a bounded
+queue; a background thread formats the values and writes them in batches,
+flushing every `flush_interval` seconds or `flush_rows` rows (whichever
+comes first). At most one interval of rows can be lost on a crash, and
+close() (also run at interpreter exit) drains everything.
+
+Formatting is done on the writer thread: pass floats as floats and give
+a format spec per column in `formats` (e.g. ".3f"); non-float values are
+written as-is.
+
+BufferedProbeLogWriter runs the same pipeline into a columnar .rtlog file
+(probe_log.py) instead: each batch becomes one chunk and a caller-supplied
+`to_record(row)` maps the row onto the typed columns. open_writer() picks
+the right one from the file extension, so scripts keep writing the same
+rows either way.
+
+Both take an optional `observe(batch)` callback that the writer thread
+calls with every batch before it is written, e.g. to feed a latency sketch
+without doing any extra work (or locking) on the probing threads.
+
+If writing (or observe) raises, the writer thread keeps draining the queue
+so producers never block on it, and the exception is re-raised from the
+next writerow() or from close().
+"""
+
+import abc
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+
+import probe_log
+
+DEFAULT_FLUSH_INTERVAL = 1.0    # seconds
+DEFAULT_FLUSH_ROWS = 500
+DEFAULT_QUEUE_SIZE = 100000
+
+_STOP = object()
+
+
+class _BufferedWriter(abc.ABC):
+    """Queue + background flusher thread; subclasses implement the sink."""
+
+    def __init__(self, flush_interval=DEFAULT_FLUSH_INTERVAL, flush_rows=DEFAULT_FLUSH_ROWS,
+                 queue_size=DEFAULT_QUEUE_SIZE, observe=None):
+        self.flush_interval = flush_interval
+        self.observe = observe
+        self.flush_rows = max(1, flush_rows)
+        self.rows_written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def writerow(self, row):
+        """Queue one row. Blocks only if the queue is full (writer far behind)."""
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError("writer is closed")
+        self._queue.put(row)
+
+    @abc.abstractmethod
+    def _write_batch(self, batch):
+        """Write (and flush) a batch of rows."""
+
+    @abc.abstractmethod
+    def _close_sink(self):
+        """Close the underlying file."""
+
+    def _flush(self, batch):
+        if self.observe and batch:
+            self.observe(batch)
+        self._write_batch(batch)
+        self.rows_written += len(batch)
+        batch.clear()
+
+    def _run(self):
+        try:
+            self._loop()
+        except BaseException as e:
+            self._error = e
+            # Keep consuming (and dropping) rows so writerow() and close() never block.
+            while self._queue.get() is not _STOP:
+                pass
+
+    def _loop(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                row = None
+            if row is _STOP:
+                self._flush(batch)
+                return
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= self.flush_rows or time.monotonic() >= deadline:
+                self._flush(batch)
+                deadline = time.monotonic() + self.flush_interval
+
+    def close(self):
+        """Write every queued row, flush and close the file; re-raises a writer-thread error."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+        self._close_sink()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BufferedCsvWriter(_BufferedWriter):
+    def __init__(self, path, header=None, mode="w", formats=None, fsync=False, **kwargs):
+        self.path = path
+        self.formats = formats
+        self.fsync = fsync
+        self._file = open(path, mode, newline="")
+        self._csv = csv.writer(self._file)
+        if header:
+            self._csv.writerow(header)
+            self._file.flush()
+        super().__init__(**kwargs)
+
+    def _format(self, row):
+        if not self.formats:
+            return row
+        return [format(v, spec) if spec and isinstance(v, float) else v
+                for v, spec in zip(row, self.formats)] + list(row[len(self.formats):])
+
+    def _write_batch(self, batch):
+        if batch:
+            self._csv.writerows(self._format(r) for r in batch)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _close_sink(self):
+        self._file.close()
+
+
+class BufferedProbeLogWriter(_BufferedWriter):
+    """
+    Same pipeline into a .rtlog file. to_record(row) must return the
+    arguments of probe_log.ProbeLogWriter.append as a dict.
+    """
+
+    def __init__(self, path, to_record, extra=(), mode="w", **kwargs):
+        if mode == "w" and os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.to_record = to_record
+        self._log = probe_log.ProbeLogWriter(path, extra=extra)
+        super().__init__(**kwargs)
+
+    def _write_batch(self, batch):
+        for row in batch:
+            self._log.append(**self.to_record(row))
+        self._log.flush()
+
+    def _close_sink(self):
+        self._log.close()
+
+
+def open_writer(path, header=None, formats=None, to_record=None, extra=(), **kwargs):
+    """
+    BufferedProbeLogWriter for *.rtlog paths (needs to_record), otherwise
+    BufferedCsvWriter with the given header/formats.
+    """
+    if probe_log.is_probe_log(path):
+        return BufferedProbeLogWriter(path, to_record, extra=extra, **kwargs)
+    return BufferedCsvWriter(path, header, formats=formats, **kwargs)
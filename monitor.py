@@ -0,0 +1,525 @@
+"""
+monitor.py
+----------
+Long-running monitor for continuous multi-target probing.
+
+ping.py, Trafficgen.py and collector.py run once with a fixed host list
+and sample count. monitor.py instead keeps running and probes every
+(target, mode, interval) job from a JSON config forever:
+
+    • Scheduling – a heap of next due times. Each job stays on its own
+      drift-free grid (start + k × interval) with a random start phase
+      and ±jitter per cycle, so thousands of jobs with the same interval
+      do not fire in synchronized bursts. A job that is still in flight
+      when it is due again skips that cycle instead of piling up.
+    • Reuse – all ICMP jobs share one socket (replies are matched by
+      source address and sequence number on a receiver thread, so pings
+      never hold a worker thread); HTTP jobs keep an http_pool.HttpPool
+      of keep-alive connections; UDP and DNS jobs keep their socket.
+      TCP jobs reconnect every time, since the handshake is what they
+      measure. Target names come from resolver.py's shared cache and are
+      re-resolved only when an entry expires, never inside a timed probe.
+    • Reload – the config file is re-read when its mtime changes (and on
+      SIGHUP). Added jobs start, removed jobs stop and release their
+      sockets, unchanged jobs keep their schedule and connections.
+
+Every result is logged through log_writer (CSV, or .rtlog for the
+columnar format) and a one-line summary with per-mode p50/p99 is printed
+every --summary-interval seconds. With --serve PORT every result also
+goes into an in-memory ts_store.TimeSeriesStore, queryable over HTTP on
+127.0.0.1 (GET /stats?target=...&mode=...&window=60) for live dashboards;
+Trafficgen.py and collector.py can --push into the same endpoint.
+
+Config (JSON):
+    {
+      "defaults": {"interval": 10, "timeout": 1.0, "jitter": 0.1},
+      "jobs": [
+        {"target": "8.8.8.8", "mode": "icmp", "interval": 5},
+        {"targets": ["google.com", "mit.edu"], "mode": "http"},
+        {"target": "127.0.0.1", "mode": "tcp", "port": 22},
+        {"target": "127.0.0.1", "mode": "udp", "port": 9999, "await_reply": true},
+        {"target": "8.8.8.8", "mode": "dns", "qname": "example.com"}
+      ]
+    }
+
+Usage:
+    python3 monitor.py --config monitor.example.json [--output CSV|RTLOG] [--workers N]
+                       [--summary-interval SECONDS] [--reload-interval SECONDS]
+                       [--serve PORT | --unix-socket PATH] [--capacity N] [--retention SECONDS]
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import select
+import signal
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_pool import HttpPool, redirect_info
+from latency_sketch import LatencySketch
+from log_writer import open_writer
+from dns_probe import DnsProber
+import probe_engine
+import resolver
+import ts_store
+
+MODES = ("icmp", "tcp", "http", "udp", "dns")
+DEFAULTS = {
+    "interval": 10.0,       # seconds between probes of one job
+    "timeout": 1.0,         # seconds
+    "jitter": 0.1,          # ± fraction of the interval
+    "payload_size": 64,     # udp
+    "await_reply": False,   # udp
+    "qname": "example.com", # dns
+}
+DEFAULT_PORTS = {"tcp": 443, "udp": 9999, "dns": 53}
+DEFAULT_OUTPUT = "csv_files/monitor_log.csv"
+DEFAULT_WORKERS = 64
+
+
+# -----------------------------------------------------------
+# CONFIG
+# -----------------------------------------------------------
+def load_config(path):
+    """Read the JSON config and return a list of normalized job specs."""
+    with open(path) as f:
+        config = json.load(f)
+    defaults = dict(DEFAULTS, **config.get("defaults", {}))
+    specs = []
+    for entry in config.get("jobs", []):
+        targets = entry.get("targets") or [entry["target"]]
+        for target in targets:
+            spec = dict(defaults, **{k: v for k, v in entry.items() if k != "targets"})
+            spec["target"] = target
+            if spec.get("mode") not in MODES:
+                raise ValueError(f"job {target}: mode must be one of {MODES}")
+            spec.setdefault("port", DEFAULT_PORTS.get(spec["mode"]))
+            spec["interval"] = max(0.01, float(spec["interval"]))
+            specs.append(spec)
+    return specs
+
+
+def job_key(spec):
+    """Jobs are identified by what they probe, not by their timing."""
+    qname = spec.get("qname") if spec["mode"] == "dns" else None
+    return (spec["mode"], spec["target"], spec.get("port"), qname)
+
+
+class Job:
+    def __init__(self, spec, start):
+        self.spec = spec
+        self.key = job_key(spec)
+        self.mode = spec["mode"]
+        self.target = spec["target"]
+        self.interval = spec["interval"]
+        # Random phase spreads jobs with equal intervals over the whole period.
+        self.nominal = start + random.uniform(0, self.interval)
+        self.active = True
+        self.in_flight = False
+        self.resource = None    # HttpPool or socket, reused across cycles
+        self.seq = 0            # udp payload sequence number
+        self._lock = threading.Lock()
+
+    def next_due(self, now):
+        """Advance to the next grid slot after now and add this cycle's jitter."""
+        self.nominal += self.interval
+        if self.nominal <= now:
+            missed = int((now - self.nominal) // self.interval) + 1
+            self.nominal += missed * self.interval
+        jitter = self.spec["jitter"] * self.interval
+        return max(now, self.nominal + random.uniform(-jitter, jitter))
+
+    def close(self):
+        """Stop the job. A probe still in flight keeps its resource until release()."""
+        self.active = False
+        if not self.in_flight:
+            self._close_resource()
+
+    def release(self):
+        """A probe finished; close the resource if the job was stopped meanwhile."""
+        self.in_flight = False
+        if not self.active:
+            self._close_resource()
+
+    def _close_resource(self):
+        with self._lock:
+            res, self.resource = self.resource, None
+        if res is not None:
+            try:
+                res.close()
+            except Exception:
+                pass
+
+
+# -----------------------------------------------------------
+# SHARED ICMP SOCKET
+# -----------------------------------------------------------
+class IcmpMux:
+    """
+    One ICMP socket for every ICMP job. Each echo gets the next 16-bit
+    sequence number; a receiver thread matches replies by (source, seq)
+    and expires unanswered echoes from a deadline heap.
+    """
+
+    def __init__(self):
+        self.sock, self.is_datagram = probe_engine.open_icmp_socket()
+        if self.sock is None:
+            raise PermissionError("ICMP sockets not permitted")
+        self.ident = os.getpid() & 0xFFFF
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._deadlines = []
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="icmp-mux", daemon=True)
+        self._thread.start()
+
+    def probe(self, addr, timeout, callback):
+        """Send one echo; callback(status, rtt_ms_or_info) runs on the receiver thread."""
+        with self._lock:
+            seq = next(self._seq) & 0xFFFF
+            sent = time.perf_counter()
+            self._pending[(addr, seq)] = (sent, callback)
+            heapq.heappush(self._deadlines, (sent + timeout, addr, seq))
+        try:
+            self.sock.sendto(probe_engine.build_echo(self.ident, seq), (addr, 0))
+        except OSError as e:
+            with self._lock:
+                self._pending.pop((addr, seq), None)
+            callback("error", str(e))
+
+    def _run(self):
+        while not self._stop:
+            ready, _, _ = select.select([self.sock], [], [], 0.05)
+            while ready:
+                try:
+                    data, (src, _port) = self.sock.recvfrom(65535)
+                except (BlockingIOError, OSError):
+                    break
+                now = time.perf_counter()
+                reply = probe_engine.parse_echo_reply(data)
+                if not reply or not (self.is_datagram or reply[0] == self.ident):
+                    continue
+                with self._lock:
+                    entry = self._pending.pop((src, reply[1]), None)
+                if entry:
+                    entry[1]("ok", (now - entry[0]) * 1000)
+            self._expire(time.perf_counter())
+
+    def _expire(self, now):
+        lost = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _deadline, addr, seq = heapq.heappop(self._deadlines)
+                entry = self._pending.pop((addr, seq), None)
+                if entry:
+                    lost.append(entry[1])
+        for callback in lost:
+            callback("lost", None)
+
+    def close(self):
+        self._stop = True
+        self._thread.join()
+        self.sock.close()
+
+
+# -----------------------------------------------------------
+# BLOCKING PROBES (run on the worker pool)
+# Each returns (status, latency_ms or info) and keeps its socket or
+# connection pool in job.resource for the next cycle.
+# -----------------------------------------------------------
+def resolve(job, kind=socket.SOCK_STREAM):
+    # Shared TTL cache: a fresh entry is a dict lookup, an expired one is re-resolved,
+    # so a long-running job follows address changes without a lookup per cycle.
+    # (family, sockaddr) of the preferred IPv4 or IPv6 address, with the job's port.
+    return resolver.resolve(job.target, job.spec["port"], kind=kind)
+
+
+def icmp_address(job):
+    # The shared ICMP socket is IPv4.
+    return resolver.address(job.target, socket.AF_INET)
+
+
+def tcp_probe(job):
+    family, addr = resolve(job)
+    start = time.perf_counter()
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as s:
+            s.settimeout(job.spec["timeout"])
+            s.connect(addr)
+            return ("ok", (time.perf_counter() - start) * 1000)
+    except Exception as e:
+        return ("error", str(e))
+
+
+def http_probe(job):
+    if job.resource is None:
+        job.resource = HttpPool(job.target, size=1, timeout=job.spec["timeout"])
+    try:
+        t = job.resource.request("HEAD")
+    except Exception as e:
+        return ("error", str(e))
+    if t["location"]:
+        return ("redirect", redirect_info(t))
+    if 200 <= t["status"] < 400:
+        return ("ok", t["total_ms"])
+    return ("error", f"HTTP {t['status']}")
+
+
+def udp_probe(job):
+    if job.resource is None:
+        family, addr = resolve(job, socket.SOCK_DGRAM)
+        s = socket.socket(family, socket.SOCK_DGRAM)
+        s.connect(addr)
+        job.resource = s
+    s = job.resource
+    job.seq = (job.seq + 1) & 0xFFFFFFFF
+    payload = struct.pack("!I", job.seq).ljust(max(4, job.spec["payload_size"]), b"A")
+    start = time.perf_counter()
+    try:
+        s.send(payload)
+        if not job.spec["await_reply"]:
+            return ("sent", None)
+        deadline = start + job.spec["timeout"]
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return ("no-reply", None)
+            s.settimeout(remaining)
+            data = s.recv(65535)
+            # Late replies to earlier probes carry an older sequence number.
+            if data[:4] == payload[:4]:
+                return ("ok-reply", (time.perf_counter() - start) * 1000)
+    except socket.timeout:
+        return ("no-reply", None)
+    except Exception as e:
+        return ("error", str(e))
+
+
+def dns_probe(job):
+    if job.resource is None:
+        # DnsProber resolves the server through the same cache, IPv4 or IPv6.
+        job.resource = DnsProber(job.target, job.spec["port"], job.spec["timeout"])
+    return job.resource.query(job.spec["qname"])
+
+
+BLOCKING_PROBES = {"tcp": tcp_probe, "http": http_probe, "udp": udp_probe, "dns": dns_probe}
+
+
+# -----------------------------------------------------------
+# MONITOR
+# -----------------------------------------------------------
+class Monitor:
+    def __init__(self, config_path, writer, workers=DEFAULT_WORKERS,
+                 summary_interval=10.0, reload_interval=5.0, store=None):
+        self.config_path = config_path
+        self.writer = writer
+        self.store = store
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="probe")
+        self.summary_interval = summary_interval
+        self.reload_interval = reload_interval
+        self.jobs = {}
+        self.heap = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reload = threading.Event()
+        self._config_mtime = None
+        self._rows = itertools.count()
+        self.mux = None
+        if probe_engine.icmp_available():
+            self.mux = IcmpMux()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.stats = {"ok": 0, "lost": 0, "error": 0, "skipped": 0}
+        self.sketches = {}
+
+    # ---- config ----
+    def reload(self):
+        """Apply the config file: start new jobs, stop removed ones, keep the rest."""
+        try:
+            self._config_mtime = os.path.getmtime(self.config_path)
+            specs = load_config(self.config_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[monitor] config not applied: {e}")
+            return
+        wanted = {job_key(s): s for s in specs}
+        now = time.monotonic()
+        added = removed = 0
+        for key in list(self.jobs):
+            job = self.jobs[key]
+            if key not in wanted or wanted[key] != job.spec:
+                job.close()
+                del self.jobs[key]
+                removed += 1
+        for key, spec in wanted.items():
+            if key not in self.jobs:
+                job = Job(spec, now)
+                self.jobs[key] = job
+                heapq.heappush(self.heap, (job.nominal, next(self._order), job))
+                added += 1
+        print(f"[monitor] config loaded: {len(self.jobs)} jobs (+{added} -{removed})")
+
+    def _config_changed(self):
+        try:
+            return os.path.getmtime(self.config_path) != self._config_mtime
+        except OSError:
+            return False
+
+    # ---- probing ----
+    def record(self, job, status, value):
+        job.release()
+        if not job.active:
+            return
+        now = time.time()
+        if self.store is not None:
+            self.store.append(job.target, job.mode, now, value if isinstance(value, float) else None,
+                              status)
+        with self._lock:
+            self.writer.writerow([now, next(self._rows), job.target, job.mode, status, value])
+            if isinstance(value, float):
+                self.stats["ok"] += 1
+                self.sketches.setdefault(job.mode, LatencySketch()).add(value)
+            elif status in ("lost", "no-reply"):
+                self.stats["lost"] += 1
+            elif status != "sent":
+                self.stats["error"] += 1
+
+    def _run_blocking(self, job):
+        try:
+            if job.mode == "icmp":
+                self.mux.probe(icmp_address(job), job.spec["timeout"],
+                               lambda st, v: self.record(job, st, v))
+                return
+            status, value = BLOCKING_PROBES[job.mode](job)
+        except Exception as e:
+            status, value = "error", str(e)
+        self.record(job, status, value)
+
+    def fire(self, job):
+        if job.in_flight:
+            with self._lock:
+                self.stats["skipped"] += 1
+            return
+        job.in_flight = True
+        if job.mode == "icmp":
+            if self.mux is None:
+                self.record(job, "error", "ICMP sockets not permitted")
+                return
+            addr = resolver.peek(job.target, socket.AF_INET)
+            if addr is not None:
+                self.mux.probe(addr, job.spec["timeout"], lambda st, v: self.record(job, st, v))
+                return
+        self.pool.submit(self._run_blocking, job)
+
+    # ---- main loop ----
+    def summary(self, elapsed):
+        with self._lock:
+            stats, sketches = self.stats, self.sketches
+            self._reset_stats()
+        total = stats["ok"] + stats["lost"] + stats["error"]
+        modes = " | ".join(f"{m} n={s.count} p50={s.quantile(0.5):.2f} p99={s.quantile(0.99):.2f} ms"
+                           for m, s in sorted(sketches.items()))
+        print(f"[monitor] {len(self.jobs)} jobs, {total / elapsed:.1f} probes/s, ok={stats['ok']} "
+              f"lost={stats['lost']} error={stats['error']} skipped={stats['skipped']}"
+              + (f" | {modes}" if modes else ""))
+
+    def run(self):
+        self.reload()
+        last_summary = last_check = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if self._reload.is_set() or (now - last_check >= self.reload_interval
+                                         and self._config_changed()):
+                self._reload.clear()
+                self.reload()
+            if now - last_check >= self.reload_interval:
+                last_check = now
+            while self.heap and self.heap[0][0] <= now:
+                _due, _, job = heapq.heappop(self.heap)
+                if not job.active:
+                    continue
+                self.fire(job)
+                heapq.heappush(self.heap, (job.next_due(now), next(self._order), job))
+            if now - last_summary >= self.summary_interval:
+                self.summary(now - last_summary)
+                last_summary = now
+            wait = self.heap[0][0] - time.monotonic() if self.heap else 0.5
+            self._stop.wait(min(max(0.0, wait), 0.5))
+
+    def request_reload(self, *_):
+        self._reload.set()
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self.mux:
+            self.mux.close()
+        for job in self.jobs.values():
+            job.close()
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--config", required=True, help="JSON job list (re-read when it changes)")
+    p.add_argument("--output", default=DEFAULT_OUTPUT, help="CSV, or *.rtlog for the columnar format")
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                   help="threads for TCP/HTTP/UDP/DNS probes (ICMP needs none)")
+    p.add_argument("--summary-interval", type=float, default=10.0, help="seconds between summaries")
+    p.add_argument("--reload-interval", type=float, default=5.0,
+                   help="seconds between config mtime checks")
+    p.add_argument("--serve", type=int, default=None, metavar="PORT",
+                   help="keep recent results in memory and serve them on 127.0.0.1:PORT")
+    p.add_argument("--unix-socket", default=None, help="serve the query API on this Unix socket")
+    p.add_argument("--capacity", type=int, default=ts_store.DEFAULT_CAPACITY,
+                   help="samples kept per (target, mode) for --serve")
+    p.add_argument("--retention", type=float, default=ts_store.DEFAULT_RETENTION,
+                   help="seconds of history served by --serve")
+    args = p.parse_args()
+
+    store = server = None
+    if args.serve or args.unix_socket:
+        store = ts_store.TimeSeriesStore(args.capacity, args.retention)
+        server = ts_store.serve(store, args.serve, unix_path=args.unix_socket)
+        print(f"[monitor] query API on {args.unix_socket or f'http://127.0.0.1:{args.serve}'}")
+
+    header = ["timestamp", "seq", "target", "mode", "status", "latency_ms_or_info"]
+    new_file = not os.path.exists(args.output) or os.path.getsize(args.output) == 0
+
+    def to_record(row):
+        ts, seq, target, mode, status, val = row
+        numeric = isinstance(val, float)
+        return dict(timestamp=ts, seq=seq, latency_ms=val if numeric else None, status=status,
+                    target=target, tag=mode, info="" if numeric or val is None else val)
+
+    with open_writer(args.output, header if new_file else None,
+                     formats=[".3f", None, None, None, None, ".3f"],
+                     to_record=to_record, mode="a") as writer:
+        monitor = Monitor(args.config, writer, workers=args.workers,
+                          summary_interval=args.summary_interval,
+                          reload_interval=args.reload_interval, store=store)
+        signal.signal(signal.SIGINT, monitor.stop)
+        signal.signal(signal.SIGTERM, monitor.stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, monitor.request_reload)
+        try:
+            monitor.run()
+        finally:
+            monitor.close()
+            if server:
+                server.shutdown()
+    print(f"[monitor] stopped. Output: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,770 @@
+"""
+pcap_parser.py
+--------------
+A small pure-Python reader for the .pcap / .pcapng files written by tcpdump.
+
+Instead of handing every packet to tshark (which is what PyShark does), this
+module reads the capture file directly and decodes only the headers our
+analysis needs:
+
+    • link layer   – Ethernet (incl. VLAN tags), BSD loopback (lo0),
+                     Linux cooked capture (SLL / SLL2) and raw IP
+    • network      – IPv4 and IPv6 (extension headers are skipped)
+    • transport    – TCP / UDP / ICMP / ICMPv6
+
+Every packet is reduced to one small tuple:
+
+    (timestamp, protocol, icmp_type, icmp_id, icmp_seq)
+
+where `protocol` follows PyShark's `pkt.transport_layer` ("TCP", "UDP" or
+None) so the counts match what analyze_pcap.py printed before, and the ICMP
+fields are None for anything that is not an ICMP packet.
+
+decode_segment() is the variant for TCP flow analysis: it appends a sixth
+field, the TCP segment
+
+    (src, dst, sport, dport, seq, ack, flags, payload_len)
+
+(None for anything else), with addresses as integers so a flow key can be
+packed into a single int (see format_addr). scan_mmap(decode=...) selects
+the decoder.
+"""
+
+import ipaddress
+import mmap
+import struct
+import zlib
+
+# -----------------------------------------------------------
+# File format constants
+# -----------------------------------------------------------
+PCAP_MAGIC_US = 0xA1B2C3D4      # classic pcap, microsecond timestamps
+PCAP_MAGIC_NS = 0xA1B23C4D      # classic pcap, nanosecond timestamps
+PCAPNG_SHB = 0x0A0D0D0A         # pcapng Section Header Block
+PCAPNG_BOM = 0x1A2B3C4D         # pcapng byte-order magic
+
+PCAPNG_IDB = 0x00000001         # Interface Description Block
+PCAPNG_OPB = 0x00000002         # (obsolete) Packet Block
+PCAPNG_SPB = 0x00000003         # Simple Packet Block
+PCAPNG_EPB = 0x00000006         # Enhanced Packet Block
+
+# Link-layer header types we know how to strip.
+LINKTYPE_NULL = 0               # BSD loopback (macOS lo0), host byte order
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108             # OpenBSD loopback, network byte order
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# Address family values used by the loopback pseudo-header
+# (2 everywhere; AF_INET6 is 24, 28 or 30 on the BSDs and 10 on Linux).
+AF_INET = 2
+AF_INET6 = (10, 24, 28, 30)
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_ICMPV6 = 58
+
+# IPv6 extension headers that may sit between the fixed header and L4.
+IPV6_EXT_HEADERS = (0, 43, 60)  # hop-by-hop, routing, destination options
+IPV6_FRAGMENT = 44
+IPV6_AH = 51
+
+TRANSPORT_NAMES = {IPPROTO_TCP: "TCP", IPPROTO_UDP: "UDP"}
+
+# ICMP echo types (v4 and v6) used for RTT matching.
+ICMP_ECHO_REQUEST = (8, 128)
+ICMP_ECHO_REPLY = (0, 129)
+
+_U16_BE = struct.Struct("!H")
+_U32_BE = struct.Struct("!I")
+_U32_LE = struct.Struct("<I")
+_ICMP_ECHO = struct.Struct("!BBHHH")  # type, code, checksum, id, seq
+_TCP_HEADER = struct.Struct("!HHIIH")  # sport, dport, seq, ack, data offset + flags
+_IPV6_ADDRS = struct.Struct("!QQQQ")  # src hi/lo, dst hi/lo
+
+# TCP flag bits.
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+# decode_segment() sets this bit on IPv6 addresses so they can never
+# collide with an IPv4 address of the same integer value.
+IPV6_TAG = 1 << 128
+
+
+class PcapFormatError(ValueError):
+    """Raised when a file is not a pcap/pcapng capture we can read."""
+
+
+# ===========================================================
+# Packet decoding
+# ===========================================================
+def _network_offset(linktype, buf, start, end):
+    """
+    Return (ip_version, offset) for the start of the IP header, or
+    (None, None) if the frame buf[start:end] does not carry IPv4/IPv6.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        if end - start < 14:
+            return None, None
+        ethertype = _U16_BE.unpack_from(buf, start + 12)[0]
+        off = start + 14
+        # Skip any stacked 802.1Q / 802.1ad VLAN tags.
+        while ethertype in ETHERTYPE_VLAN and end >= off + 4:
+            ethertype = _U16_BE.unpack_from(buf, off + 2)[0]
+            off += 4
+    elif linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if end - start < 4:
+            return None, None
+        # The family is written in the capturing host's byte order for
+        # LINKTYPE_NULL, so accept either interpretation.
+        family = _U32_LE.unpack_from(buf, start)[0]
+        if family > 0xFFFF:
+            family = _U32_BE.unpack_from(buf, start)[0]
+        if family == AF_INET:
+            return 4, start + 4
+        if family in AF_INET6:
+            return 6, start + 4
+        return None, None
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if end - start < 16:
+            return None, None
+        ethertype = _U16_BE.unpack_from(buf, start + 14)[0]
+        off = start + 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        if end - start < 20:
+            return None, None
+        ethertype = _U16_BE.unpack_from(buf, start)[0]
+        off = start + 20
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if end <= start:
+            return None, None
+        version = buf[start] >> 4
+        return (version, start) if version in (4, 6) else (None, None)
+    else:
+        return None, None
+
+    if ethertype == ETHERTYPE_IPV4:
+        return 4, off
+    if ethertype == ETHERTYPE_IPV6:
+        return 6, off
+    return None, None
+
+
+def _transport(version, buf, off, end):
+    """
+    Walk the IP header starting at `off` and return (ip_proto, l4_offset).
+    l4_offset is None when the transport header is not in this packet
+    (truncated capture or a non-first fragment).
+    """
+    if version == 4:
+        if end < off + 20:
+            return None, None
+        ihl = (buf[off] & 0x0F) * 4
+        proto = buf[off + 9]
+        frag = _U16_BE.unpack_from(buf, off + 6)[0] & 0x1FFF
+        l4 = off + ihl
+        return proto, (l4 if frag == 0 and l4 <= end else None)
+
+    if end < off + 40:
+        return None, None
+    proto = buf[off + 6]
+    l4 = off + 40
+    while True:
+        if proto in IPV6_EXT_HEADERS:
+            if end < l4 + 2:
+                return proto, None
+            proto, l4 = buf[l4], l4 + (buf[l4 + 1] + 1) * 8
+        elif proto == IPV6_FRAGMENT:
+            if end < l4 + 8:
+                return proto, None
+            frag = _U16_BE.unpack_from(buf, l4 + 2)[0] & 0xFFF8
+            proto, l4 = buf[l4], l4 + 8
+            if frag:
+                return proto, None
+        elif proto == IPV6_AH:
+            if end < l4 + 2:
+                return proto, None
+            proto, l4 = buf[l4], l4 + (buf[l4 + 1] + 2) * 4
+        else:
+            return proto, (l4 if l4 <= end else None)
+
+
+def decode_packet(linktype, buf, start=0, end=None):
+    """
+    Decode one captured frame, buf[start:end]. Offsets let callers decode
+    in place from a larger buffer (e.g. an mmap) without slicing it.
+
+    Returns (protocol, icmp_type, icmp_id, icmp_seq); see the module
+    docstring for what each field means.
+    """
+    if end is None:
+        end = len(buf)
+    version, off = _network_offset(linktype, buf, start, end)
+    if version is None:
+        return None, None, None, None
+    proto, l4 = _transport(version, buf, off, end)
+    if proto in (IPPROTO_ICMP, IPPROTO_ICMPV6) and l4 is not None and end >= l4 + 8:
+        icmp_type, _code, _csum, ident, seq = _ICMP_ECHO.unpack_from(buf, l4)
+        return None, icmp_type, ident, seq
+    return TRANSPORT_NAMES.get(proto), None, None, None
+
+
+def decode_echo(linktype, buf, start=0, end=None):
+    """
+    decode_packet() plus a CRC-32 of the ICMP echo payload (None for other
+    packets), so a re-sent echo can be told apart from a new probe that
+    reuses the same id and sequence number.
+    """
+    if end is None:
+        end = len(buf)
+    version, off = _network_offset(linktype, buf, start, end)
+    if version is None:
+        return None, None, None, None, None
+    proto, l4 = _transport(version, buf, off, end)
+    if proto in (IPPROTO_ICMP, IPPROTO_ICMPV6) and l4 is not None and end >= l4 + 8:
+        icmp_type, _code, _csum, ident, seq = _ICMP_ECHO.unpack_from(buf, l4)
+        return None, icmp_type, ident, seq, zlib.crc32(buf[l4 + 8:end])
+    return TRANSPORT_NAMES.get(proto), None, None, None, None
+
+
+def _tcp_segment(version, buf, off, l4, end):
+    """The TCP segment tuple for an IP packet at `off` whose TCP header is at l4."""
+    if end < l4 + 14:
+        return None
+    sport, dport, seq, ack, off_flags = _TCP_HEADER.unpack_from(buf, l4)
+    if version == 4:
+        src, dst = _U32_BE.unpack_from(buf, off + 12)[0], _U32_BE.unpack_from(buf, off + 16)[0]
+        total = _U16_BE.unpack_from(buf, off + 2)[0]
+        # Segmentation offload captures can carry a zero total length; fall back to caplen.
+        ip_end = off + total if total else end
+    else:
+        src_hi, src_lo, dst_hi, dst_lo = _IPV6_ADDRS.unpack_from(buf, off + 8)
+        src = IPV6_TAG | (src_hi << 64) | src_lo
+        dst = IPV6_TAG | (dst_hi << 64) | dst_lo
+        plen = _U16_BE.unpack_from(buf, off + 4)[0]
+        ip_end = off + 40 + plen if plen else end
+    # Lengths come from the IP header, so snaplen-truncated captures still count every byte.
+    payload_len = max(0, ip_end - l4 - (off_flags >> 12) * 4)
+    return src, dst, sport, dport, seq, ack, off_flags & 0xFF, payload_len
+
+
+def decode_segment(linktype, buf, start=0, end=None):
+    """
+    decode_packet() plus the TCP segment: returns (protocol, icmp_type,
+    icmp_id, icmp_seq, segment), segment being None for non-TCP packets.
+    """
+    if end is None:
+        end = len(buf)
+    version, off = _network_offset(linktype, buf, start, end)
+    if version is None:
+        return None, None, None, None, None
+    proto, l4 = _transport(version, buf, off, end)
+    if proto == IPPROTO_TCP:
+        segment = _tcp_segment(version, buf, off, l4, end) if l4 is not None else None
+        return "TCP", None, None, None, segment
+    if proto in (IPPROTO_ICMP, IPPROTO_ICMPV6) and l4 is not None and end >= l4 + 8:
+        icmp_type, _code, _csum, ident, seq = _ICMP_ECHO.unpack_from(buf, l4)
+        return None, icmp_type, ident, seq, None
+    return TRANSPORT_NAMES.get(proto), None, None, None, None
+
+
+def format_addr(addr):
+    """Text form of an address integer from decode_segment()."""
+    if addr & IPV6_TAG:
+        return str(ipaddress.IPv6Address(addr & ~IPV6_TAG))
+    return str(ipaddress.IPv4Address(addr))
+
+
+# ===========================================================
+# File readers
+# ===========================================================
+def _read_exact(f, n):
+    buf = f.read(n)
+    return buf if len(buf) == n else None
+
+
+def _pcap_header(header):
+    """Return (endian, seconds_per_tick, linktype) from a pcap global header."""
+    magic_le = _U32_LE.unpack_from(header, 0)[0]
+    if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        endian = "<"
+    else:
+        endian = ">"
+    magic = struct.unpack_from(endian + "I", header, 0)[0]
+    scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+    linktype = struct.unpack_from(endian + "I", header, 20)[0] & 0x0FFFFFFF
+    return endian, scale, linktype
+
+
+def _capture_kind(header):
+    """Return "pcap", "pcapng" or None from the first bytes of a file."""
+    magic_le = _U32_LE.unpack_from(header, 0)[0]
+    magic_be = _U32_BE.unpack_from(header, 0)[0]
+    if magic_le == PCAPNG_SHB:
+        return "pcapng"
+    if PCAP_MAGIC_US in (magic_le, magic_be) or PCAP_MAGIC_NS in (magic_le, magic_be):
+        return "pcap"
+    return None
+
+
+def _iter_pcap(f, header):
+    """Classic libpcap format: 24-byte global header, 16-byte record headers."""
+    endian, scale, linktype = _pcap_header(header)
+
+    record = struct.Struct(endian + "IIII")  # ts_sec, ts_frac, caplen, origlen
+    while True:
+        rec = _read_exact(f, 16)
+        if rec is None:
+            return
+        ts_sec, ts_frac, caplen, _origlen = record.unpack(rec)
+        data = _read_exact(f, caplen)
+        if data is None:
+            return  # truncated final record (capture still being written)
+        yield ts_sec + ts_frac * scale, linktype, data
+
+
+def _tsresol(value):
+    """Decode the pcapng if_tsresol option into seconds per tick."""
+    if value & 0x80:
+        return 2.0 ** -(value & 0x7F)
+    return 10.0 ** -value
+
+
+def _iter_pcapng(f, first):
+    """
+    pcapng: a sequence of typed blocks. We only need interface descriptions
+    (for link type + timestamp resolution) and the packet blocks.
+    """
+    interfaces = []
+    endian = "<"
+    block_type = _U32_LE.unpack_from(first, 0)[0]
+    pending = first
+
+    while True:
+        if pending is None:
+            head = _read_exact(f, 8)
+            if head is None:
+                return
+            if _U32_LE.unpack_from(head, 0)[0] == PCAPNG_SHB:
+                block_type = PCAPNG_SHB
+            else:
+                block_type = struct.unpack_from(endian + "I", head, 0)[0]
+        else:
+            head, pending = pending, None
+
+        if block_type == PCAPNG_SHB:
+            # Byte order can change at every section header.
+            bom = _read_exact(f, 4)
+            if bom is None:
+                return
+            endian = "<" if _U32_LE.unpack(bom)[0] == PCAPNG_BOM else ">"
+            total = struct.unpack_from(endian + "I", head, 4)[0]
+            body = _read_exact(f, total - 12)
+            if body is None:
+                return
+            interfaces = []
+            continue
+
+        total = struct.unpack_from(endian + "I", head, 4)[0]
+        body = _read_exact(f, total - 8)
+        if body is None:
+            return
+
+        if block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(endian + "H", body, 0)[0]
+            scale, offset = 1e-6, 0
+            pos = 8
+            while pos + 4 <= len(body) - 4:
+                code, length = struct.unpack_from(endian + "HH", body, pos)
+                if code == 0:
+                    break
+                if code == 9 and length >= 1:
+                    scale = _tsresol(body[pos + 4])
+                elif code == 14 and length >= 8:
+                    offset = struct.unpack_from(endian + "q", body, pos + 4)[0]
+                pos += 4 + ((length + 3) & ~3)
+            interfaces.append((linktype, scale, offset))
+
+        elif block_type == PCAPNG_EPB:
+            if_id, ts_hi, ts_lo, caplen, _origlen = struct.unpack_from(endian + "IIIII", body, 0)
+            if if_id < len(interfaces):
+                linktype, scale, offset = interfaces[if_id]
+                ts = ((ts_hi << 32) | ts_lo) * scale + offset
+                yield ts, linktype, body[20:20 + caplen]
+
+        elif block_type == PCAPNG_SPB:
+            if interfaces:
+                linktype = interfaces[0][0]
+                origlen = struct.unpack_from(endian + "I", body, 0)[0]
+                # Simple packet blocks carry no timestamp.
+                yield None, linktype, body[4:4 + min(origlen, len(body) - 8)]
+
+        elif block_type == PCAPNG_OPB:
+            if_id, _drops, ts_hi, ts_lo, caplen, _len = struct.unpack_from(endian + "HHIIII", body, 0)
+            if if_id < len(interfaces):
+                linktype, scale, offset = interfaces[if_id]
+                ts = ((ts_hi << 32) | ts_lo) * scale + offset
+                yield ts, linktype, body[20:20 + caplen]
+
+
+def iter_frames(path):
+    """
+    Yield (timestamp, linktype, frame_bytes) for every packet in a
+    pcap or pcapng file.
+    """
+    with open(path, "rb") as f:
+        header = _read_exact(f, 24)
+        if header is None:
+            raise PcapFormatError(f"{path}: file too short to be a capture")
+        kind = _capture_kind(header)
+        if kind == "pcapng":
+            # Rewind to just after the 8-byte block header so the pcapng
+            # reader sees the section header block from the start.
+            f.seek(8)
+            yield from _iter_pcapng(f, header[:8])
+        elif kind == "pcap":
+            yield from _iter_pcap(f, header)
+        else:
+            raise PcapFormatError(f"{path}: unknown capture magic 0x{header[:4].hex()}")
+
+
+def iter_packets(path):
+    """
+    Yield (timestamp, protocol, icmp_type, icmp_id, icmp_seq) per packet.
+    """
+    for ts, linktype, data in iter_frames(path):
+        yield (ts,) + decode_packet(linktype, data)
+
+
+# ===========================================================
+# Memory-mapped scanning
+# -----------------------------------------------------------
+# The readers above copy every record into a fresh bytes object. For
+# multi-GB captures the mmap path below walks the file in place instead:
+# record headers are read with struct.unpack_from at increasing offsets
+# and packets are decoded straight out of the mapping, so nothing is
+# copied per packet. Pages already scanned are handed back to the kernel
+# every RELEASE_EVERY bytes, which keeps peak RSS flat regardless of the
+# capture size.
+# ===========================================================
+RELEASE_EVERY = 16 * 1024 * 1024
+
+
+def _walk_pcap(buf, start, stop):
+    """
+    Yield (timestamp, linktype, frame_start, frame_end) for every classic
+    pcap record whose header begins in [start, stop).
+    """
+    endian, scale, linktype = _pcap_header(buf)
+    record = struct.Struct(endian + "IIII")
+    size = len(buf)
+    pos = max(start, 24)
+    while pos < stop and pos + 16 <= size:
+        ts_sec, ts_frac, caplen, _origlen = record.unpack_from(buf, pos)
+        data = pos + 16
+        if data + caplen > size:
+            return  # truncated final record
+        yield ts_sec + ts_frac * scale, linktype, data, data + caplen
+        pos = data + caplen
+
+
+def _idb_entry(buf, endian, pos, total):
+    """(linktype, ts_scale, ts_offset) from the Interface Description Block at pos."""
+    body = pos + 8
+    linktype = struct.unpack_from(endian + "H", buf, body)[0]
+    scale, offset = 1e-6, 0
+    opt, opt_end = body + 8, pos + total - 4
+    while opt + 4 <= opt_end:
+        code, length = struct.unpack_from(endian + "HH", buf, opt)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            scale = _tsresol(buf[opt + 4])
+        elif code == 14 and length >= 8:
+            offset = struct.unpack_from(endian + "q", buf, opt + 4)[0]
+        opt += 4 + ((length + 3) & ~3)
+    return linktype, scale, offset
+
+
+def _walk_pcapng(buf, start, stop, state=None):
+    """
+    pcapng counterpart of _walk_pcap (block offsets instead of records).
+
+    Without `state` the block chain is followed from the start of the file
+    so the section byte order and interface table are known at `start`.
+    shard_ranges() supplies that (endian, interfaces) pair for each shard,
+    and the walk then begins at `start` directly.
+    """
+    if state is None:
+        endian, interfaces, pos = "<", [], 0
+    else:
+        endian, interfaces, pos = state[0], list(state[1]), start
+    size = len(buf)
+    while pos + 12 <= size:
+        if _U32_LE.unpack_from(buf, pos)[0] == PCAPNG_SHB:
+            endian = "<" if _U32_LE.unpack_from(buf, pos + 8)[0] == PCAPNG_BOM else ">"
+            interfaces = []
+            block_type = PCAPNG_SHB
+        else:
+            block_type = struct.unpack_from(endian + "I", buf, pos)[0]
+        total = struct.unpack_from(endian + "I", buf, pos + 4)[0]
+        if total < 12 or pos + total > size:
+            return
+        body = pos + 8
+
+        if block_type == PCAPNG_IDB:
+            interfaces.append(_idb_entry(buf, endian, pos, total))
+
+        elif pos >= start and block_type in (PCAPNG_EPB, PCAPNG_OPB):
+            if block_type == PCAPNG_EPB:
+                if_id, ts_hi, ts_lo, caplen = struct.unpack_from(endian + "IIII", buf, body)
+            else:
+                if_id, _drops, ts_hi, ts_lo, caplen = struct.unpack_from(endian + "HHIII", buf, body)
+            if if_id < len(interfaces):
+                linktype, scale, offset = interfaces[if_id]
+                yield ((ts_hi << 32) | ts_lo) * scale + offset, linktype, body + 20, body + 20 + caplen
+
+        elif pos >= start and block_type == PCAPNG_SPB and interfaces:
+            origlen = struct.unpack_from(endian + "I", buf, body)[0]
+            yield None, interfaces[0][0], body + 4, body + 4 + min(origlen, total - 16)
+
+        pos += total
+        if pos >= stop:
+            return
+
+
+def _open_mmap(path):
+    """Map `path` read-only; returns (mmap, memoryview, kind) or None if empty."""
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None  # empty file
+    view = memoryview(mm)
+    kind = _capture_kind(view) if len(view) >= 24 else None
+    if kind is None:
+        view.release()
+        mm.close()
+        raise PcapFormatError(f"{path}: not a pcap/pcapng capture")
+    return mm, view, kind
+
+
+def _record_offsets(buf, kind):
+    """Yield the byte offset of every record (pcap) or block (pcapng)."""
+    size = len(buf)
+    if kind == "pcap":
+        endian, _scale, _linktype = _pcap_header(buf)
+        caplen_at = struct.Struct(endian + "I")
+        pos = 24
+        while pos + 16 <= size:
+            yield pos
+            pos += 16 + caplen_at.unpack_from(buf, pos + 8)[0]
+        return
+    endian = "<"
+    pos = 0
+    while pos + 12 <= size:
+        if _U32_LE.unpack_from(buf, pos)[0] == PCAPNG_SHB:
+            endian = "<" if _U32_LE.unpack_from(buf, pos + 8)[0] == PCAPNG_BOM else ">"
+        total = struct.unpack_from(endian + "I", buf, pos + 4)[0]
+        if total < 12:
+            return
+        yield pos
+        pos += total
+
+
+def count_untimed(path):
+    """
+    Number of packets in `path` without a timestamp (pcapng Simple Packet
+    Blocks). Only block headers are read; classic pcap is always 0.
+    """
+    opened = _open_mmap(path)
+    if opened is None:
+        return 0
+    mm, view, kind = opened
+    try:
+        if kind != "pcapng":
+            return 0
+        # Block types are in the section's byte order; SPB is 3 either way round.
+        return sum(1 for pos in _record_offsets(view, kind)
+                   if _U32_LE.unpack_from(view, pos)[0] in (PCAPNG_SPB, PCAPNG_SPB << 24))
+    finally:
+        view.release()
+        mm.close()
+
+
+def _pcapng_cuts(buf, step, shards):
+    """
+    shard_ranges() for pcapng: one pass over the block headers (IDBs are
+    parsed, nothing else) recording each cut with the section byte order
+    and interface table in force there.
+    """
+    endian, interfaces = "<", []
+    cuts = [(0, None)]
+    size = len(buf)
+    pos = 0
+    while pos + 12 <= size:
+        if _U32_LE.unpack_from(buf, pos)[0] == PCAPNG_SHB:
+            endian = "<" if _U32_LE.unpack_from(buf, pos + 8)[0] == PCAPNG_BOM else ">"
+            interfaces = []
+            block_type = PCAPNG_SHB
+        else:
+            block_type = struct.unpack_from(endian + "I", buf, pos)[0]
+        total = struct.unpack_from(endian + "I", buf, pos + 4)[0]
+        if total < 12 or pos + total > size:
+            break
+        if len(cuts) < shards and pos >= step * len(cuts):
+            cuts.append((pos, (endian, tuple(interfaces))))
+        if block_type == PCAPNG_IDB:
+            interfaces.append(_idb_entry(buf, endian, pos, total))
+        pos += total
+    return cuts
+
+
+def shard_ranges(path, shards):
+    """
+    Split a capture into at most `shards` byte ranges whose boundaries fall
+    exactly on record (block) starts. Returns [(start, stop, state), ...]
+    to pass on to scan_mmap(path, start, stop, state=state). Only record
+    headers are read to find the boundaries; no packet is decoded.
+
+    For pcapng `state` is the byte order and interface table in force at
+    `start`, so no shard has to walk the block chain from the start of the
+    file to learn them; for classic pcap it is None.
+    """
+    opened = _open_mmap(path)
+    if opened is None:
+        return []
+    mm, view, kind = opened
+    try:
+        size = len(view)
+        step = size / max(1, shards)
+        if kind == "pcapng":
+            cuts = _pcapng_cuts(view, step, shards)
+        else:
+            cuts = [(0, None)]
+            for pos in _record_offsets(view, kind):
+                if pos >= step * len(cuts):
+                    cuts.append((pos, None))
+                    if len(cuts) == shards:
+                        break
+        bounds = [pos for pos, _state in cuts[1:]] + [size]
+        return [(a, b, state) for (a, state), b in zip(cuts, bounds) if a < b]
+    finally:
+        view.release()
+        mm.close()
+
+
+def scan_mmap(path, start=0, stop=None, decode=decode_packet, state=None):
+    """
+    Memory-mapped equivalent of iter_packets(): yields the same
+    (timestamp, protocol, icmp_type, icmp_id, icmp_seq) tuples, or
+    (timestamp,) + decode_segment(...) with decode=decode_segment.
+
+    `start`/`stop` restrict the scan to records beginning in that byte
+    range, and `state` is the pcapng state shard_ranges() returned with
+    it; by default the whole file is scanned.
+
+    Classic pcap records are walked inline (one unpack_from per record
+    header, no generator hop or slicing per packet). Decoding costs the
+    same as in iter_packets(), so for a capture that fits in the page
+    cache this is only on par with it; what mmap buys is flat memory on
+    captures larger than RAM, and byte ranges that shards can scan
+    without reading the records before them.
+    """
+    opened = _open_mmap(path)
+    if opened is None:
+        return
+    mm, view, kind = opened
+    try:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        stop = len(view) if stop is None else stop
+        release = hasattr(mmap, "MADV_DONTNEED")
+        released = start - start % mmap.PAGESIZE
+        next_release = released + RELEASE_EVERY
+        if kind == "pcapng":
+            for ts, linktype, first, end in _walk_pcapng(view, start, stop, state):
+                yield (ts, *decode(linktype, view, first, end))
+                if release and first >= next_release:
+                    done = first - first % mmap.PAGESIZE
+                    mm.madvise(mmap.MADV_DONTNEED, released, done - released)
+                    released, next_release = done, done + RELEASE_EVERY
+            return
+
+        # Classic pcap: _walk_pcap inlined.
+        endian, scale, linktype = _pcap_header(view)
+        unpack = struct.Struct(endian + "IIII").unpack_from
+        size = len(view)
+        pos = max(start, 24)
+        while pos < stop and pos + 16 <= size:
+            ts_sec, ts_frac, caplen, _origlen = unpack(view, pos)
+            first = pos + 16
+            pos = first + caplen
+            if pos > size:
+                return  # truncated final record
+            yield (ts_sec + ts_frac * scale, *decode(linktype, view, first, pos))
+            if release and first >= next_release:
+                done = first - first % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_DONTNEED, released, done - released)
+                released, next_release = done, done + RELEASE_EVERY
+    finally:
+        view.release()
+        mm.close()
+
+
+# ===========================================================
+# Streaming parser
+# -----------------------------------------------------------
+# For live analysis tcpdump writes classic pcap to stdout (`-w -`) and
+# bytes arrive in arbitrary chunks. PcapStream buffers only the partial
+# record at the end of each chunk and decodes every complete record.
+# ===========================================================
+class PcapStream:
+    """Incremental classic-pcap parser: feed() bytes, get packet tuples."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._record = None
+        self._scale = None
+        self._linktype = None
+
+    def feed(self, data):
+        """
+        Add a chunk of the stream and return a list of
+        (timestamp, protocol, icmp_type, icmp_id, icmp_seq) tuples for
+        every record completed by it.
+        """
+        buf = self._buf
+        buf += data
+        pos = 0
+        if self._record is None:
+            if len(buf) < 24:
+                return []
+            if _capture_kind(buf) != "pcap":
+                raise PcapFormatError("stream is not classic pcap (use tcpdump -w -)")
+            endian, self._scale, self._linktype = _pcap_header(buf)
+            self._record = struct.Struct(endian + "IIII")
+            pos = 24
+
+        record, scale, linktype = self._record, self._scale, self._linktype
+        packets = []
+        size = len(buf)
+        while pos + 16 <= size:
+            ts_sec, ts_frac, caplen, _origlen = record.unpack_from(buf, pos)
+            end = pos + 16 + caplen
+            if end > size:
+                break
+            packets.append((ts_sec + ts_frac * scale,) + decode_packet(linktype, buf, pos + 16, end))
+            pos = end
+        del buf[:pos]
+        return packets
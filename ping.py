@@ -11,11 +11,27 @@ The output is used as the input for later packet-capture and analysis steps:
 
 This script therefore provides the controlled "ground truth" RTT values
 that we compare against the packet capture.
+
+Rows go through log_writer.BufferedCsvWriter, which writes them from a
+background thread so disk I/O never delays the next ping. The same thread
+feeds every RTT into a latency sketch (latency_sketch.py) that is merged
+into sketch_file, so percentiles accumulate across runs.
+
+Pings go out on a fixed grid (timing.Schedule: ping k is sent at
+start + k × interval, however long each ping takes) over one reusable ICMP
+socket (probe_engine.IcmpPinger). Its RTT ends at the kernel's receive
+timestamp, so sub-millisecond localhost values measure the loopback path
+rather than interpreter wake-up time. Without ICMP socket permission it
+falls back to ping3.
 """
 
-import os
 from ping3 import ping
-import csv, time
+import itertools, time
+
+from log_writer import open_writer
+from latency_sketch import LatencySketch, merge_into
+import probe_engine
+import timing
 
 # -----------------------------------------------------------
 # CONFIGURATION
@@ -28,23 +44,49 @@ host = "localhost"
 
 # Output CSV used for logging timestamps + measured RTT.
 # Each row = (send_timestamp, latency_ms)
+# Use a .rtlog extension instead to write the typed columnar format (probe_log.py).
 output_file = f"csv_files/ping_log_{host}.csv"
 
 # Number of ping samples to send and the delay between them.
 samples = 5  # total number of pings to send
 interval = 1 # seconds between each ping
 
+# Mergeable RTT sketch for this host; set to None to skip saving it.
+sketch_file = f"csv_files/ping_sketch_{host}.json"
+
 
 # -----------------------------------------------------------
 # OPEN OUTPUT CSV + START TRAFFIC GENERATION LOOP
 # -----------------------------------------------------------
-with open(output_file, "w", newline="") as f:
-	writer = csv.writer(f)
-	writer.writerow(["timestamp", "latency_ms"])
+# Maps a (timestamp, rtt) row onto the columnar .rtlog fields.
+seq_numbers = itertools.count()
+def to_record(row):
+	t, rtt = row
+	ok = isinstance(rtt, float)
+	return dict(timestamp=t, seq=next(seq_numbers), latency_ms=rtt if ok else None,
+				status="ok" if ok else "lost", target=host, tag="icmp")
+
+sketch = LatencySketch()
+def observe(batch):
+	sketch.update([rtt for _t, rtt in batch if isinstance(rtt, float)])
+
+# Floats are formatted by the writer thread (latency to the microsecond); rows are flushed
+# at least once a second, so an interrupted run loses at most that much.
+with open_writer(output_file, ["timestamp", "latency_ms"], formats=[".2f", ".3f"], to_record=to_record,
+				 observe=observe) as writer:
+	pinger = probe_engine.IcmpPinger() if probe_engine.icmp_available() else None
+	schedule = timing.Schedule(interval)
 	for i in range(samples):
+		schedule.wait()
 		t = time.time()
-		rtt = ping(host, unit="ms")
-		writer.writerow([f"{t:.2f}",f"{rtt:.2f}" if rtt is not None else "lost"])
+		rtt = pinger.ping(host) if pinger else ping(host, unit="ms")
+		# ping3 returns False (not None) on errors such as an unknown host.
+		writer.writerow([t, rtt if isinstance(rtt, float) else "lost"])
 		print(i, rtt)
-		f.flush() # Force flush ensures data is not lost if the script is interrupted
-		time.sleep(interval) 
+	if pinger:
+		pinger.close()
+
+print("RTT:", sketch.format())
+if sketch_file:
+	merged = merge_into(sketch_file, {host: sketch})
+	print(f"All runs ({sketch_file}):", merged[host].format())
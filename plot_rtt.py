@@ -19,13 +19,51 @@ This tool is used as the final stage of our network monitoring pipeline:
     (4) plot_rtt.py visualizes everything for analysis.
 
 The script accepts paths to one baseline CSV and optional additional CSVs
-(for VPN trials or multi-condition comparisons).
+(for VPN trials or multi-condition comparisons). Columnar .rtlog logs
+(probe_log.py) can be passed anywhere a CSV is accepted, and a directory
+stands for every log in it.
+
+Long series are decimated to about the figure's pixel width before they
+are drawn (--decimate minmax|lttb|none, --points). Min-max keeps the
+extremes of every bucket, so spikes survive, and both methods break the
+line at loss gaps. --band LO HI overlays rolling percentile bands.
+
+Rendering is incremental and parallel:
+    • every input is parsed at most once per run (SeriesCache),
+    • figures are drawn with the object-oriented Figure API on the Agg
+      canvas in a process pool (--jobs),
+    • each output records a key built from the content hashes of its
+      inputs, the plot parameters and this script; outputs whose key is
+      unchanged are skipped, so re-running a report only costs the logs
+      that changed (--force re-renders everything).
 """
 
+import argparse
+import hashlib
+import json
 import os
 import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import probe_log
+
+
+# Helper: load RTTs from a typed .rtlog file (probe_log.py)
+# No column guessing or string coercion needed: latency is already float64.
+def load_probe_log(path):
+    df = probe_log.read_frame(path)
+    df = df[df["status"].str.lower().isin(["ok", "ok-reply"])]
+    series = df["latency_ms"].dropna()
+    if series.empty:
+        raise ValueError("No RTT/latency values in log.")
+    return series
 
 
 # Helper: load a ping CSV safely
@@ -35,6 +73,8 @@ def load_ping_csv(path):
         return None
 
     try:
+        if probe_log.is_probe_log(path):
+            return load_probe_log(path)
         df = pd.read_csv(path)
         # Expect a column representing round-trip time/latency
         if "status" in df.columns:
@@ -65,126 +105,461 @@ def load_ping_csv(path):
         return None
 
 
+# ================================================================
+# PLOTS
+# ---------------------------------------------------------------
+# Every plot builds its own Figure (no pyplot global state), so they
+# can run side by side in worker processes.
+# ================================================================
+FIGSIZE = (10, 4)
+
+
+def _new_axes():
+    fig = Figure(figsize=FIGSIZE)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def _save(fig, outfile):
+    fig.tight_layout()
+    fig.savefig(outfile)
+
+
+# ================================================================
+# DECIMATION
+# ---------------------------------------------------------------
+# A day-long 10 Hz log is ~1M samples, far more than a 1000 px wide
+# figure can show. Series are cut down to about `points` samples first:
+#   minmax – min and max of each equal-width x bucket, in time order.
+#            Spikes are kept exactly; O(n) with reduceat.
+#   lttb   – Largest-Triangle-Three-Buckets, keeps the visual shape.
+# Both insert a NaN (a break in the line) wherever the original samples
+# have a step larger than GAP_FACTOR × the median spacing, so lost probes
+# still show up as gaps instead of being bridged.
+# ================================================================
+DEFAULT_POINTS = FIGSIZE[0] * 100  # figure width in pixels at the default dpi
+DECIMATION = ("minmax", "lttb", "none")
+GAP_FACTOR = 3.0
+
+
+def _xy(series):
+    return series.index.to_numpy(dtype=float), series.to_numpy(dtype=float)
+
+
+def gap_mask(x):
+    """gap_mask(x)[i] is True when x[i] -> x[i+1] skips missing samples."""
+    step = np.diff(x)
+    if len(step) == 0:
+        return step.astype(bool)
+    return step > GAP_FACTOR * np.median(step)
+
+
+def _break_gaps(x, y, picked, gaps):
+    """Take x/y at the sorted indices `picked`, with NaN between picks that span a gap."""
+    crossed = np.concatenate(([0], np.cumsum(gaps)))
+    cut = np.flatnonzero(np.diff(crossed[picked]) > 0) + 1
+    return np.insert(x[picked], cut, np.nan), np.insert(y[picked], cut, np.nan)
+
+
+def minmax_decimate(x, y, points):
+    n = len(x)
+    buckets = max(1, points // 2)
+    if n <= 2 * buckets:
+        return x, y
+    edges = np.linspace(x[0], x[-1], buckets + 1)
+    bucket = np.minimum(np.searchsorted(edges, x, side="right") - 1, buckets - 1)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+
+    lo = np.repeat(np.fmin.reduceat(y, starts), sizes)
+    hi = np.repeat(np.fmax.reduceat(y, starts), sizes)
+    idx = np.arange(n)
+    i_lo = np.minimum.reduceat(np.where(y == lo, idx, n), starts)
+    i_hi = np.minimum.reduceat(np.where(y == hi, idx, n), starts)
+    # all-NaN buckets match nothing; fall back to the bucket's first sample
+    i_lo = np.where(i_lo == n, starts, i_lo)
+    i_hi = np.where(i_hi == n, starts, i_hi)
+
+    picked = np.column_stack([np.minimum(i_lo, i_hi), np.maximum(i_lo, i_hi)]).ravel()
+    return _break_gaps(x, y, picked, gap_mask(x))
+
+
+def lttb(x, y, points):
+    n = len(x)
+    if points < 3 or n <= points:
+        return x, y
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    picked = np.empty(points, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+
+    # Centroid of every bucket's non-NaN samples (NaN for an all-NaN bucket).
+    finite = ~np.isnan(y)
+    count = np.add.reduceat(finite[:edges[-1]].astype(np.int64), edges[:-1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cxs = np.add.reduceat(np.where(finite, x, 0.0)[:edges[-1]], edges[:-1]) / count
+        cys = np.add.reduceat(np.where(finite, y, 0.0)[:edges[-1]], edges[:-1]) / count
+    # Each bucket looks ahead to the next bucket with data (the last point after that).
+    ahead = np.empty((points - 2, 2))
+    cx, cy = (x[-1], y[-1]) if finite[-1] else (np.nan, np.nan)
+    for i in range(points - 3, -1, -1):
+        ahead[i] = cx, cy
+        if count[i]:
+            cx, cy = cxs[i], cys[i]
+
+    # The anchor is the last picked point with a value.
+    first = int(np.argmax(finite))
+    ax, ay = x[first], y[first]
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if not count[i]:
+            picked[i + 1] = lo      # all-NaN bucket: inside a gap, any sample will do
+            continue
+        cx, cy = ahead[i]
+        if np.isnan(cy):
+            cx, cy = x[-1], ay      # no data ahead: keep the largest deviation
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.nanargmax(area))
+        picked[i + 1] = a
+        ax, ay = x[a], y[a]
+    return _break_gaps(x, y, picked, gap_mask(x))
+
+
+def decimate(series, points=DEFAULT_POINTS, method="minmax"):
+    """Return (x, y) arrays with at most ~points samples (plus gap NaNs)."""
+    x, y = _xy(series)
+    if method == "minmax":
+        return minmax_decimate(x, y, points)
+    if method == "lttb":
+        return lttb(x, y, points)
+    return x, y
+
+
+def rolling_band(series, points=DEFAULT_POINTS, percentiles=(10, 90), window=None):
+    """
+    Rolling percentiles of `window` samples (default: two output strides),
+    evaluated at ~points positions. Windows are strided views, so the
+    percentiles of all of them are one vectorized np.nanpercentile call.
+    Returns (x, [band per percentile]).
+    """
+    x, y = _xy(series)
+    n = len(y)
+    if n == 0:
+        return x, np.empty((len(percentiles), 0))
+    stride = max(1, n // points)
+    window = min(n, window or 2 * stride)
+    views = sliding_window_view(y, window)[::stride]
+    with warnings.catch_warnings():
+        # A window inside a gap is all NaN; its band is NaN, which is not drawn.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        bands = np.nanpercentile(views, percentiles, axis=1)
+    centres = x[np.arange(len(views)) * stride + window // 2]
+    return centres, bands
+
+
+def _draw_series(ax, series, label=None, decimation="minmax", points=DEFAULT_POINTS,
+                 band=None, band_window=None):
+    x, y = decimate(series, points, decimation)
+    line, = ax.plot(x, y, label=label)
+    if band:
+        bx, (lo, hi) = rolling_band(series, points, band, band_window)
+        ax.fill_between(bx, lo, hi, color=line.get_color(), alpha=0.25, linewidth=0,
+                        label=f"{label or 'RTT'} p{band[0]:g}-p{band[1]:g}")
+
+
 # Plot: Time series line plot
 
-def plot_line(rtt_series, title, outfile):
-    plt.figure(figsize=(10, 4))
-    plt.plot(rtt_series.index, rtt_series.values)
-    plt.xlabel("Sample Number")
-    plt.ylabel("RTT (ms)")
-    plt.title(title)
-    plt.tight_layout()
-    plt.savefig(outfile)
-    plt.close()
+def plot_line(rtt_series, title, outfile, **opts):
+    fig, ax = _new_axes()
+    _draw_series(ax, rtt_series, **opts)
+    ax.set_xlabel("Sample Number")
+    ax.set_ylabel("RTT (ms)")
+    ax.set_title(title)
+    if opts.get("band"):
+        ax.legend()
+    _save(fig, outfile)
 
 
 
 # Plot: Scatter plot
-def plot_scatter(rtt_series, title, outfile):
-    plt.figure(figsize=(10, 4))
-    plt.scatter(rtt_series.index, rtt_series.values)
-    plt.xlabel("Sample Number")
-    plt.ylabel("RTT (ms)")
-    plt.title(title)
-    plt.tight_layout()
-    plt.savefig(outfile)
-    plt.close()
+def plot_scatter(rtt_series, title, outfile, decimation="minmax", points=DEFAULT_POINTS, **_):
+    fig, ax = _new_axes()
+    x, y = decimate(rtt_series, points, decimation)
+    ax.scatter(x, y)
+    ax.set_xlabel("Sample Number")
+    ax.set_ylabel("RTT (ms)")
+    ax.set_title(title)
+    _save(fig, outfile)
 
 
 # Plot: Histogram
 
-def plot_histogram(rtt_series, title, outfile):
-    plt.figure(figsize=(10, 4))
-    plt.hist(rtt_series.values, bins=30)
-    plt.xlabel("RTT (ms)")
-    plt.ylabel("Frequency")
-    plt.title(title)
-    plt.tight_layout()
-    plt.savefig(outfile)
-    plt.close()
+def plot_histogram(rtt_series, title, outfile, **_):
+    fig, ax = _new_axes()
+    ax.hist(rtt_series.values, bins=30)
+    ax.set_xlabel("RTT (ms)")
+    ax.set_ylabel("Frequency")
+    ax.set_title(title)
+    _save(fig, outfile)
 
 
 
 # Plot: VPN vs Normal RTT Overlay Comparison
 
-def plot_comparison(normal_rtt, vpn_rtt, normal_label, vpn_label, outfile):
-    plt.figure(figsize=(10, 4))
-    plt.plot(normal_rtt.index, normal_rtt.values, label=normal_label)
-    plt.plot(vpn_rtt.index, vpn_rtt.values, label=vpn_label)
-    plt.xlabel("Sample Number")
-    plt.ylabel("RTT (ms)")
-    plt.title("RTT Comparison: Normal vs VPN")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(outfile)
-    plt.close()
+def plot_comparison(normal_rtt, vpn_rtt, normal_label, vpn_label, outfile, **opts):
+    fig, ax = _new_axes()
+    _draw_series(ax, normal_rtt, normal_label, **opts)
+    _draw_series(ax, vpn_rtt, vpn_label, **opts)
+    ax.set_xlabel("Sample Number")
+    ax.set_ylabel("RTT (ms)")
+    ax.set_title("RTT Comparison: Normal vs VPN")
+    ax.legend()
+    _save(fig, outfile)
 
 
-# Main
+# Plot: Many RTT sources on one figure
 
-def plot_multi(series_map, title, outfile):
+def plot_multi(series_map, title, outfile, **opts):
     if not series_map or len(series_map) < 2:
         return
-    plt.figure(figsize=(10, 4))
+    fig, ax = _new_axes()
     for label, s in series_map.items():
-        plt.plot(s.index, s.values, label=label)
-    plt.xlabel("Sample Number")
-    plt.ylabel("RTT (ms)")
-    plt.title(title)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(outfile)
-    plt.close()
+        _draw_series(ax, s, label, **opts)
+    ax.set_xlabel("Sample Number")
+    ax.set_ylabel("RTT (ms)")
+    ax.set_title(title)
+    ax.legend()
+    _save(fig, outfile)
+
+
+PLOTTERS = {
+    "line": plot_line,
+    "scatter": plot_scatter,
+    "hist": plot_histogram,
+    "comparison": plot_comparison,
+    "multi": plot_multi,
+}
+
+
+# ================================================================
+# INPUT CACHE
+# ---------------------------------------------------------------
+# Content hashes are remembered by (size, mtime) in the manifest, so an
+# unchanged log is neither re-read nor re-parsed on the next run.
+# ================================================================
+MANIFEST = ".plot_cache.json"
+LOG_SUFFIXES = (".csv", probe_log.EXTENSION)
+
+
+def file_digest(path, block=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SeriesCache:
+    """Parses each input at most once and hashes it at most once per change."""
+
+    def __init__(self, known_files=None):
+        self.known = dict(known_files or {})
+        self.series = {}
+
+    def digest(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.known.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        digest = file_digest(path)
+        self.known[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def get(self, path):
+        if path not in self.series:
+            self.series[path] = load_ping_csv(path)
+        return self.series[path]
+
+
+def load_manifest(outdir):
+    try:
+        with open(os.path.join(outdir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(outdir, manifest):
+    path = os.path.join(outdir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def render_key(kind, params, input_digests, code_digest):
+    blob = json.dumps([kind, params, input_digests, code_digest], sort_keys=True)
+    return hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+
+
+# ================================================================
+# JOBS
+# ---------------------------------------------------------------
+# A job is (kind, inputs, params, outfile). Inputs are log paths; the
+# worker receives the already parsed series in the same order.
+# ================================================================
+def stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def expand_inputs(paths):
+    files, expanded = [], False
+    for p in paths:
+        if os.path.isdir(p):
+            expanded = True
+            files.extend(sorted(os.path.join(p, f) for f in os.listdir(p)
+                                if f.endswith(LOG_SUFFIXES)))
+        else:
+            files.append(p)
+    return files, expanded
+
+
+def single_jobs(path, outdir, opts):
+    name = stem(path)
+    scatter_opts = {k: opts[k] for k in ("decimation", "points") if k in opts}
+    return [
+        ("line", [path], {"title": f"RTT Over Time: {name}", "opts": opts},
+         f"{outdir}/{name}_line.png"),
+        ("scatter", [path], {"title": f"RTT Scatter: {name}", "opts": scatter_opts},
+         f"{outdir}/{name}_scatter.png"),
+        ("hist", [path], {"title": f"RTT Histogram: {name}"}, f"{outdir}/{name}_hist.png"),
+    ]
+
+
+def plan_jobs(paths, outdir, each=False, opts=None):
+    """opts: decimation/points/band/band_window keywords for the line-style plots."""
+    opts = opts or {}
+    jobs = []
+    for p in (paths if each else paths[:1]):
+        jobs.extend(single_jobs(p, outdir, opts))
+    if len(paths) == 2:
+        a, b = stem(paths[0]), stem(paths[1])
+        jobs.append(("comparison", paths, {"normal_label": a, "vpn_label": b, "opts": opts},
+                     f"{outdir}/{a}_vs_{b}_comparison.png"))
+    elif len(paths) > 2:
+        jobs.append(("multi", paths, {"title": "RTT Comparison", "opts": opts},
+                     f"{outdir}/{stem(paths[0])}_multi_comparison.png"))
+    return jobs
+
+
+def render_job(kind, series, params, outfile):
+    """Worker entry point: draw one figure and return its path."""
+    opts = params.get("opts", {})
+    if kind == "multi":
+        PLOTTERS[kind](series, params["title"], outfile, **opts)
+    elif kind == "comparison":
+        PLOTTERS[kind](series[0], series[1], params["normal_label"], params["vpn_label"],
+                       outfile, **opts)
+    else:
+        PLOTTERS[kind](series[0], params["title"], outfile, **opts)
+    return outfile
+
+
+def run_jobs(jobs, cache, outdir, workers=None, force=False):
+    """
+    Render every job whose key changed. Returns (rendered, skipped) paths.
+    Jobs whose inputs fail to parse are dropped with a warning.
+    """
+    manifest = load_manifest(outdir)
+    cache.known.update(manifest.get("files", {}))
+    plots = manifest.get("plots", {})
+    code_digest = file_digest(os.path.abspath(__file__))
+
+    todo, skipped = [], []
+    for kind, inputs, params, outfile in jobs:
+        key = render_key(kind, params, [cache.digest(p) for p in inputs], code_digest)
+        if not force and plots.get(outfile) == key and os.path.exists(outfile):
+            skipped.append(outfile)
+            continue
+        if kind == "multi":
+            series = {stem(p): cache.get(p) for p in inputs}
+            series = {k: s for k, s in series.items() if s is not None and not s.empty}
+            if len(series) < 2:
+                continue
+        else:
+            series = [cache.get(p) for p in inputs]
+            if any(s is None for s in series):
+                continue
+        todo.append((kind, series, params, outfile, key))
+
+    rendered = []
+    if workers == 1 or len(todo) <= 1:
+        for kind, series, params, outfile, key in todo:
+            render_job(kind, series, params, outfile)
+            plots[outfile] = key
+            rendered.append(outfile)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(pool.submit(render_job, kind, series, params, outfile), outfile, key)
+                       for kind, series, params, outfile, key in todo]
+            for fut, outfile, key in futures:
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"[ERROR] Failed to render {outfile}: {e}")
+                    continue
+                plots[outfile] = key
+                rendered.append(outfile)
+
+    save_manifest(outdir, {"files": cache.known, "plots": plots})
+    return rendered, skipped
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 plot_rtt.py <ping_csv> [<vpn_ping_csv>|<extra_csv>...]")
+    parser = argparse.ArgumentParser(
+        usage="python3 plot_rtt.py <ping_csv|dir> [<vpn_ping_csv>|<extra_csv>...]")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--outdir", default=os.environ.get("PLOTS_DIR", "plots"))
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="render processes (default: CPU count, 1 = in-process)")
+    parser.add_argument("--each", action="store_true",
+                        help="line/scatter/histogram for every input, not just the first "
+                             "(implied when a directory is given)")
+    parser.add_argument("--force", action="store_true", help="ignore the render cache")
+    parser.add_argument("--decimate", choices=DECIMATION, default="minmax",
+                        help="downsampling for line/scatter plots (default: minmax)")
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS,
+                        help="target samples per series after decimation")
+    parser.add_argument("--band", type=float, nargs=2, metavar=("LO", "HI"), default=None,
+                        help="overlay rolling percentile bands, e.g. --band 10 90")
+    parser.add_argument("--band-window", type=int, default=None,
+                        help="samples per rolling-percentile window (default: 2 output strides)")
+    args = parser.parse_args()
+
+    paths, expanded = expand_inputs(args.paths)
+    if not paths:
+        print("[WARN] No CSV/.rtlog inputs found.")
         sys.exit(1)
-
-    paths = sys.argv[1:]
-    normal_path = paths[0]
-    vpn_path = paths[1] if len(paths) == 2 else None
-    outdir = os.environ.get("PLOTS_DIR", "plots")
-
-    normal_rtt = load_ping_csv(normal_path)
-    if normal_rtt is None:
+    for p in paths:
+        if not os.path.exists(p):
+            print(f"[WARN] File not found: {p}")
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
         sys.exit(1)
 
-    base_name = os.path.splitext(os.path.basename(normal_path))[0]
-
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
-
-    plot_line(normal_rtt, f"RTT Over Time: {base_name}", f"{outdir}/{base_name}_line.png")
-    plot_scatter(normal_rtt, f"RTT Scatter: {base_name}", f"{outdir}/{base_name}_scatter.png")
-    plot_histogram(normal_rtt, f"RTT Histogram: {base_name}", f"{outdir}/{base_name}_hist.png")
-
-    if vpn_path and len(paths) == 2:
-        vpn_rtt = load_ping_csv(vpn_path)
-        if vpn_rtt is not None:
-            vpn_name = os.path.splitext(os.path.basename(vpn_path))[0]
-            plot_comparison(
-                normal_rtt,
-                vpn_rtt,
-                base_name,
-                vpn_name,
-                f"{outdir}/{base_name}_vs_{vpn_name}_comparison.png"
-            )
-            print(f"[OK] VPN comparison plot saved to {outdir}/{base_name}_vs_{vpn_name}_comparison.png")
-
-    if len(paths) > 2:
-        series_map = {}
-        for p in paths:
-            s = load_ping_csv(p)
-            if s is not None and not s.empty:
-                series_map[os.path.splitext(os.path.basename(p))[0]] = s
-        if len(series_map) >= 2:
-            multi_name = os.path.splitext(os.path.basename(paths[0]))[0] + "_multi"
-            plot_multi(series_map, "RTT Comparison", f"{outdir}/{multi_name}_comparison.png")
-            print(f"[OK] Multi comparison plot saved to {outdir}/{multi_name}_comparison.png")
-
-    print(f"[OK] RTT plots generated successfully in {outdir}.")
+    os.makedirs(args.outdir, exist_ok=True)
+    cache = SeriesCache()
+    opts = {"decimation": args.decimate, "points": args.points}
+    if args.band:
+        opts["band"] = sorted(args.band)
+        opts["band_window"] = args.band_window
+    jobs = plan_jobs(paths, args.outdir, each=args.each or expanded, opts=opts)
+    rendered, skipped = run_jobs(jobs, cache, args.outdir, workers=args.jobs, force=args.force)
+
+    for outfile in rendered:
+        if "_comparison" in outfile:
+            print(f"[OK] Comparison plot saved to {outfile}")
+    print(f"[OK] RTT plots generated successfully in {args.outdir} "
+          f"({len(rendered)} rendered, {len(skipped)} unchanged).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,385 @@
+"""
+probe_engine.py
+---------------
+Concurrent, in-process RTT probing with asyncio.
+
+collector.py used to start a new Python interpreter (`python3 ping3 <site>`)
+for every website and sleep between them, so one sweep took minutes. This
+module probes all hosts at once from a single event loop:
+
+    • ICMP echo over an unprivileged datagram socket
+      (SOCK_DGRAM + IPPROTO_ICMP; Linux with ping_group_range, macOS),
+      or a raw socket when running as root
+    • TCP-connect fallback (time of the three-way handshake) when ICMP
+      sockets are not permitted or a host does not answer pings
+
+A semaphore bounds how many hosts are in flight and each host gets its own
+timeout, so a full sweep takes roughly as long as the slowest host.
+Names go through resolver.py's shared cache: each site is resolved once
+per sweep, before its first probe, and the TCP fallback reuses the
+addresses the ICMP pass already looked up.
+
+For large ICMP sweeps BatchPinger goes further: one socket sends echoes to
+every target with a distinct sequence number and a single receive loop
+demultiplexes the replies by (source address, sequence), so the per-host
+cost is one sendto() instead of a socket, a task or a process.
+
+IcmpPinger is the blocking one-echo-at-a-time counterpart for scripts that
+ping on a schedule (ping.py, Trafficgen.py): it keeps one socket open and
+takes the reply time from the kernel's receive timestamp (timing.py).
+"""
+
+import asyncio
+import itertools
+import os
+import select
+import socket
+import struct
+import time
+
+import resolver
+import timing
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+DEFAULT_CONCURRENCY = 50
+DEFAULT_COUNT = 4           # echoes per host (ping3's CLI default)
+DEFAULT_TIMEOUT = 2.0       # seconds per echo / connect
+DEFAULT_TCP_PORT = 443
+
+
+def icmp_checksum(data):
+    """RFC 1071 Internet checksum."""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo(ident, seq, payload=b""):
+    """Build an ICMP echo request packet."""
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    csum = icmp_checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, ident, seq) + payload
+
+
+def parse_echo_reply(data):
+    """
+    Return (ident, seq) for an ICMP echo reply, else None. Raw sockets (and
+    datagram sockets on macOS) deliver the IPv4 header too, so strip it.
+    """
+    if len(data) >= 20 and data[0] >> 4 == 4:
+        data = data[(data[0] & 0x0F) * 4:]
+    if len(data) < 8 or data[0] != ICMP_ECHO_REPLY:
+        return None
+    _type, _code, _csum, ident, seq = struct.unpack_from("!BBHHH", data)
+    return ident, seq
+
+
+def open_icmp_socket():
+    """
+    Open a non-blocking ICMP socket, preferring the unprivileged datagram
+    kind. Returns (sock, is_datagram) or (None, None) if neither is allowed.
+    """
+    for kind in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            s = socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP)
+        except OSError:
+            continue
+        s.setblocking(False)
+        return s, kind == socket.SOCK_DGRAM
+    return None, None
+
+
+def icmp_available():
+    s, _ = open_icmp_socket()
+    if s is None:
+        return False
+    s.close()
+    return True
+
+
+class IcmpPinger:
+    """
+    Blocking single-echo pinger on one reusable ICMP socket. ping() returns
+    the RTT in ms (kernel receive timestamp when SO_TIMESTAMPNS is
+    available) or None when no reply arrives within the timeout.
+    """
+
+    def __init__(self):
+        self.sock, self.is_datagram = open_icmp_socket()
+        if self.sock is None:
+            raise PermissionError("ICMP sockets not permitted")
+        self.kernel_timestamps = timing.enable_rx_timestamps(self.sock)
+        self.ident = os.getpid() & 0xFFFF
+        self._seq = itertools.count(1)
+
+    def resolve(self, host):
+        return resolver.address(host, socket.AF_INET)
+
+    def ping(self, host, timeout=DEFAULT_TIMEOUT):
+        addr = self.resolve(host)
+        seq = next(self._seq) & 0xFFFF
+        packet = build_echo(self.ident, seq, b"probe_engine")
+        sent = timing.send_stamp()
+        self.sock.sendto(packet, (addr, 0))
+        deadline = sent[0] + int(timeout * 1e9)
+        while True:
+            wait = (deadline - time.perf_counter_ns()) / 1e9
+            if wait <= 0 or not select.select([self.sock], [], [], wait)[0]:
+                return None
+            try:
+                data, (src, _port), rx = timing.recv_timestamped(self.sock)
+            except BlockingIOError:
+                continue
+            reply = parse_echo_reply(data)
+            if (reply and src == addr and reply[1] == seq
+                    and (self.is_datagram or reply[0] == self.ident)):
+                return timing.rtt_ms(sent, rx)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def _recv(loop, sock, deadline):
+    """Wait for one datagram on a non-blocking socket until `deadline`."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise asyncio.TimeoutError
+    fut = loop.create_future()
+    loop.add_reader(sock.fileno(), lambda: fut.done() or fut.set_result(None))
+    try:
+        await asyncio.wait_for(fut, remaining)
+    finally:
+        loop.remove_reader(sock.fileno())
+    return sock.recv(65535)
+
+
+async def icmp_probe(addr, count=DEFAULT_COUNT, timeout=DEFAULT_TIMEOUT, ident=None):
+    """
+    Send `count` echo requests to an IPv4 address from one socket and
+    return the list of RTTs in ms (lost echoes are simply missing).
+    Raises OSError if ICMP sockets are not permitted.
+    """
+    loop = asyncio.get_running_loop()
+    sock, is_datagram = open_icmp_socket()
+    if sock is None:
+        raise PermissionError("ICMP sockets not permitted")
+    if ident is None:
+        ident = (os.getpid() ^ id(sock)) & 0xFFFF
+    rtts = []
+    try:
+        for seq in range(count):
+            sent = time.perf_counter()
+            sock.sendto(build_echo(ident, seq, struct.pack("!d", sent)), (addr, 0))
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    data = await _recv(loop, sock, deadline)
+                except asyncio.TimeoutError:
+                    break
+                reply = parse_echo_reply(data)
+                # Datagram sockets have their id rewritten by the kernel and
+                # only ever see their own replies; raw sockets see everyone's.
+                if reply and reply[1] == seq and (is_datagram or reply[0] == ident):
+                    rtts.append((time.perf_counter() - sent) * 1000)
+                    break
+    finally:
+        sock.close()
+    return rtts
+
+
+async def tcp_probe(addr, port=DEFAULT_TCP_PORT, count=DEFAULT_COUNT, timeout=DEFAULT_TIMEOUT):
+    """RTT approximated by TCP connect (SYN -> SYN/ACK) time, in ms."""
+    rtts = []
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            _reader, writer = await asyncio.wait_for(asyncio.open_connection(addr, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            continue
+        rtts.append((time.perf_counter() - start) * 1000)
+        writer.close()
+    return rtts
+
+
+async def probe_host(host, method="auto", count=DEFAULT_COUNT, timeout=DEFAULT_TIMEOUT,
+                     port=DEFAULT_TCP_PORT):
+    """
+    Resolve and probe one host. Returns (method_used, rtts_ms); rtts is
+    empty if the host could not be resolved or never answered.
+    """
+    try:
+        addr = await resolver.default_cache.address_async(host, socket.AF_INET)
+    except socket.gaierror:
+        return method, []
+
+    if method in ("auto", "icmp"):
+        try:
+            rtts = await icmp_probe(addr, count, timeout)
+            if rtts or method == "icmp":
+                return "icmp", rtts
+        except OSError:
+            if method == "icmp":
+                return "icmp", []
+    return "tcp", await tcp_probe(addr, port, count, timeout)
+
+
+async def sweep_async(hosts, method="auto", concurrency=DEFAULT_CONCURRENCY,
+                      count=DEFAULT_COUNT, timeout=DEFAULT_TIMEOUT, port=DEFAULT_TCP_PORT,
+                      on_result=None):
+    """
+    Probe every host concurrently (at most `concurrency` at a time).
+    Each host is bounded by (2 * count + 1) * timeout, enough for the ICMP
+    attempts, the TCP fallback and resolution. Returns {host: (method, rtts)} in input order;
+    on_result(host, method, rtts) is called as each host finishes.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    host_timeout = timeout * (2 * count + 1)
+
+    async def one(host):
+        async with sem:
+            try:
+                used, rtts = await asyncio.wait_for(
+                    probe_host(host, method, count, timeout, port), host_timeout)
+            except asyncio.TimeoutError:
+                used, rtts = method, []
+        if on_result:
+            on_result(host, used, rtts)
+        return host, (used, rtts)
+
+    results = await asyncio.gather(*(one(h) for h in hosts))
+    return dict(results)
+
+
+def sweep(hosts, **kwargs):
+    """Blocking wrapper around sweep_async()."""
+    return asyncio.run(sweep_async(hosts, **kwargs))
+
+
+# ===========================================================
+# Batch ICMP: one socket, all targets
+# ===========================================================
+class BatchPinger:
+    """
+    Ping many IPv4 addresses through a single ICMP socket.
+
+    Every probe gets the next value of a 16-bit sequence counter, so a
+    reply is identified by (source address, seq) no matter how many hosts
+    are in flight; the kernel rewrites the identifier on datagram sockets,
+    so on raw sockets the identifier is checked as well. `rate` (probes/s)
+    paces sending for very large sweeps so the replies do not overflow the
+    socket receive buffer.
+    """
+
+    RCVBUF = 4 * 1024 * 1024
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, rate=None):
+        self.timeout = timeout
+        self.rate = rate
+        self.sock, self.is_datagram = open_icmp_socket()
+        if self.sock is None:
+            raise PermissionError("ICMP sockets not permitted")
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RCVBUF)
+        except OSError:
+            pass
+        self.ident = os.getpid() & 0xFFFF
+        self._seq = itertools.count()
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _drain(self, pending, results, wait):
+        """Receive every reply available within `wait` seconds."""
+        ready, _, _ = select.select([self.sock], [], [], max(0.0, wait))
+        while ready:
+            try:
+                data, (src, _port) = self.sock.recvfrom(65535)
+            except BlockingIOError:
+                return
+            now = time.perf_counter()
+            reply = parse_echo_reply(data)
+            if reply and (self.is_datagram or reply[0] == self.ident):
+                probe = pending.pop((src, reply[1]), None)
+                if probe is not None:
+                    addr, sent = probe
+                    if now - sent <= self.timeout:
+                        results[addr].append((now - sent) * 1000)
+
+    def ping(self, addrs, count=1):
+        """
+        Send `count` rounds of echoes to every address. Returns
+        {addr: [rtt_ms, ...]} with lost probes missing from the lists.
+        """
+        addrs = list(dict.fromkeys(addrs))
+        results = {a: [] for a in addrs}
+        pending = {}
+        gap = 1.0 / self.rate if self.rate else 0.0
+        next_send = time.perf_counter()
+        for _round in range(count):
+            for addr in addrs:
+                seq = next(self._seq) & 0xFFFF
+                now = time.perf_counter()
+                if gap and now < next_send:
+                    self._drain(pending, results, next_send - now)
+                sent = time.perf_counter()
+                try:
+                    self.sock.sendto(build_echo(self.ident, seq), (addr, 0))
+                except OSError:
+                    continue  # unreachable network etc.; counts as lost
+                pending[(addr, seq)] = (addr, sent)
+                next_send = sent + gap
+                self._drain(pending, results, 0)
+        # Collect the stragglers until the newest probe times out.
+        deadline = time.perf_counter() + self.timeout
+        while pending and time.perf_counter() < deadline:
+            self._drain(pending, results, deadline - time.perf_counter())
+        return results
+
+
+def sweep_batch(hosts, method="auto", count=DEFAULT_COUNT, timeout=DEFAULT_TIMEOUT,
+                concurrency=DEFAULT_CONCURRENCY, port=DEFAULT_TCP_PORT, rate=None,
+                on_result=None):
+    """
+    Same contract as sweep(), but all ICMP probing goes through one
+    BatchPinger. With method="auto", hosts that never answer ICMP (or all
+    hosts, if ICMP sockets are not permitted) are retried with the asyncio
+    TCP-connect sweep.
+    """
+    if method == "tcp" or not icmp_available():
+        return sweep(hosts, method=method, count=count, timeout=timeout,
+                     concurrency=concurrency, port=port, on_result=on_result)
+
+    addrs = resolver.prefetch(hosts, socket.AF_INET, concurrency)
+    with BatchPinger(timeout=timeout, rate=rate) as pinger:
+        by_addr = pinger.ping([a for a in addrs.values() if a], count)
+
+    results, missing = {}, []
+    for host in hosts:
+        rtts = list(by_addr.get(addrs[host], [])) if addrs[host] else []
+        if rtts or method == "icmp" or addrs[host] is None:
+            results[host] = ("icmp", rtts)
+            if on_result:
+                on_result(host, "icmp", rtts)
+        else:
+            missing.append(host)
+    if missing:
+        results.update(sweep(missing, method="tcp", count=count, timeout=timeout,
+                             concurrency=concurrency, port=port, on_result=on_result))
+    return {h: results[h] for h in hosts}
@@ -0,0 +1,250 @@
+"""
+probe_log.py
+------------
+Typed, columnar binary log format for probe results (.rtlog).
+
+Our CSV logs mix floats and error strings in one column
+(latency_ms_or_info), so every reader has to coerce and guess. A .rtlog file
+stores each field in its own typed column instead:
+
+    timestamp    float64   UNIX time of the probe
+    seq          int64     probe sequence number
+    latency_ms   float64   RTT / latency, NaN when there is none
+    status       category  ok / lost / error / ...
+    target       category  host or website probed
+    tag          category  mode (icmp/http/...) or condition (baseline/VPN1...)
+    info         category  error text or other non-numeric detail
+    <extra>      float64   optional per-file columns (e.g. ttfb_ms)
+
+Layout (little-endian):
+
+    file header   b"RTLOG\\x00" + u16 version + u32 len + JSON {"extra": [...]}
+    chunk*        b"RTCK" + u32 rows + u32 len + JSON {new categories}
+                  + one contiguous array per column
+
+Writers append whole chunks, so a file can be extended by later runs and a
+crash loses at most the chunk being written. Category tables are shared by
+the file; each chunk only carries the categories it introduces. Only the
+standard library is needed to write; reading uses NumPy (and pandas, if
+installed, to return a DataFrame).
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+try:
+    import pandas as pd
+except Exception:
+    pd = None
+
+EXTENSION = ".rtlog"
+VERSION = 1
+FILE_MAGIC = b"RTLOG\x00"
+CHUNK_MAGIC = b"RTCK"
+
+CATEGORY_COLUMNS = ("status", "target", "tag", "info")
+MAX_CATEGORIES = 0xFFFF
+OVERFLOW = "<overflow>"
+
+_FILE_HEADER = struct.Struct("<6sHI")
+_CHUNK_HEADER = struct.Struct("<4sII")
+_SWAP = sys.byteorder != "little"
+
+
+class ProbeLogError(ValueError):
+    """Raised for files that are not valid .rtlog logs."""
+
+
+def is_probe_log(path):
+    return str(path).endswith(EXTENSION)
+
+
+def _column_layout(extra):
+    """(name, typecode) for every stored column, in on-disk order."""
+    return ([("timestamp", "d"), ("seq", "q"), ("latency_ms", "d")]
+            + [(c, "H") for c in CATEGORY_COLUMNS]
+            + [(name, "d") for name in extra])
+
+
+def _scan(f):
+    """
+    Read the file header and walk the chunks. Yields ("header", extra)
+    once, ("chunk", rows, new_categories, data_offset) for every complete
+    chunk and finally ("end", offset) where the complete chunks stop.
+    """
+    head = f.read(_FILE_HEADER.size)
+    if len(head) < _FILE_HEADER.size:
+        raise ProbeLogError("file too short")
+    magic, version, meta_len = _FILE_HEADER.unpack(head)
+    if magic != FILE_MAGIC or version != VERSION:
+        raise ProbeLogError("not an .rtlog file")
+    extra = json.loads(f.read(meta_len))["extra"]
+    yield "header", extra
+    row_size = sum(array(t).itemsize for _, t in _column_layout(extra))
+    while True:
+        start = f.tell()
+        head = f.read(_CHUNK_HEADER.size)
+        if len(head) < _CHUNK_HEADER.size:
+            yield "end", start
+            return
+        magic, rows, meta_len = _CHUNK_HEADER.unpack(head)
+        if magic != CHUNK_MAGIC:
+            raise ProbeLogError(f"bad chunk at byte {start}")
+        meta = f.read(meta_len)
+        data_at = f.tell()
+        f.seek(0, os.SEEK_END)
+        if f.tell() < data_at + rows * row_size:
+            yield "end", start  # incomplete trailing chunk (writer interrupted)
+            return
+        f.seek(data_at + rows * row_size)
+        yield "chunk", rows, json.loads(meta), data_at
+
+
+class ProbeLogWriter:
+    """
+    Append rows to a .rtlog file; every flush() writes one chunk.
+
+    Existing files are appended to (their category tables are reloaded
+    first); `extra` must then match the columns the file was created with.
+    """
+
+    def __init__(self, path, extra=()):
+        self.path = path
+        self.extra = list(extra)
+        self.categories = {c: {} for c in CATEGORY_COLUMNS}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                for item in _scan(f):
+                    if item[0] == "header":
+                        if item[1] != self.extra:
+                            raise ProbeLogError(
+                                f"{path} has extra columns {item[1]}, not {self.extra}")
+                    elif item[0] == "chunk":
+                        for col, values in item[2].items():
+                            table = self.categories[col]
+                            for v in values:
+                                table[v] = len(table)
+                    else:
+                        end = item[1]
+            self._file = open(path, "r+b")
+            self._file.seek(end)
+            self._file.truncate()  # drop a partial chunk from an interrupted run
+        else:
+            self._file = open(path, "wb")
+            meta = json.dumps({"extra": self.extra}).encode()
+            self._file.write(_FILE_HEADER.pack(FILE_MAGIC, VERSION, len(meta)) + meta)
+        self._reset()
+
+    def _reset(self):
+        self._columns = [array(t) for _, t in _column_layout(self.extra)]
+        self._new = {c: [] for c in CATEGORY_COLUMNS}
+
+    def _code(self, column, value):
+        table = self.categories[column]
+        value = "" if value is None else str(value)
+        code = table.get(value)
+        if code is None:
+            if len(table) >= MAX_CATEGORIES:
+                value = OVERFLOW
+                code = table.get(value)
+            if code is None:
+                code = len(table)
+                table[value] = code
+                self._new[column].append(value)
+        return code
+
+    def append(self, timestamp, seq, latency_ms, status, target="", tag="", info="", extra=()):
+        """Buffer one row. latency_ms may be None (stored as NaN)."""
+        cols = self._columns
+        cols[0].append(float(timestamp))
+        cols[1].append(int(seq))
+        cols[2].append(math.nan if latency_ms is None else float(latency_ms))
+        for i, (name, value) in enumerate(zip(CATEGORY_COLUMNS, (status, target, tag, info))):
+            cols[3 + i].append(self._code(name, value))
+        for i in range(len(self.extra)):
+            v = extra[i] if i < len(extra) else None
+            cols[7 + i].append(math.nan if v in (None, "") else float(v))
+
+    def flush(self):
+        """Write the buffered rows as one chunk."""
+        rows = len(self._columns[0])
+        if not rows:
+            return
+        meta = json.dumps({c: v for c, v in self._new.items() if v}).encode()
+        parts = [_CHUNK_HEADER.pack(CHUNK_MAGIC, rows, len(meta)), meta]
+        for col in self._columns:
+            if _SWAP:
+                col.byteswap()
+            parts.append(col.tobytes())
+        self._file.write(b"".join(parts))
+        self._file.flush()
+        self._reset()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_columns(path):
+    """
+    Load a .rtlog file into {column: numpy array}. Category columns are
+    returned as integer codes plus a "<name>_categories" list.
+    """
+    if np is None:
+        raise RuntimeError("numpy not installed")
+    with open(path, "rb") as f:
+        items = list(_scan(f))
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    extra = items[0][1]
+    layout = _column_layout(extra)
+    categories = {c: [] for c in CATEGORY_COLUMNS}
+    pieces = {name: [] for name, _ in layout}
+    for _kind, rows, new, offset in items[1:-1]:
+        for col, values in new.items():
+            categories[col].extend(values)
+        for name, typecode in layout:
+            dtype = np.dtype(typecode).newbyteorder("<")
+            pieces[name].append(np.frombuffer(data, dtype=dtype, count=rows, offset=offset))
+            offset += rows * dtype.itemsize
+    # concatenate copies out of the mapping, so it can be closed afterwards.
+    out = {}
+    for name, typecode in layout:
+        out[name] = (np.concatenate(pieces[name]) if pieces[name]
+                     else np.empty(0, dtype=np.dtype(typecode)))
+    del pieces
+    data.close()
+    for col in CATEGORY_COLUMNS:
+        out[f"{col}_categories"] = categories[col]
+    return out
+
+
+def read_frame(path):
+    """Load a .rtlog file as a pandas DataFrame with categorical columns."""
+    if pd is None:
+        raise RuntimeError("pandas not installed")
+    cols = read_columns(path)
+    frame = {}
+    for name, value in cols.items():
+        if name.endswith("_categories"):
+            continue
+        if name in CATEGORY_COLUMNS:
+            frame[name] = pd.Categorical.from_codes(
+                value.astype(np.int32), categories=pd.Index(cols[f"{name}_categories"], dtype=object))
+        else:
+            frame[name] = value
+    return pd.DataFrame(frame)
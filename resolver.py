@@ -0,0 +1,151 @@
+"""
+resolver.py
+-----------
+Shared name-resolution cache, so probes time the network and not the
+resolver.
+
+socket.create_connection((name, port)) and gethostbyname(name) resolve the
+name on every call: each sample could wait on a blocking DNS lookup (a
+full resolver round trip on a cache miss) inside the measured latency, and
+a collector sweep resolved every site once for ICMP and again for the TCP
+fallback. ResolverCache resolves a name once with getaddrinfo (IPv4 and
+IPv6, /etc/hosts included) and answers later lookups from memory:
+
+    • Entries expire after `ttl` seconds. getaddrinfo does not report the
+      record TTL, so this is a fixed upper bound (DEFAULT_TTL); failed
+      lookups are remembered for `negative_ttl`, so an unresolvable
+      target costs one lookup per period instead of one per sample.
+    • pin() stops successful entries from expiring: a run that resolved
+      its target up front keeps probing that address, even if the name
+      later points somewhere else.
+    • The cache key is (name, family, socket type); resolve() fills the
+      caller's port into the cached sockaddr, so cycling ports does not
+      re-resolve.
+
+default_cache is the process-wide instance behind resolve(), address(),
+peek() and prefetch(); probe_engine, socket_engine, dns_probe, http_pool,
+monitor.py, Trafficgen.py and collector.py all resolve through it.
+"""
+
+import asyncio
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TTL = 300.0         # seconds a successful lookup is reused
+NEGATIVE_TTL = 30.0         # seconds a failed lookup is reused
+DEFAULT_CONCURRENCY = 50    # parallel lookups in prefetch()
+
+
+class ResolverCache:
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.pinned = False
+        self.hits = 0
+        self.misses = 0
+        # (name, family, type) -> (expires, [(family, sockaddr), ...] or gaierror args)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if now < expires or (self.pinned and isinstance(result, list)):
+            return result
+        return None
+
+    def lookup(self, host, family=socket.AF_UNSPEC, kind=socket.SOCK_STREAM):
+        """Every (family, sockaddr) for host, in getaddrinfo order; raises socket.gaierror."""
+        key = (host, family, kind)
+        now = time.monotonic()
+        with self._lock:
+            result = self._cached(key, now)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if result is None:
+            try:
+                infos = socket.getaddrinfo(host, 0, family, kind)
+                result = list(dict.fromkeys((fam, sa) for fam, _, _, _, sa in infos))
+                expires = now + self.ttl
+            except socket.gaierror as e:
+                result, expires = e.args, now + self.negative_ttl
+            with self._lock:
+                self._entries[key] = (expires, result)
+        if not isinstance(result, list):
+            raise socket.gaierror(*result)
+        return result
+
+    def resolve(self, host, port=0, family=socket.AF_UNSPEC, kind=socket.SOCK_STREAM):
+        """(family, sockaddr) of the preferred address, with `port` filled in."""
+        fam, sa = self.lookup(host, family, kind)[0]
+        return fam, (sa[0], port) + sa[2:]
+
+    def address(self, host, family=socket.AF_UNSPEC):
+        """The preferred address of host as a string."""
+        return self.lookup(host, family)[0][1][0]
+
+    def peek(self, host, family=socket.AF_UNSPEC):
+        """Cached, unexpired address of host, or None. Never blocks on the resolver."""
+        with self._lock:
+            result = self._cached((host, family, socket.SOCK_STREAM), time.monotonic())
+        return result[0][1][0] if isinstance(result, list) else None
+
+    async def address_async(self, host, family=socket.AF_UNSPEC):
+        """address() for asyncio code: a cache hit returns at once, a miss runs on the executor."""
+        addr = self.peek(host, family)
+        if addr is not None:
+            with self._lock:
+                self.hits += 1
+            return addr
+        return await asyncio.get_running_loop().run_in_executor(None, self.address, host, family)
+
+    def prefetch(self, hosts, family=socket.AF_UNSPEC, concurrency=DEFAULT_CONCURRENCY):
+        """Resolve hosts concurrently. Returns {host: address or None}."""
+        hosts = list(dict.fromkeys(hosts))
+
+        def one(host):
+            try:
+                return host, self.address(host, family)
+            except OSError:
+                return host, None
+
+        if not hosts:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(hosts))) as pool:
+            return dict(pool.map(one, hosts))
+
+    def pin(self):
+        """Keep every successful entry for the rest of the run."""
+        self.pinned = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def format(self):
+        return f"{len(self._entries)} names, {self.hits} cache hits, {self.misses} lookups"
+
+
+default_cache = ResolverCache()
+
+
+def resolve(host, port=0, family=socket.AF_UNSPEC, kind=socket.SOCK_STREAM):
+    return default_cache.resolve(host, port, family, kind)
+
+
+def address(host, family=socket.AF_UNSPEC):
+    return default_cache.address(host, family)
+
+
+def peek(host, family=socket.AF_UNSPEC):
+    return default_cache.peek(host, family)
+
+
+def prefetch(hosts, family=socket.AF_UNSPEC, concurrency=DEFAULT_CONCURRENCY):
+    return default_cache.prefetch(hosts, family, concurrency)
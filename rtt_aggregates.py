@@ -0,0 +1,353 @@
+"""
+rtt_aggregates.py
+-----------------
+Incremental per-(website, condition) RTT aggregates for collector.py's
+combined CSV.
+
+csv_files/combined_rtt_clean.csv only ever grows: every collector sweep
+appends one row per website. Re-reading and re-grouping the whole history
+for every plot gets slower with each sweep. AggregateStore keeps, for
+every (website, condition) cell:
+
+    count, missing    rows with an RTT / rows recorded as NaN
+    sum, sumsq        for mean and standard deviation
+    min, max
+    buckets           sparse latency_sketch counters (p50/p90/p99 within 1%)
+
+and remembers how many bytes of each CSV it has already consumed.
+sync(csv_path) only parses the rows appended since the last call, so
+keeping the store current costs O(new rows) and reading it costs
+O(sites × conditions). Repeated header rows (older collector runs wrote
+one per sweep) are skipped.
+
+A store lives next to its CSV (combined_rtt_clean.agg.json). If the CSV is
+rewritten rather than appended to (its first bytes change or it shrinks),
+the store is rebuilt from scratch on the next sync. `changed` records
+whether anything was folded in since the store was loaded, so readers only
+rewrite the file when there was something new (save_if_changed()).
+
+frame() and condition_frame() compute every cell's quantiles in one NumPy
+pass over the flattened buckets (a cumulative sum and one searchsorted per
+rank), not one Python loop per cell.
+"""
+
+import csv
+import hashlib
+import io
+import itertools
+import json
+import math
+import os
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import pandas as pd
+except Exception:
+    pd = None
+
+from latency_sketch import LatencySketch, quantile_label
+
+FORMAT_VERSION = 1
+HEAD_BYTES = 4096           # prefix hashed to detect rewritten CSVs
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def store_path(csv_path):
+    """combined_rtt_clean.csv -> combined_rtt_clean.agg.json"""
+    return os.path.splitext(csv_path)[0] + ".agg.json"
+
+
+class Cell:
+    __slots__ = ("count", "missing", "sum", "sumsq", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.missing = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = {}
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else math.nan
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1, like pandas)."""
+        if self.count < 2:
+            return math.nan
+        var = (self.sumsq - self.sum * self.sum / self.count) / (self.count - 1)
+        return math.sqrt(max(0.0, var))
+
+    def to_list(self):
+        return [self.count, self.missing, self.sum, self.sumsq,
+                self.min if self.count else None, self.max if self.count else None,
+                sorted(self.buckets.items())]
+
+    @classmethod
+    def from_list(cls, values):
+        cell = cls()
+        cell.count, cell.missing, cell.sum, cell.sumsq, lo, hi, buckets = values
+        if cell.count:
+            cell.min, cell.max = lo, hi
+        cell.buckets = {int(b): c for b, c in buckets}
+        return cell
+
+
+class AggregateStore:
+    def __init__(self, path):
+        self.path = path
+        self.layout = LatencySketch()
+        self.cells = {}
+        self.sources = {}
+        self.changed = False
+        self._flat = None           # cached _columns()
+        if os.path.exists(path):
+            self._load()
+
+    # -----------------------------------------------------------
+    # UPDATES
+    # -----------------------------------------------------------
+    def add(self, website, condition, rtt):
+        """Record one row; rtt None/NaN counts as a missing measurement."""
+        self.changed = True
+        self._flat = None
+        cell = self.cells.get((website, condition))
+        if cell is None:
+            cell = self.cells[(website, condition)] = Cell()
+        if rtt is None or rtt != rtt:
+            cell.missing += 1
+            return
+        cell.count += 1
+        cell.sum += rtt
+        cell.sumsq += rtt * rtt
+        if rtt < cell.min:
+            cell.min = rtt
+        if rtt > cell.max:
+            cell.max = rtt
+        b = self.layout.bucket(rtt)
+        cell.buckets[b] = cell.buckets.get(b, 0) + 1
+
+    def reset(self):
+        self.cells = {}
+        self.sources = {}
+        self.changed = True
+        self._flat = None
+
+    def sync(self, csv_path):
+        """
+        Fold rows appended to a website,rtt,condition CSV since the last
+        sync into the store. Returns the number of rows read.
+        """
+        key = os.path.abspath(csv_path)
+        src = self.sources.get(key)
+        with open(csv_path, "rb") as f:
+            if src is not None:
+                head = f.read(src["head_len"])
+                if (hashlib.blake2b(head).hexdigest() != src["head"]
+                        or os.fstat(f.fileno()).st_size < src["offset"]):
+                    # CSV was rewritten, not appended to: start over.
+                    self.reset()
+                    src = None
+            offset = src["offset"] if src else 0
+            f.seek(offset)
+            data = f.read()
+            end = data.rfind(b"\n") + 1   # leave a partially written last line for next time
+            rows = 0
+            for row in csv.reader(io.StringIO(data[:end].decode("utf-8"))):
+                if len(row) < 3 or row[0] == "website":
+                    continue
+                try:
+                    rtt = float(row[1])
+                except ValueError:
+                    rtt = None
+                self.add(row[0].strip(), row[2].strip(), rtt)
+                rows += 1
+            offset += end
+            f.seek(0)
+            head = f.read(min(HEAD_BYTES, offset))
+        record = {"offset": offset, "head_len": len(head),
+                  "head": hashlib.blake2b(head).hexdigest()}
+        if record != src:
+            self.sources[key] = record
+            self.changed = True
+        return rows
+
+    # -----------------------------------------------------------
+    # PERSISTENCE
+    # -----------------------------------------------------------
+    def _load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: unsupported aggregate store version")
+        layout = data["layout"]
+        self.layout = LatencySketch(*layout)
+        self.sources = data["sources"]
+        self.cells = {(w, c): Cell.from_list(v) for w, c, *v in data["cells"]}
+
+    def save(self):
+        """Write the store atomically (temp file + rename)."""
+        data = {
+            "version": FORMAT_VERSION,
+            "layout": [self.layout.accuracy, self.layout.min_value, self.layout.max_value],
+            "sources": self.sources,
+            "cells": [[w, c, *cell.to_list()] for (w, c), cell in self.cells.items()],
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            # dumps() uses the C encoder; dump() streams through the pure-Python one.
+            f.write(json.dumps(data, separators=(",", ":")))
+        os.replace(tmp, self.path)
+        self.changed = False
+
+    def save_if_changed(self):
+        """save() only when sync()/add() changed the store. Returns True if written."""
+        if self.changed or not os.path.exists(self.path):
+            self.save()
+            return True
+        return False
+
+    # -----------------------------------------------------------
+    # QUERIES
+    # -----------------------------------------------------------
+    def conditions(self):
+        """Conditions in the order they were first seen."""
+        return list(dict.fromkeys(c for _w, c in self.cells))
+
+    def _columns(self):
+        """
+        The cells as flat arrays: per cell (count, missing, sum, sumsq, min,
+        max), and per non-empty bucket (cell number, bucket, count) sorted
+        by cell, then bucket.
+        """
+        if self._flat is None:
+            cells = list(self.cells.values())
+            stats = np.array([(c.count, c.missing, c.sum, c.sumsq, c.min, c.max) for c in cells],
+                             dtype=np.float64).reshape(-1, 6)
+            sizes = np.fromiter((len(c.buckets) for c in cells), dtype=np.int64, count=len(cells))
+            pairs = np.fromiter(itertools.chain.from_iterable(
+                itertools.chain.from_iterable(c.buckets.items()) for c in cells),
+                dtype=np.int64, count=2 * int(sizes.sum())).reshape(-1, 2)
+            owner = np.repeat(np.arange(len(cells)), sizes)
+            order = np.lexsort((pairs[:, 0], owner))
+            self._flat = (stats, owner[order], pairs[order, 0], pairs[order, 1])
+        return self._flat
+
+    def _grouped_quantiles(self, bucket, weight, count, lo, hi, qs):
+        """
+        LatencySketch.quantiles for many sketches at once. bucket/weight are
+        every sketch's non-empty buckets, grouped by sketch in order and
+        sorted by bucket within a group; count, lo and hi are per sketch.
+        Returns a (sketches, len(qs)) array, NaN rows for empty sketches.
+        """
+        out = np.full((count.size, len(qs)), np.nan)
+        if not weight.size:
+            return out
+        cum = np.cumsum(weight)
+        before = np.cumsum(count) - count           # samples in earlier groups
+        ranks = np.clip(np.asarray(qs, dtype=np.float64), 0.0, 1.0) * (count - 1)[:, None]
+        floor = np.floor(ranks)
+
+        def at(k):
+            pos = np.searchsorted(cum, before[:, None] + k, side="right")
+            b = bucket[np.minimum(pos, bucket.size - 1)]
+            v = np.clip(self.layout.bucket_value(b), lo[:, None], hi[:, None])
+            v = np.where(k >= (count - 1)[:, None], hi[:, None], v)
+            return np.where(k <= 0, lo[:, None], v)
+
+        with np.errstate(invalid="ignore"):
+            vlo, vhi = at(floor), at(np.ceil(ranks))
+            values = vlo + (vhi - vlo) * (ranks - floor)
+        has = count > 0
+        out[has] = values[has]
+        return out
+
+    def condition_sketch(self, condition):
+        """All of a condition's rows merged into one LatencySketch."""
+        sketch = LatencySketch(self.layout.accuracy, self.layout.min_value, self.layout.max_value)
+        for (_w, c), cell in self.cells.items():
+            if c != condition or not cell.count:
+                continue
+            for b, n in cell.buckets.items():
+                sketch.counts[b] += n
+            sketch.count += cell.count
+            sketch.sum += cell.sum
+            sketch.min = min(sketch.min, cell.min)
+            sketch.max = max(sketch.max, cell.max)
+        return sketch
+
+    def frame(self, quantiles=DEFAULT_QUANTILES):
+        """
+        DataFrame indexed by (website, condition) with count, missing, mean,
+        std, min, max and one p<q> column per quantile.
+        """
+        if pd is None:
+            raise RuntimeError("pandas not installed")
+        labels = [quantile_label(q) for q in quantiles]
+        stats, _owner, bucket, weight = self._columns()
+        count, missing, total, sumsq, lo, hi = stats.T
+        has = count > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(has, total / count, np.nan)
+            var = (sumsq - total * total / count) / (count - 1)
+            std = np.where(count > 1, np.sqrt(np.maximum(var, 0.0)), np.nan)
+        idx = pd.MultiIndex.from_tuples(list(self.cells), names=["website", "condition"])
+        df = pd.DataFrame({"count": count.astype(np.int64), "missing": missing.astype(np.int64),
+                           "mean": mean, "std": std,
+                           "min": np.where(has, lo, np.nan), "max": np.where(has, hi, np.nan)},
+                          index=idx)
+        values = self._grouped_quantiles(bucket, weight, count.astype(np.int64), lo, hi, quantiles)
+        for i, label in enumerate(labels):
+            df[label] = values[:, i]
+        return df
+
+    def condition_frame(self, quantiles=DEFAULT_QUANTILES):
+        """One row per condition: count, mean, quantiles and number of sites with data."""
+        if pd is None:
+            raise RuntimeError("pandas not installed")
+        labels = [quantile_label(q) for q in quantiles]
+        conds = self.conditions()
+        position = {c: i for i, c in enumerate(conds)}
+        cell_cond = np.fromiter((position[c] for _w, c in self.cells), dtype=np.int64,
+                                count=len(self.cells))
+        stats, owner, bucket, weight = self._columns()
+        count, total, lo, hi = stats[:, 0], stats[:, 2], stats[:, 4], stats[:, 5]
+
+        n = len(conds)
+        cond_count = np.bincount(cell_cond, weights=count, minlength=n).astype(np.int64)
+        cond_sum = np.bincount(cell_cond, weights=total, minlength=n)
+        cond_lo, cond_hi = np.full(n, np.inf), np.full(n, -np.inf)
+        np.minimum.at(cond_lo, cell_cond, lo)
+        np.maximum.at(cond_hi, cell_cond, hi)
+        sites = np.bincount(cell_cond[count > 0], minlength=n)
+
+        group = cell_cond[owner]
+        order = np.lexsort((bucket, group))
+        values = self._grouped_quantiles(bucket[order], weight[order], cond_count,
+                                         cond_lo, cond_hi, quantiles)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(cond_count > 0, cond_sum / cond_count, np.nan)
+        df = pd.DataFrame({"count": cond_count, "mean": mean},
+                          index=pd.Index(conds, name="condition"))
+        for i, label in enumerate(labels):
+            df[label] = values[:, i]
+        df["sites"] = sites
+        return df
+
+
+def open_for_csv(csv_path):
+    """
+    Load (or create) the store next to csv_path, bring it up to date and
+    write it back if the CSV had new rows.
+    """
+    store = AggregateStore(store_path(csv_path))
+    store.sync(csv_path)
+    store.save_if_changed()
+    return store
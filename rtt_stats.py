@@ -0,0 +1,203 @@
+"""
+rtt_stats.py
+------------
+Vectorized ICMP echo matching and RTT distribution statistics.
+
+analyze_pcap.py originally matched replies to requests with a Python dict
+and only printed the average RTT. This module works on columns instead:
+
+    match_echoes(index, ts, is_reply, keys, payloads=None)
+        Joins echo replies to echo requests with one sort + searchsorted,
+        handling retransmitted requests, duplicate replies and 16-bit
+        sequence-number wraparound.
+
+    summarize(rtts, sent=None)
+        Mean, min/max, p50/p90/p99, jitter and (when the number of requests
+        is known) loss for a set of RTTs.
+
+NumPy is optional: summarize() falls back to pure Python, match_echoes()
+needs NumPy.
+"""
+
+import math
+from collections import namedtuple
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+# Maximum age (seconds) of a request a reply may still be matched to.
+# Anything older belongs to a previous trip around the 16-bit sequence
+# space, not to this reply.
+DEFAULT_MAX_RTT = 30.0
+
+PERCENTILES = (50, 90, 99)
+
+EchoMatch = namedtuple("EchoMatch", "rtts sent answered duplicates retransmits")
+
+
+def echo_key(ident, seq):
+    """Pack an ICMP (id, seq) pair into one integer."""
+    return (ident << 16) | seq
+
+
+def match_echoes(index, ts, is_reply, keys, max_rtt=DEFAULT_MAX_RTT, payloads=None):
+    """
+    Match ICMP echo replies to requests.
+
+    All arguments are equal-length columns, one entry per echo packet:
+        index     – position of the packet in the capture (file order)
+        ts        – capture timestamp (seconds)
+        is_reply  – True for echo replies, False for echo requests
+        keys      – echo_key(id, seq)
+        payloads  – optional payload hash (pcap_parser.decode_echo)
+
+    Each reply is matched to the most recent earlier request with the same
+    key, exactly like the dict loop in analyze_pcap.py, but:
+        • only the first reply to a request counts; later copies are
+          reported as duplicates
+        • an unanswered request is a retransmission, not a lost probe,
+          only when the next request with its key carries the identical
+          payload and follows it in less than half the sender's usual
+          interval (the median gap between requests with that id).
+          Tools such as ping3 send every probe with seq 0, so a repeated
+          key on its own is just the next probe, and the unanswered one
+          counts as lost; without `payloads` nothing is a retransmission
+        • requests older than max_rtt are never matched, so a reused
+          sequence number after wraparound cannot pair with a stale request
+
+    Returns an EchoMatch whose `rtts` (ms) are ordered by request time;
+    `sent` is the number of requests seen, so the probes that could be
+    lost are sent - retransmits.
+    """
+    if np is None:
+        raise RuntimeError("numpy not installed")
+    index = np.asarray(index, dtype=np.int64)
+    ts = np.asarray(ts, dtype=np.float64)
+    is_reply = np.asarray(is_reply, dtype=bool)
+    keys = np.asarray(keys, dtype=np.int64)
+
+    req, rep = ~is_reply, is_reply
+    req_idx, req_ts, req_key = index[req], ts[req], keys[req]
+    req_payload = np.asarray(payloads, dtype=np.int64)[req] if payloads is not None else None
+    rep_idx, rep_ts, rep_key = index[rep], ts[rep], keys[rep]
+    sent = int(req_idx.size)
+    if sent == 0:
+        return EchoMatch(np.empty(0), 0, 0, 0, 0)
+
+    # Sort requests by (key, file position) and encode both into a single
+    # int64 so one searchsorted finds "latest earlier request with this key".
+    # keys < 2**32 and positions < span, so the product stays below 2**63.
+    span = int(index.max()) + 1
+    interval = _sender_intervals(req_idx, req_ts, req_key)
+    order = np.lexsort((req_idx, req_key))
+    req_idx, req_ts, req_key = req_idx[order], req_ts[order], req_key[order]
+    req_code = req_key * span + req_idx
+    rep_code = rep_key * span + rep_idx
+
+    pos = np.searchsorted(req_code, rep_code, side="right") - 1
+    ok = pos >= 0
+    pos_safe = np.where(ok, pos, 0)
+    ok &= req_key[pos_safe] == rep_key
+    delta = rep_ts - req_ts[pos_safe]
+    if max_rtt is not None:
+        ok &= delta <= max_rtt
+
+    # First reply per request wins; replies are in file order, so
+    # np.unique's first-occurrence index is the earliest reply.
+    hit_pos, hit_rep = pos[ok], np.flatnonzero(ok)
+    matched, first = np.unique(hit_pos, return_index=True)
+    duplicates = int(hit_pos.size - matched.size)
+    rtt_ms = delta[hit_rep[first]] * 1000.0
+
+    # Retransmissions: an unanswered request whose next same-key request
+    # repeats its payload well inside the sender's interval.
+    answered = np.zeros(sent, dtype=bool)
+    answered[matched] = True
+    resent = np.zeros(sent, dtype=bool)
+    if req_payload is not None and sent > 1:
+        req_payload = req_payload[order]
+        gap = req_ts[1:] - req_ts[:-1]
+        resent[:-1] = ((req_key[1:] == req_key[:-1]) & (req_payload[1:] == req_payload[:-1])
+                       & (gap < 0.5 * interval[order][:-1]))
+    retransmits = int(np.count_nonzero(resent & ~answered))
+
+    # Report RTTs in request (time) order so jitter is meaningful.
+    rtt_ms = rtt_ms[np.argsort(req_idx[matched], kind="stable")]
+    return EchoMatch(rtt_ms, sent, int(matched.size), duplicates, retransmits)
+
+
+def _sender_intervals(req_idx, req_ts, req_key):
+    """
+    Per request, the median gap between consecutive requests of the same
+    ICMP id (the sender's probe interval); inf when the id sent only once.
+    """
+    ident = req_key >> 16
+    order = np.lexsort((req_idx, ident))
+    ident_sorted, ts_sorted = ident[order], req_ts[order]
+    same = ident_sorted[1:] == ident_sorted[:-1]
+    gaps, gap_ident = (ts_sorted[1:] - ts_sorted[:-1])[same], ident_sorted[1:][same]
+    out = np.full(req_ts.size, np.inf)
+    for i in np.unique(gap_ident):
+        out[ident == i] = np.median(gaps[gap_ident == i])
+    return out
+
+
+def _percentile(sorted_vals, q):
+    """Linear-interpolated percentile (same definition as numpy's default)."""
+    if not sorted_vals:
+        return math.nan
+    k = (len(sorted_vals) - 1) * q / 100.0
+    lo = math.floor(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def summarize(rtts, sent=None):
+    """
+    Distribution statistics for a sequence of RTTs (ms, in send order).
+
+    jitter is the mean absolute difference between consecutive RTTs
+    (the RFC 3550 interarrival-jitter idea without the smoothing).
+    loss is only reported when `sent` (number of requests) is given.
+    """
+    out = {"count": len(rtts)}
+    if np is not None:
+        arr = np.asarray(rtts, dtype=np.float64)
+        if arr.size:
+            out["mean"] = float(arr.mean())
+            out["min"] = float(arr.min())
+            out["max"] = float(arr.max())
+            for q, v in zip(PERCENTILES, np.percentile(arr, PERCENTILES)):
+                out[f"p{q}"] = float(v)
+            out["jitter"] = float(np.abs(np.diff(arr)).mean()) if arr.size > 1 else 0.0
+    else:
+        vals = [float(v) for v in rtts]
+        if vals:
+            ordered = sorted(vals)
+            out["mean"] = sum(vals) / len(vals)
+            out["min"] = ordered[0]
+            out["max"] = ordered[-1]
+            for q in PERCENTILES:
+                out[f"p{q}"] = _percentile(ordered, q)
+            diffs = [abs(b - a) for a, b in zip(vals, vals[1:])]
+            out["jitter"] = sum(diffs) / len(diffs) if diffs else 0.0
+    if sent:
+        out["sent"] = sent
+        out["loss"] = max(0.0, 1.0 - out["count"] / sent)
+    return out
+
+
+def format_summary(summary):
+    """Render a summarize() dict as one human-readable line."""
+    if not summary.get("count"):
+        line = "no RTTs"
+    else:
+        line = (f"n={summary['count']} mean={summary['mean']:.3f} "
+                f"min={summary['min']:.3f} "
+                + " ".join(f"p{q}={summary[f'p{q}']:.3f}" for q in PERCENTILES)
+                + f" max={summary['max']:.3f} jitter={summary['jitter']:.3f} ms")
+    if "loss" in summary:
+        line += f" loss={summary['loss'] * 100:.1f}% of {summary['sent']}"
+    return line
@@ -0,0 +1,405 @@
+"""
+socket_engine.py
+----------------
+Non-blocking TCP connect and UDP echo probing for thousands of probes/s
+from one thread.
+
+Trafficgen's tcp_mode does a blocking create_connection() per sample and
+its udp_mode opened and closed a socket per datagram. This module keeps
+many probes in flight instead:
+
+    • TcpConnectScanner – non-blocking connect()s registered with a
+      selector; the handshake time is measured when the socket turns
+      writable. Sockets close with SO_LINGER 0 (RST), so measuring
+      thousands of handshakes per second does not leave the client's
+      ephemeral ports stuck in TIME_WAIT. Cycles over any number of
+      (host, port) pairs, open loop at a target rate with a cap on
+      concurrent handshakes.
+    • UdpEchoProber – one persistent connected UDP socket per target.
+      Every datagram starts with a 32-bit sequence number, so echoed
+      replies are matched to their request even when many are in flight,
+      arrive out of order or arrive after their timeout. RTTs use
+      kernel receive timestamps where available (timing.py).
+    • payload_sweep() – echo throughput and RTT per payload size (window
+      of W datagrams in flight), instead of a single b"A" * size probe.
+
+Statuses follow Trafficgen: TCP "ok" / "error" (refused etc.) / "lost"
+(no answer within timeout); UDP "ok-reply" / "no-reply" / "sent".
+
+Usage:
+    python3 socket_engine.py tcp HOST[,HOST...] --ports 22,80,8000-8010 [--rate N] [--count N]
+    python3 socket_engine.py udp HOST --port N [--sizes 64,512,1400,8192] [--count N] [--window N]
+"""
+
+import argparse
+import errno
+import itertools
+import os
+import random
+import select
+import selectors
+import socket
+import struct
+import time
+
+from latency_sketch import LatencySketch
+import resolver
+import timing
+
+DEFAULT_TIMEOUT = 1.0       # seconds
+DEFAULT_CONCURRENCY = 1000  # TCP handshakes in flight
+DEFAULT_WINDOW = 32         # UDP datagrams in flight during a sweep
+DEFAULT_SIZES = (64, 256, 512, 1024, 1400, 4096, 8192)
+_SEQ = struct.Struct("!I")
+_LINGER_RST = struct.pack("ii", 1, 0)
+
+
+def parse_ports(spec):
+    """"22,80,8000-8010" -> [22, 80, 8000, ..., 8010]"""
+    ports = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if "-" in part:
+            lo, hi = part.split("-")
+            ports.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            ports.append(int(part))
+    return ports
+
+
+def _resolve(host, port, kind):
+    return resolver.resolve(host, port, kind=kind)
+
+
+# -----------------------------------------------------------
+# TCP CONNECT (HANDSHAKE) LATENCY
+# -----------------------------------------------------------
+class TcpConnectScanner:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.sel = selectors.DefaultSelector()
+        self.inflight = {}      # fd -> (sock, start_ns, tag)
+
+    def start(self, host, port, tag=None):
+        """Begin one handshake. Returns a finished (tag, status, value) if it fails at once."""
+        family, addr = _resolve(host, port, socket.SOCK_STREAM)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+        start = time.perf_counter_ns()
+        err = sock.connect_ex(addr)
+        if err in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            self.inflight[sock.fileno()] = (sock, start, tag)
+            self.sel.register(sock, selectors.EVENT_WRITE)
+            return None
+        sock.close()
+        return (tag, "error", f"[Errno {err}] {os.strerror(err)}")
+
+    def poll(self, wait=0.0):
+        """Finish handshakes for up to `wait` seconds; returns [(tag, status, value), ...]."""
+        done = []
+        if self.inflight:
+            for key, _ in self.sel.select(max(0.0, wait)):
+                sock, start, tag = self.inflight.pop(key.fd)
+                rtt = timing.elapsed_ms(start)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                self.sel.unregister(sock)
+                sock.close()
+                done.append((tag, "ok", rtt) if err == 0
+                            else (tag, "error", f"[Errno {err}] {os.strerror(err)}"))
+        elif wait > 0:
+            time.sleep(wait)
+        limit = time.perf_counter_ns() - int(self.timeout * 1e9)
+        for fd, (sock, start, tag) in list(self.inflight.items()):
+            if start < limit:
+                del self.inflight[fd]
+                self.sel.unregister(sock)
+                sock.close()
+                done.append((tag, "lost", None))
+        return done
+
+    def run(self, endpoints, count, rate=None, on_result=None):
+        """
+        `count` handshakes cycling over [(host, port), ...], open loop at
+        `rate`/s (as fast as the concurrency cap allows without it).
+        on_result(i, (host, port), status, value, lag_ms). Returns
+        (started, elapsed_seconds).
+        """
+        cycle = itertools.cycle(endpoints)
+        pending = {}
+        period_ns = int(1e9 / rate) if rate else 0
+        t0 = time.perf_counter_ns()
+        for i in range(count):
+            due = t0 + i * period_ns
+            while True:
+                remaining = (due - time.perf_counter_ns()) / 1e9
+                full = len(self.inflight) >= self.concurrency
+                wait = remaining - 0.0002 if remaining > 0.0005 else 0.0
+                self._deliver(self.poll(self.timeout / 10 if full else wait), pending, on_result)
+                if len(self.inflight) < self.concurrency and remaining <= 0.0005:
+                    break
+            timing.sleep_until(due)
+            lag = (time.perf_counter_ns() - due) / 1e6 if rate else 0.0
+            endpoint = next(cycle)
+            pending[i] = (endpoint, lag)
+            try:
+                failed = self.start(*endpoint, tag=i)
+            except OSError as e:
+                failed = (i, "error", str(e))
+            if failed:
+                self._deliver([failed], pending, on_result)
+        while self.inflight:
+            self._deliver(self.poll(0.05), pending, on_result)
+        return count, (time.perf_counter_ns() - t0) / 1e9
+
+    @staticmethod
+    def _deliver(results, pending, on_result):
+        for tag, status, value in results:
+            endpoint, lag = pending.pop(tag, (None, 0.0))
+            if on_result:
+                on_result(tag, endpoint, status, value, lag)
+
+    def close(self):
+        for sock, _start, _tag in self.inflight.values():
+            sock.close()
+        self.inflight = {}
+        self.sel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------------------------------------
+# UDP ECHO ON ONE PERSISTENT SOCKET
+# -----------------------------------------------------------
+class UdpEchoProber:
+    RCVBUF = 4 * 1024 * 1024
+
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        family, addr = _resolve(host, port, socket.SOCK_DGRAM)
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.connect(addr)
+        self.sock.setblocking(False)
+        for opt in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, opt, self.RCVBUF)
+            except OSError:
+                pass
+        timing.enable_rx_timestamps(self.sock)
+        self._seq = random.getrandbits(32)
+        self._payloads = {}
+        self.inflight = {}      # seq -> (sent_stamp, tag)
+
+    def _payload(self, seq, size):
+        pad = self._payloads.get(size)
+        if pad is None:
+            pad = self._payloads[size] = b"A" * max(0, size - _SEQ.size)
+        return _SEQ.pack(seq) + pad
+
+    def send(self, size, tag=None, track=True):
+        """Send one seq-tagged datagram of `size` bytes (at least 4)."""
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        payload = self._payload(self._seq, size)
+        sent = timing.send_stamp()
+        try:
+            self.sock.send(payload)
+        except ConnectionRefusedError:
+            # An ICMP port unreachable for an earlier datagram is reported by the next
+            # send() on a connected socket (and cleared by it); this datagram never left.
+            sent = timing.send_stamp()
+            self.sock.send(payload)
+        if track:
+            self.inflight[self._seq] = (sent, tag)
+        return self._seq
+
+    def poll(self, wait=0.0):
+        """Match echoes for up to `wait` seconds; returns [(tag, status, value), ...]."""
+        done = []
+        if self.inflight and select.select([self.sock], [], [], max(0.0, wait))[0]:
+            while True:
+                try:
+                    data, _addr, rx = timing.recv_timestamped(self.sock)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    break   # ICMP port unreachable is reported on connected sockets
+                if len(data) < _SEQ.size:
+                    continue
+                entry = self.inflight.pop(_SEQ.unpack_from(data)[0], None)
+                if entry is not None:   # late replies to expired probes are dropped
+                    done.append((entry[1], "ok-reply", timing.rtt_ms(entry[0], rx)))
+        elif wait > 0 and not self.inflight:
+            time.sleep(wait)
+        limit = time.perf_counter_ns() - int(self.timeout * 1e9)
+        for seq, (sent, tag) in list(self.inflight.items()):
+            if sent[0] < limit:
+                del self.inflight[seq]
+                done.append((tag, "no-reply", None))
+        return done
+
+    def query(self, size, wait=True):
+        """One probe: (status, value) like Trafficgen's udp_mode."""
+        try:
+            seq = self.send(size, tag="query", track=wait)
+        except OSError as e:
+            return ("error", str(e))
+        if not wait:
+            return ("sent", None)
+        while seq in self.inflight:
+            for tag, status, value in self.poll(self.timeout):
+                if tag == "query":
+                    return (status, value)
+        return ("no-reply", None)
+
+    def run(self, count, size, rate, on_result=None, wait=True):
+        """
+        Open loop: datagram i leaves at t0 + i / rate. on_result(i, status,
+        value, lag_ms); without `wait` every datagram is reported "sent".
+        """
+        period_ns = int(1e9 / rate)
+        pending = {}
+        t0 = time.perf_counter_ns()
+        for i in range(count):
+            due = t0 + i * period_ns
+            while True:
+                remaining = (due - time.perf_counter_ns()) / 1e9
+                self._deliver(self.poll(max(0.0, remaining - 0.0002)), pending, on_result)
+                if remaining <= 0.0005:
+                    break
+            timing.sleep_until(due)
+            pending[i] = (time.perf_counter_ns() - due) / 1e6
+            try:
+                self.send(size, tag=i, track=wait)
+                if not wait:
+                    self._deliver([(i, "sent", None)], pending, on_result)
+            except OSError as e:
+                self._deliver([(i, "error", str(e))], pending, on_result)
+        while self.inflight:
+            self._deliver(self.poll(0.05), pending, on_result)
+        return count, (time.perf_counter_ns() - t0) / 1e9
+
+    def blast(self, count, size, window=DEFAULT_WINDOW, on_result=None):
+        """
+        Closed loop with `window` datagrams in flight: a new one is sent as
+        soon as an echo (or timeout) frees a slot. Measures throughput.
+        on_result(i, status, value). Returns elapsed seconds.
+        """
+        sent = 0
+        start = time.perf_counter()
+        while sent < count or self.inflight:
+            while sent < count and len(self.inflight) < window:
+                try:
+                    self.send(size, tag=sent)
+                except BlockingIOError:
+                    break
+                except OSError as e:
+                    if on_result:
+                        on_result(sent, "error", str(e))
+                sent += 1
+            for tag, status, value in self.poll(self.timeout / 10):
+                if on_result:
+                    on_result(tag, status, value)
+        return time.perf_counter() - start
+
+    @staticmethod
+    def _deliver(results, pending, on_result):
+        for tag, status, value in results:
+            lag = pending.pop(tag, 0.0)
+            if on_result:
+                on_result(tag, status, value, lag)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def payload_sweep(prober, sizes=DEFAULT_SIZES, count=1000, window=DEFAULT_WINDOW, on_result=None):
+    """
+    Echo `count` datagrams of every size through prober.blast(). Returns one
+    dict per size: size, sent, answered, loss, p50/p99 RTT (ms), msgs/s and
+    MB/s (payload bytes echoed back per second). on_result(size, i, status, value).
+    """
+    rows = []
+    for size in sizes:
+        sketch = LatencySketch()
+        answered = [0]
+
+        def record(i, status, value):
+            if status == "ok-reply":
+                answered[0] += 1
+                sketch.add(value)
+            if on_result:
+                on_result(size, i, status, value)
+
+        elapsed = prober.blast(count, size, window, record)
+        rows.append({"size": size, "sent": count, "answered": answered[0],
+                     "loss": 1 - answered[0] / count if count else 0.0,
+                     "p50": sketch.quantile(0.5), "p99": sketch.quantile(0.99),
+                     "msgs_per_s": answered[0] / elapsed,
+                     "mb_per_s": answered[0] * size / elapsed / 1e6})
+    return rows
+
+
+def format_sweep(rows):
+    lines = [f"{'size':>7s} {'answered':>13s} {'p50 ms':>8s} {'p99 ms':>8s} {'msgs/s':>9s} {'MB/s':>8s}"]
+    for r in rows:
+        lines.append(f"{r['size']:7d} {r['answered']:6d}/{r['sent']:<6d} {r['p50']:8.3f} "
+                     f"{r['p99']:8.3f} {r['msgs_per_s']:9.0f} {r['mb_per_s']:8.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    p = argparse.ArgumentParser(description="non-blocking TCP connect / UDP echo probing")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("tcp", help="handshake latency across hosts and ports")
+    t.add_argument("hosts", help="comma-separated hosts")
+    t.add_argument("--ports", default="443", help="e.g. 22,80,8000-8010")
+    t.add_argument("--count", type=int, default=1000)
+    t.add_argument("--rate", type=float, default=None, help="handshakes/s (open loop)")
+    t.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    t.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    u = sub.add_parser("udp", help="echo RTT and throughput per payload size")
+    u.add_argument("host")
+    u.add_argument("--port", type=int, default=9999)
+    u.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    u.add_argument("--count", type=int, default=1000, help="datagrams per size")
+    u.add_argument("--window", type=int, default=DEFAULT_WINDOW)
+    u.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    args = p.parse_args()
+
+    if args.cmd == "udp":
+        with UdpEchoProber(args.host, args.port, args.timeout) as prober:
+            rows = payload_sweep(prober, parse_ports(args.sizes), args.count, args.window)
+        print(format_sweep(rows))
+        return
+
+    endpoints = [(h, port) for h in args.hosts.split(",") for port in parse_ports(args.ports)]
+    per_endpoint = {e: LatencySketch() for e in endpoints}
+    statuses = {}
+
+    def on_result(_i, endpoint, status, value, _lag):
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == "ok":
+            per_endpoint[endpoint].add(value)
+
+    with TcpConnectScanner(args.timeout, args.concurrency) as scanner:
+        count, elapsed = scanner.run(endpoints, args.count, args.rate, on_result)
+    print(f"{count} handshakes in {elapsed:.2f} s ({count / elapsed:.0f}/s) "
+          + " ".join(f"{k}={v}" for k, v in sorted(statuses.items())))
+    for (host, port), sketch in per_endpoint.items():
+        if sketch.count:
+            print(f"  {host}:{port}  {sketch.format()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+The project is a set of flat scripts, not a package: put the repository
+root on sys.path so tests can import them the way the scripts import each
+other.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,141 @@
+"""
+pcapgen.py
+----------
+Builds small captures with known contents for the parser tests: frames
+(Ethernet, VLAN, Linux SLL, BSD loopback, raw IP) carrying IPv4/IPv6
+ICMP echo, TCP and UDP, written as classic pcap or pcapng.
+
+A packet is (timestamp, frame_bytes); `timestamp` None writes a pcapng
+Simple Packet Block (no timestamp).
+"""
+
+import os
+import struct
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+SRC4, DST4 = bytes([10, 0, 0, 1]), bytes([10, 0, 0, 2])
+SRC6, DST6 = bytes(15) + b"\x01", bytes(15) + b"\x02"
+
+
+def bundled(name):
+    """Path of a capture shipped with the repository."""
+    return os.path.join(ROOT, name)
+
+
+# -----------------------------------------------------------
+# Transport and network layers
+# -----------------------------------------------------------
+def icmp_echo(icmp_type, ident, seq, data=b"abcdefgh"):
+    return struct.pack("!BBHHH", icmp_type, 0, 0, ident, seq) + data
+
+
+def tcp(sport, dport, seq, ack, flags, payload=b""):
+    return struct.pack("!HHIIBBHHH", sport, dport, seq, ack, 5 << 4, flags, 65535, 0, 0) + payload
+
+
+def udp(sport, dport, payload=b""):
+    return struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+
+
+def ipv4(proto, payload, src=SRC4, dst=DST4, frag=0):
+    return struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 0, frag, 64, proto, 0,
+                       src, dst) + payload
+
+
+def ipv6(next_header, payload, src=SRC6, dst=DST6, hop_by_hop=False):
+    if hop_by_hop:
+        payload = bytes([next_header, 0]) + bytes(6) + payload
+        next_header = 0
+    return struct.pack("!IHBB16s16s", 6 << 28, len(payload), next_header, 64, src, dst) + payload
+
+
+# -----------------------------------------------------------
+# Link layers
+# -----------------------------------------------------------
+def ethernet(ip, vlan=False):
+    ethertype = 0x86DD if ip[0] >> 4 == 6 else 0x0800
+    tag = struct.pack("!HH", 0x8100, 42) if vlan else b""
+    return bytes(12) + tag + struct.pack("!H", ethertype) + ip
+
+
+def loopback(ip, byteorder="<"):
+    family = 30 if ip[0] >> 4 == 6 else 2
+    return struct.pack(byteorder + "I", family) + ip
+
+
+def linux_sll(ip):
+    ethertype = 0x86DD if ip[0] >> 4 == 6 else 0x0800
+    return struct.pack("!HHH8sH", 0, 1, 6, bytes(8), ethertype) + ip
+
+
+def echo_frame(icmp_type, ident, seq, data=b"abcdefgh"):
+    """Ethernet / IPv4 / ICMP echo request (8) or reply (0)."""
+    return ethernet(ipv4(1, icmp_echo(icmp_type, ident, seq, data)))
+
+
+def echo_session(pairs, start=1000.0, interval=1.0, rtt=0.010, ident=7):
+    """
+    (timestamp, frame) packets for `pairs` ping rounds: a request every
+    `interval` seconds, answered `rtt` seconds later. Returns the packets
+    and the expected RTTs in ms.
+    """
+    packets, rtts = [], []
+    for seq in range(pairs):
+        t = start + seq * interval
+        packets.append((t, echo_frame(8, ident, seq)))
+        packets.append((t + rtt, echo_frame(0, ident, seq)))
+        rtts.append(rtt * 1000)
+    return packets, rtts
+
+
+# -----------------------------------------------------------
+# Writers
+# -----------------------------------------------------------
+def write_pcap(path, packets, linktype=LINKTYPE_ETHERNET, endian="<", nanos=False):
+    magic = 0xA1B23C4D if nanos else 0xA1B2C3D4
+    ticks = 10**9 if nanos else 10**6
+    out = [struct.pack(endian + "IHHiIII", magic, 2, 4, 0, 0, 65535, linktype)]
+    for ts, frame in packets:
+        sec, frac = divmod(round(ts * ticks), ticks)
+        out.append(struct.pack(endian + "IIII", sec, frac, len(frame), len(frame)) + frame)
+    with open(path, "wb") as f:
+        f.write(b"".join(out))
+    return path
+
+
+def _block(endian, block_type, body):
+    body += bytes(-len(body) % 4)
+    total = 12 + len(body)
+    return struct.pack(endian + "II", block_type, total) + body + struct.pack(endian + "I", total)
+
+
+def pcapng_section(packets, linktype=LINKTYPE_ETHERNET, endian="<", tsresol=None):
+    """One section (SHB + one IDB + packet blocks) as bytes."""
+    out = [_block(endian, 0x0A0D0D0A, struct.pack(endian + "IHHq", 0x1A2B3C4D, 1, 0, -1))]
+    options = b""
+    if tsresol is not None:
+        options = struct.pack(endian + "HH", 9, 1) + bytes([tsresol, 0, 0, 0])
+        options += struct.pack(endian + "HH", 0, 0)
+    out.append(_block(endian, 1, struct.pack(endian + "HHI", linktype, 0, 65535) + options))
+    ticks = 10 ** (tsresol or 6)
+    for ts, frame in packets:
+        if ts is None:
+            out.append(_block(endian, 3, struct.pack(endian + "I", len(frame)) + frame))
+            continue
+        stamp = round(ts * ticks)
+        out.append(_block(endian, 6, struct.pack(endian + "IIIII", 0, stamp >> 32,
+                                                 stamp & 0xFFFFFFFF, len(frame), len(frame))
+                          + frame))
+    return b"".join(out)
+
+
+def write_pcapng(path, packets, linktype=LINKTYPE_ETHERNET, endian="<", tsresol=None):
+    with open(path, "wb") as f:
+        f.write(pcapng_section(packets, linktype, endian, tsresol))
+    return path
@@ -0,0 +1,224 @@
+import itertools
+import socket
+import struct
+import threading
+import types
+
+import pytest
+
+import dns_probe
+from dns_probe import DnsProber
+
+
+def response(query, rcode=0, truncated=False, txid=None):
+    """Answer a one-question query: same question, QR set, no records."""
+    qid, = struct.unpack_from("!H", query)
+    flags = 0x8180 | rcode | (0x0200 if truncated else 0)
+    return struct.pack("!HHHHHH", qid if txid is None else txid, flags, 1, 0, 0, 0) + query[12:]
+
+
+def first_label(query):
+    return query[13:13 + query[12]].decode()
+
+
+class DnsServer:
+    """
+    UDP + TCP responder on one port. The first label of the name picks the
+    behaviour: ok, nx, fail, drop (never answered), stray (preceded by a
+    reply with the wrong txid and one with the wrong question) and tc
+    (truncated over UDP, answered over TCP).
+    """
+
+    def __init__(self):
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(("127.0.0.1", 0))
+        self.port = self.udp.getsockname()[1]
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tcp.bind(("127.0.0.1", self.port))
+        self.tcp.listen()
+        self.tcp_connections = 0
+        self.tcp_queries = 0
+        for target in (self._serve_udp, self._serve_tcp):
+            threading.Thread(target=target, daemon=True).start()
+
+    def _serve_udp(self):
+        while True:
+            try:
+                query, addr = self.udp.recvfrom(512)
+            except OSError:
+                return
+            label = first_label(query)
+            if label == "drop":
+                continue
+            if label == "stray":
+                qid, = struct.unpack_from("!H", query)
+                self.udp.sendto(response(query, txid=qid ^ 0xFFFF), addr)
+                other = query[:13] + b"x" + query[14:]
+                self.udp.sendto(response(other), addr)
+            rcode = {"nx": 3, "fail": 2}.get(label, 0)
+            self.udp.sendto(response(query, rcode, truncated=label == "tc"), addr)
+
+    def _serve_tcp(self):
+        while True:
+            try:
+                conn, _addr = self.tcp.accept()
+            except OSError:
+                return
+            self.tcp_connections += 1
+            threading.Thread(target=self._serve_stream, args=(conn,), daemon=True).start()
+
+    def _serve_stream(self, conn):
+        with conn:
+            while True:
+                head = conn.recv(2)
+                if len(head) < 2:
+                    return
+                query = conn.recv(struct.unpack("!H", head)[0])
+                self.tcp_queries += 1
+                rcode = {"nx": 3, "fail": 2}.get(first_label(query), 0)
+                msg = response(query, rcode)
+                conn.sendall(struct.pack("!H", len(msg)) + msg)
+
+    def close(self):
+        self.udp.close()
+        self.tcp.close()
+
+
+@pytest.fixture
+def server():
+    srv = DnsServer()
+    yield srv
+    srv.close()
+
+
+@pytest.fixture
+def prober(server):
+    with DnsProber("127.0.0.1", server.port, timeout=0.3) as p:
+        yield p
+
+
+# -----------------------------------------------------------
+# Wire format and helpers
+# -----------------------------------------------------------
+def test_query_wire_format():
+    question = dns_probe.build_question("www.example.com", "AAAA")
+    assert question == b"\x03www\x07example\x03com\x00\x00\x1c\x00\x01"
+    query = dns_probe.build_query(0xBEEF, question)
+    assert query[:12] == bytes.fromhex("beef01000001000000000000")
+    # A query is not a response.
+    assert dns_probe.parse_header(query) is None
+    assert dns_probe.parse_header(response(query, 3, truncated=True)) == (0xBEEF, True, 3)
+    assert dns_probe.parse_header(b"\x00") is None
+    with pytest.raises(ValueError):
+        dns_probe.encode_name("a..b")
+
+
+def test_qnames_cycle_and_cache_miss():
+    assert list(itertools.islice(dns_probe.qnames(["a.com", "b.org"]), 3)) == [
+        "a.com", "b.org", "a.com"]
+    names = list(itertools.islice(dns_probe.qnames(["a.com"], cache_miss=True), 50))
+    assert len(set(names)) == 50 and all(n.endswith(".a.com") for n in names)
+
+
+def test_load_names(tmp_path):
+    assert dns_probe.load_names(" a.com, ,b.org") == ["a.com", "b.org"]
+    path = tmp_path / "names.txt"
+    path.write_text("# top sites\nexample.com\n\nmit.edu  # school\n")
+    assert dns_probe.load_names(f"@{path}") == ["example.com", "mit.edu"]
+    with pytest.raises(ValueError):
+        dns_probe.load_names(",")
+
+
+def test_system_nameserver(tmp_path):
+    conf = tmp_path / "resolv.conf"
+    conf.write_text("# generated\nsearch lan\nnameserver 192.0.2.53\nnameserver 192.0.2.54\n")
+    assert dns_probe.system_nameserver(str(conf)) == "192.0.2.53"
+    conf.write_text("search lan\nnameserver\n")
+    with pytest.raises(ValueError):
+        dns_probe.system_nameserver(str(conf))
+    with pytest.raises(ValueError):
+        dns_probe.system_nameserver(str(tmp_path / "missing"))
+
+
+# -----------------------------------------------------------
+# Prober against the in-test server
+# -----------------------------------------------------------
+def test_query_statuses(prober):
+    status, rtt = prober.query("ok.example.com")
+    assert status == "ok" and rtt > 0
+    assert prober.query("nx.example.com")[0] == "ok"
+    assert prober.query("fail.example.com") == ("error", "SERVFAIL")
+    assert prober.query("drop.example.com") == ("lost", None)
+    assert prober.inflight == {}
+
+
+def test_replies_with_the_wrong_txid_or_question_are_ignored(prober):
+    status, _rtt = prober.query("stray.example.com")
+    assert status == "ok"
+    # The stray replies were not taken for later queries either.
+    assert prober.query("fail.example.com") == ("error", "SERVFAIL")
+
+
+def test_truncated_reply_is_retried_over_tcp(server, prober):
+    assert prober.query("tc.example.com")[0] == "ok"
+    assert server.tcp_queries == 1
+
+
+def test_tcp_transport_keeps_one_connection(server):
+    with DnsProber("127.0.0.1", server.port, timeout=1.0, transport="tcp") as p:
+        results = [p.query(f"{label}.example.com") for label in ("ok", "nx", "fail", "ok")]
+    assert [r[0] for r in results] == ["ok", "ok", "error", "ok"]
+    assert (server.tcp_connections, server.tcp_queries) == (1, 4)
+
+
+def test_open_loop_run(prober):
+    results = {}
+    names = dns_probe.qnames(["ok.example.com", "drop.example.com", "nx.example.com"])
+    sent, elapsed = prober.run(names, 30, qps=300,
+                               on_result=lambda i, name, status, value, lag:
+                               results.setdefault(i, (name, status)))
+    assert sent == 30 and elapsed > 0
+    assert sorted(results) == list(range(30))
+    for i, (name, status) in results.items():
+        assert name.startswith(("ok", "drop", "nx")[i % 3])
+        assert status == ("lost" if i % 3 == 1 else "ok")
+
+
+def test_invalid_transport():
+    with pytest.raises(ValueError):
+        DnsProber("127.0.0.1", transport="doh")
+
+
+class RecordingSocket:
+    """Stands in for socket.socket: records the connect() address and refuses."""
+    connected = []
+
+    def __init__(self, family, kind):
+        self.family = family
+
+    def settimeout(self, timeout):
+        pass
+
+    def connect(self, addr):
+        self.connected.append((self.family, addr))
+        raise ConnectionRefusedError("refused")
+
+    def close(self):
+        pass
+
+
+def scoped_resolver(monkeypatch, module):
+    """Resolve every name to a link-local IPv6 sockaddr with scope id 3."""
+    monkeypatch.setattr(module.resolver, "resolve",
+                        lambda host, port=0, *a, **k: (socket.AF_INET6, ("fe80::1", port, 0, 3)))
+    monkeypatch.setattr(module, "socket", types.SimpleNamespace(
+        **dict(vars(socket), socket=RecordingSocket)))
+    RecordingSocket.connected = []
+
+
+def test_tcp_connect_keeps_the_ipv6_scope_id(monkeypatch):
+    scoped_resolver(monkeypatch, dns_probe)
+    with DnsProber("router.local", 53, transport="tcp") as p:
+        assert p.query("ok.example.com")[0] == "error"
+    assert RecordingSocket.connected == [(socket.AF_INET6, ("fe80::1", 53, 0, 3))]
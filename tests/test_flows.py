@@ -0,0 +1,142 @@
+import glob
+import os
+
+import pytest
+
+import analyze_pcap
+from pcap_parser import TCP_ACK, TCP_FIN, TCP_RST, TCP_SYN
+from pcapgen import DST4, DST6, ROOT, SRC4, SRC6, ethernet, ipv4, ipv6, tcp, write_pcap
+
+BUNDLED = sorted(glob.glob(os.path.join(ROOT, "*.pcap")))
+SYN_ACK = TCP_SYN | TCP_ACK
+PSH_ACK = 0x08 | TCP_ACK
+
+
+def seg(t, up, flags, seq, payload=0, sport=50000, v6=False):
+    """One segment of a client:sport <-> server:80 connection; up is client -> server."""
+    ports = (sport, 80) if up else (80, sport)
+    segment = tcp(*ports, seq, 0, flags, b"x" * payload)
+    if v6:
+        src, dst = (SRC6, DST6) if up else (DST6, SRC6)
+        return t, ethernet(ipv6(6, segment, src, dst))
+    src, dst = (SRC4, DST4) if up else (DST4, SRC4)
+    return t, ethernet(ipv4(6, segment, src, dst))
+
+
+def flows(tmp_path, packets, **kwargs):
+    path = write_pcap(tmp_path / "flows.pcap", packets)
+    return analyze_pcap.analyze_flows(path, **kwargs)
+
+
+def test_connection_with_retransmissions_and_reordering(tmp_path):
+    packets = [
+        seg(0.000, True, TCP_SYN, 1000),
+        seg(1.000, True, TCP_SYN, 1000),            # SYN re-sent: RTT is taken from this one
+        seg(1.030, False, SYN_ACK, 5000),
+        seg(1.060, True, TCP_ACK, 1001),
+        seg(1.100, True, PSH_ACK, 1001, 100),
+        seg(1.200, True, PSH_ACK, 1101, 100),
+        seg(1.500, True, PSH_ACK, 1001, 100),       # retransmission
+        seg(1.600, False, PSH_ACK, 5101, 100),      # arrives before 5001..5100
+        seg(1.610, False, PSH_ACK, 5001, 100),      # out-of-order, within the handshake RTT
+        seg(5.000, True, TCP_ACK, 1200, 1),         # keep-alive
+        seg(6.000, True, TCP_FIN | TCP_ACK, 1201),
+        seg(6.020, False, TCP_FIN | TCP_ACK, 5201),
+        seg(6.050, True, TCP_ACK, 1202),
+    ]
+    counts, rtts, table = flows(tmp_path, packets)
+    assert counts["TCP"] == len(packets) and rtts == []
+    [flow] = table.top_flows()
+    assert flow["client"] == "10.0.0.1:50000" and flow["server"] == "10.0.0.2:80"
+    assert flow["handshake_rtt_ms"] == pytest.approx(30.0)
+    assert (flow["bytes_up"], flow["bytes_down"]) == (301, 200)
+    assert (flow["retransmissions"], flow["retransmitted_bytes"]) == (2, 100)
+    assert flow["out_of_order"] == 1
+    assert flow["state"] == "closed" and flow["duration_s"] == pytest.approx(6.05)
+    assert table.totals["flows"] == 1 and table.totals["packets"] == len(packets)
+    assert table.handshake.count == 1
+    assert "Retransmissions: 2 (100 bytes" in table.format()
+
+
+def test_late_duplicate_is_a_retransmission_not_reordering(tmp_path):
+    packets = [seg(0.0, True, TCP_SYN, 0), seg(0.001, False, SYN_ACK, 0),
+               seg(0.010, True, PSH_ACK, 1, 50), seg(0.020, True, PSH_ACK, 51, 50),
+               # Re-sent 50 ms later, well past the 1 ms handshake RTT.
+               seg(0.070, True, PSH_ACK, 1, 50),
+               # Partly new data: counted once and moves the expected sequence on.
+               seg(0.200, True, PSH_ACK, 51, 100), seg(0.210, True, PSH_ACK, 151, 10)]
+    _counts, _rtts, table = flows(tmp_path, packets)
+    [flow] = table.top_flows()
+    assert (flow["retransmissions"], flow["out_of_order"]) == (2, 0)
+    assert flow["retransmitted_bytes"] == 150
+
+
+def test_sequence_numbers_wrap(tmp_path):
+    start = 0xFFFFFF00
+    packets = [seg(0.0, True, PSH_ACK, start, 0x200),
+               seg(0.1, True, PSH_ACK, (start + 0x200) & 0xFFFFFFFF, 0x200),
+               seg(0.2, True, PSH_ACK, (start + 0x400) & 0xFFFFFFFF, 0x10)]
+    _counts, _rtts, table = flows(tmp_path, packets)
+    assert table.totals["retransmissions"] == table.totals["out_of_order"] == 0
+    assert table.totals["bytes"] == 0x410
+
+
+def test_both_directions_share_one_flow_and_client_is_guessed(tmp_path):
+    # No SYN captured: the side with the ephemeral port is the client.
+    packets = [seg(0.0, False, PSH_ACK, 10, 20), seg(0.1, True, PSH_ACK, 99, 5)]
+    [flow] = flows(tmp_path, packets)[2].top_flows()
+    assert flow["client"] == "10.0.0.1:50000" and flow["packets"] == 2
+    assert flow["handshake_rtt_ms"] is None and flow["state"] == "open"
+    # SYN/ACK first: its receiver is the client.
+    [flow] = flows(tmp_path, [seg(0.0, False, SYN_ACK, 7, sport=80)])[2].top_flows()
+    assert flow["client"] == "10.0.0.1:80"
+
+
+def test_ipv6_flow(tmp_path):
+    packets = [seg(0.0, True, TCP_SYN, 0, v6=True), seg(0.004, False, SYN_ACK, 0, v6=True),
+               seg(0.01, True, TCP_RST, 1, v6=True)]
+    [flow] = flows(tmp_path, packets)[2].top_flows()
+    assert flow["client"] == "[::1]:50000" and flow["state"] == "reset"
+    assert flow["handshake_rtt_ms"] == pytest.approx(4.0)
+
+
+def test_table_is_bounded_by_max_flows(tmp_path):
+    packets = [seg(i * 0.01, True, TCP_SYN, 0, sport=40000 + i) for i in range(10)]
+    _counts, _rtts, table = flows(tmp_path, packets, max_flows=3, top=4)
+    assert table.peak == 3 and table.evicted["overflow"] == 7
+    assert table.totals["flows"] == 10 and table.totals["packets"] == 10
+    assert len(table.top_flows()) == 4
+
+
+def test_closed_and_idle_flows_leave_the_table(tmp_path):
+    packets = [
+        seg(0.0, True, TCP_FIN | TCP_ACK, 1, sport=1001),
+        seg(0.1, False, TCP_FIN | TCP_ACK, 1, sport=1001),
+        seg(0.2, True, PSH_ACK, 1, 10, sport=1002),
+        seg(5.0, True, PSH_ACK, 1, 10, sport=1003),     # closed flow lingered 2 s: gone
+        seg(50.0, True, PSH_ACK, 11, 10, sport=1003),   # 1002 idle for 49.8 s: gone
+    ]
+    _counts, _rtts, table = flows(tmp_path, packets, idle_timeout=30)
+    assert table.evicted["closed"] == 1 and table.evicted["idle"] == 1
+    assert table.totals["flows"] == 3
+
+
+def test_top_flows_are_the_largest(tmp_path):
+    packets = [seg(i * 0.1, True, PSH_ACK, 1, size, sport=2000 + i)
+               for i, size in enumerate([10, 500, 30, 400, 20])]
+    _counts, _rtts, table = flows(tmp_path, packets, top=2)
+    assert [f["bytes"] for f in table.top_flows()] == [500, 400]
+    assert table.totals["bytes"] == 960
+
+
+@pytest.mark.parametrize("path", BUNDLED, ids=os.path.basename)
+def test_flows_engine_agrees_with_the_other_engines(path):
+    counts, rtts = analyze_pcap.analyze_native(path)
+    for name, engine in analyze_pcap.ENGINES.items():
+        if name in ("native", "pyshark"):
+            continue
+        got_counts, got_rtts = engine(path)
+        assert got_counts == counts, name
+        assert sorted(got_rtts) == pytest.approx(sorted(rtts)), name
+    _counts, _rtts, table = analyze_pcap.analyze_flows(path)
+    assert table.totals["packets"] == counts.get("TCP", 0)
@@ -0,0 +1,184 @@
+import http.server
+import socket
+import threading
+import types
+
+import pytest
+
+import http_pool
+import monitor
+import Trafficgen
+from http_pool import MAX_REDIRECTS, HttpPool, redirect_info
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    routes = {
+        "/": (200, None),
+        "/moved": (302, "/target?x=1"),
+        "/target?x=1": (200, None),
+        "/see-other": (303, "/"),
+        "/elsewhere": (301, "http://other.invalid/"),
+        "/loop": (302, "/loop"),
+    }
+
+    def do_HEAD(self):
+        status, location = self.routes.get(self.path, (404, None))
+        self.send_response(status)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_connections_are_reused(server):
+    pool = HttpPool(server + "/")
+    try:
+        first, second = pool.request(), pool.request()
+    finally:
+        pool.close()
+    assert first["status"] == second["status"] == 200
+    assert not first["reused"] and second["reused"]
+    assert first["connect_ms"] > 0 and second["connect_ms"] == 0
+    assert second["total_ms"] >= second["ttfb_ms"] > 0
+
+
+def test_prewarm_fills_the_pool(server):
+    pool = HttpPool(server, size=3)
+    try:
+        pool.prewarm()
+        assert pool.idle.qsize() == 3
+        assert pool.request()["reused"]
+    finally:
+        pool.close()
+
+
+def test_same_origin_redirect_is_followed(server):
+    pool = HttpPool(server + "/moved")
+    try:
+        result = pool.request()
+    finally:
+        pool.close()
+    assert (result["status"], result["redirects"], result["location"]) == (200, 1, None)
+
+
+def test_see_other_redirect_is_followed(server):
+    pool = HttpPool(server + "/see-other")
+    try:
+        assert pool.request("GET")["status"] == 200
+    finally:
+        pool.close()
+
+
+def test_cross_origin_redirect_is_returned(server):
+    pool = HttpPool(server + "/elsewhere")
+    try:
+        result = pool.request()
+    finally:
+        pool.close()
+    assert (result["status"], result["redirects"]) == (301, 0)
+    assert result["location"] == "http://other.invalid/"
+    assert redirect_info(result) == "HTTP 301 -> other.invalid"
+
+
+def test_redirect_loop_stops(server):
+    pool = HttpPool(server + "/loop")
+    try:
+        result = pool.request()
+    finally:
+        pool.close()
+    assert (result["status"], result["redirects"]) == (302, MAX_REDIRECTS)
+    assert result["location"].endswith("/loop")
+
+
+def test_unfollowed_redirects_are_not_logged_as_ok(server):
+    pool = HttpPool(server + "/elsewhere")
+    try:
+        status, info, *timings = Trafficgen.http_pool_mode(pool)
+    finally:
+        pool.close()
+    assert (status, info) == ("redirect", "HTTP 301 -> other.invalid")
+    assert len(timings) == len(Trafficgen.HTTP_POOL_COLUMNS)
+    job = monitor.Job(dict(monitor.DEFAULTS, target=server + "/loop", mode="http"), start=0.0)
+    try:
+        status, info = monitor.http_probe(job)
+    finally:
+        job.close()
+    assert status == "redirect" and info.startswith("HTTP 302 -> 127.0.0.1:")
+
+
+def test_error_status_is_reported(server):
+    pool = HttpPool(server + "/missing")
+    try:
+        assert pool.request()["status"] == 404
+    finally:
+        pool.close()
+
+
+def test_stale_connections_are_retried_on_a_new_one(server):
+    pool = HttpPool(server, size=2)
+    try:
+        pool.prewarm(2)
+        # Both idle connections are dead; the retry must not take the other one.
+        for conn in list(pool.idle.queue):
+            conn.sock.close()
+        result = pool.request()
+    finally:
+        pool.close()
+    assert result["status"] == 200
+    assert not result["reused"] and result["connect_ms"] > 0
+
+
+def test_unreachable_origin_raises():
+    pool = HttpPool("http://127.0.0.1:9", timeout=0.5)
+    with pytest.raises(OSError):
+        pool.request()
+
+
+class RecordingSocket:
+    """Stands in for socket.socket: records the connect() address and refuses."""
+    connected = []
+
+    def __init__(self, family, kind):
+        self.family = family
+
+    def settimeout(self, timeout):
+        pass
+
+    def connect(self, addr):
+        self.connected.append((self.family, addr))
+        raise ConnectionRefusedError("refused")
+
+    def close(self):
+        pass
+
+
+def scoped_resolver(monkeypatch, module):
+    """Resolve every name to a link-local IPv6 sockaddr with scope id 3."""
+    monkeypatch.setattr(module.resolver, "resolve",
+                        lambda host, port=0, *a, **k: (socket.AF_INET6, ("fe80::1", port, 0, 3)))
+    monkeypatch.setattr(module, "socket", types.SimpleNamespace(
+        **dict(vars(socket), socket=RecordingSocket)))
+    RecordingSocket.connected = []
+
+
+def test_connect_keeps_the_ipv6_scope_id(monkeypatch):
+    scoped_resolver(monkeypatch, http_pool)
+    with pytest.raises(ConnectionRefusedError):
+        HttpPool("http://router.local:8080/").request()
+    assert RecordingSocket.connected == [(socket.AF_INET6, ("fe80::1", 8080, 0, 3))]
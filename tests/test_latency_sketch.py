@@ -0,0 +1,141 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+import latency_sketch
+from latency_sketch import LatencySketch
+
+QS = [0.0, 0.01, 0.25, 0.5, 0.9, 0.99, 0.999, 1.0]
+
+
+def within(sketch, data, qs=QS):
+    """Every sketch quantile is within the sketch's relative accuracy of numpy's."""
+    bound = sketch.accuracy * (1 + 1e-9)
+    for q, got, want in zip(qs, sketch.quantiles(qs), np.quantile(data, qs)):
+        assert abs(got - want) <= bound * want, (q, got, want)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+def test_quantiles_are_within_relative_accuracy(rng):
+    data = rng.lognormal(mean=3.0, sigma=1.0, size=20000)
+    sketch = LatencySketch()
+    sketch.update(data)
+    within(sketch, data)
+    assert (sketch.min, sketch.max, sketch.count) == (data.min(), data.max(), data.size)
+    assert sketch.mean == pytest.approx(data.mean())
+
+
+@pytest.mark.parametrize("accuracy", [0.001, 0.05])
+def test_accuracy_is_configurable(rng, accuracy):
+    data = rng.exponential(20.0, size=5000) + 0.5
+    sketch = LatencySketch(accuracy=accuracy)
+    sketch.update(data)
+    within(sketch, data)
+
+
+def test_add_and_update_agree(rng):
+    data = rng.gamma(2.0, 10.0, size=500).tolist() + [math.nan, None]
+    one, many = LatencySketch(), LatencySketch()
+    for v in data:
+        one.add(v)
+    many.update([v for v in data if v is not None])
+    assert list(one.counts) == list(many.counts) and one.count == many.count == 500
+
+
+def test_without_numpy_agrees(rng, monkeypatch):
+    data = rng.lognormal(2.0, 0.5, size=2000)
+    expected = LatencySketch()
+    expected.update(np.concatenate([data, data[:10]]))
+    monkeypatch.setattr(latency_sketch, "np", None)
+    sketch = LatencySketch()
+    sketch.update(data.tolist())
+    other = LatencySketch()
+    other.update(data[:10].tolist())
+    sketch.merge(other).merge(LatencySketch())
+    assert list(sketch.counts) == list(expected.counts)
+    assert sketch.quantiles(QS) == pytest.approx(expected.quantiles(QS))
+
+
+def test_merged_quantiles_are_within_the_bound_of_the_combined_data(rng):
+    fast = rng.normal(15.0, 2.0, size=8000).clip(1.0)
+    slow = rng.lognormal(5.0, 0.8, size=3000)
+    a, b = LatencySketch(), LatencySketch()
+    a.update(fast)
+    b.update(slow)
+    a += b
+    combined = np.concatenate([fast, slow])
+    within(a, combined)
+    # Merging is exact: same counters as one sketch over all the data.
+    whole = LatencySketch()
+    whole.update(combined)
+    assert list(a.counts) == list(whole.counts)
+    assert (a.count, a.min, a.max) == (whole.count, whole.min, whole.max)
+
+
+def test_merge_needs_the_same_layout():
+    with pytest.raises(ValueError):
+        LatencySketch().merge(LatencySketch(accuracy=0.02))
+    with pytest.raises(ValueError):
+        LatencySketch().merge(LatencySketch(max_value=1e5))
+
+
+def test_values_outside_the_range_are_clamped_but_min_max_are_exact():
+    sketch = LatencySketch(min_value=1.0, max_value=100.0)
+    sketch.update([0.0001, 0.5, 50.0, 1e6])
+    assert sketch.counts[0] == 2 and sketch.counts[-1] == 1
+    assert sketch.quantile(0) == 0.0001 and sketch.quantile(1) == 1e6
+
+
+def test_empty_sketch():
+    sketch = LatencySketch()
+    assert all(math.isnan(v) for v in sketch.quantiles([0.5, 0.9]))
+    assert sketch.summary() == {"count": 0}
+    assert sketch.format() == "no samples"
+    with pytest.raises(ValueError):
+        LatencySketch(accuracy=1.0)
+
+
+def test_summary_labels():
+    assert [latency_sketch.quantile_label(q) for q in (0.5, 0.99, 0.999)] == [
+        "p50", "p99", "p99.9"]
+    sketch = LatencySketch()
+    sketch.update([10.0, 20.0, 30.0])
+    assert set(sketch.summary()) == {"count", "mean", "min", "max", "p50", "p90", "p99",
+                                     "p99.9"}
+
+
+def test_dict_round_trip(rng):
+    sketch = LatencySketch(accuracy=0.02)
+    sketch.update(rng.lognormal(3.0, 1.0, size=1000))
+    d = json.loads(json.dumps(sketch.to_dict()))
+    # Only the occupied span of buckets is stored.
+    assert len(d["counts"]) < len(sketch.counts)
+    back = LatencySketch.from_dict(d)
+    assert list(back.counts) == list(sketch.counts)
+    assert back.quantiles(QS) == sketch.quantiles(QS)
+    assert LatencySketch.from_dict(LatencySketch().to_dict()).count == 0
+    with pytest.raises(ValueError):
+        LatencySketch.from_dict(dict(d, version=99))
+
+
+def test_merge_into_accumulates_runs(tmp_path, rng):
+    path = str(tmp_path / "sketches.json")
+    runs = [rng.lognormal(3.0, 0.5, size=400) for _ in range(3)]
+    for i, run in enumerate(runs):
+        sketch = LatencySketch()
+        sketch.update(run)
+        stored = latency_sketch.merge_into(path, {"baseline": sketch, f"run{i}": sketch})
+        # The caller's sketch is not modified by merging it into the file.
+        assert sketch.count == 400
+    loaded = latency_sketch.load_sketches(path)
+    assert set(loaded) == {"baseline", "run0", "run1", "run2"}
+    assert loaded["baseline"].count == 1200
+    within(loaded["baseline"], np.concatenate(runs))
+    assert list(loaded["baseline"].counts) == list(stored["baseline"].counts)
+    assert latency_sketch.load_sketches(str(tmp_path / "missing.json")) == {}
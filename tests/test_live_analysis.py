@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+import analyze_pcap
+import pcap_parser
+from pcapgen import bundled, echo_frame, echo_session, write_pcap
+
+
+def chunks(data, seed):
+    """Split data at random points, including inside record headers."""
+    rng = random.Random(seed)
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 97)
+        yield data[pos:pos + size]
+        pos += size
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_stream_in_arbitrary_chunks_matches_file_reader(seed):
+    path = bundled("capture_google.pcap")
+    with open(path, "rb") as f:
+        data = f.read()
+    stream = pcap_parser.PcapStream()
+    got = [pkt for chunk in chunks(data, seed) for pkt in stream.feed(chunk)]
+    assert got == list(pcap_parser.iter_packets(path))
+
+
+def test_stream_rejects_pcapng():
+    with pytest.raises(pcap_parser.PcapFormatError):
+        pcap_parser.PcapStream().feed(b"\x0a\x0d\x0d\x0a" + bytes(28))
+
+
+def test_stream_holds_back_a_partial_record(tmp_path):
+    packets, _ = echo_session(1)
+    with open(write_pcap(tmp_path / "s.pcap", packets), "rb") as f:
+        data = f.read()
+    stream = pcap_parser.PcapStream()
+    assert len(stream.feed(data[:-3])) == 1
+    assert len(stream.feed(data[-3:])) == 1
+
+
+def test_live_analyzer_matches_offline_analysis():
+    path = bundled("icmp_capture.pcap")
+    live = analyze_pcap.LiveAnalyzer()
+    live.feed(pcap_parser.iter_packets(path))
+    counts, rtts = analyze_pcap.analyze_native(path)
+    assert live.protocol_counts == counts
+    assert sorted(live.recent) == pytest.approx(sorted(rtts))
+    assert (live.sent, live.answered) == (25, 19)
+    assert "echo answered 19/25" in live.summary()
+
+
+def test_live_analyzer_window_and_pruning(tmp_path):
+    packets, _ = echo_session(50, interval=1.0, rtt=0.005)
+    # A request that is never answered must not linger past max_rtt.
+    packets.insert(0, (999.0, echo_frame(8, 99, 99)))
+    live = analyze_pcap.LiveAnalyzer(window=10, max_rtt=5.0)
+    live.feed(pcap_parser.iter_packets(write_pcap(tmp_path / "s.pcap", packets)))
+    assert len(live.recent) == 10
+    assert live.sketch.count == 50
+    assert live.requests == {}
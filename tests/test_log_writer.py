@@ -0,0 +1,118 @@
+import csv
+import threading
+
+import pytest
+
+import log_writer
+import probe_log
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_csv_writer_formats_floats_on_the_writer_thread(tmp_path):
+    path = tmp_path / "log.csv"
+    with log_writer.BufferedCsvWriter(path, ["ts", "latency", "info"],
+                                      formats=[".1f", ".3f"]) as w:
+        w.writerow([1700000000.25, 12.34567, "ok"])
+        w.writerow([1700000001.0, "timeout", "lost"])
+    assert read_csv(path) == [["ts", "latency", "info"],
+                              ["1700000000.2", "12.346", "ok"],
+                              ["1700000001.0", "timeout", "lost"]]
+    assert w.rows_written == 2
+
+
+def test_csv_writer_batches_by_row_count(tmp_path):
+    batches = []
+    w = log_writer.BufferedCsvWriter(tmp_path / "log.csv", flush_interval=60, flush_rows=4,
+                                     observe=lambda batch: batches.append(list(batch)))
+    for i in range(10):
+        w.writerow([i])
+    w.close()
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert [row for b in batches for row in b] == [[i] for i in range(10)]
+
+
+def test_csv_writer_appends(tmp_path):
+    path = tmp_path / "log.csv"
+    with log_writer.BufferedCsvWriter(path, ["n"]) as w:
+        w.writerow([1])
+    with log_writer.BufferedCsvWriter(path, mode="a") as w:
+        w.writerow([2])
+    assert read_csv(path) == [["n"], ["1"], ["2"]]
+
+
+def test_writerow_after_close_raises(tmp_path):
+    w = log_writer.BufferedCsvWriter(tmp_path / "log.csv")
+    w.close()
+    w.close()
+    with pytest.raises(ValueError):
+        w.writerow([1])
+
+
+def test_observe_error_is_reraised_without_blocking(tmp_path):
+    def observe(batch):
+        raise RuntimeError("sketch broke")
+
+    w = log_writer.BufferedCsvWriter(tmp_path / "log.csv", flush_rows=1, queue_size=2,
+                                     observe=observe)
+    done = threading.Event()
+
+    def produce():
+        # Far more rows than the queue holds: the failed writer must keep draining.
+        try:
+            for i in range(1000):
+                w.writerow([i])
+        except RuntimeError:
+            pass
+        done.set()
+
+    threading.Thread(target=produce, daemon=True).start()
+    assert done.wait(10)
+    with pytest.raises(RuntimeError, match="sketch broke"):
+        w.writerow([0])
+    with pytest.raises(RuntimeError, match="sketch broke"):
+        w.close()
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        log_writer._BufferedWriter()
+
+
+def test_open_writer_picks_the_format_from_the_extension(tmp_path):
+    w = log_writer.open_writer(tmp_path / "log.csv", ["n"])
+    w.close()
+    assert isinstance(w, log_writer.BufferedCsvWriter)
+
+    def to_record(row):
+        ts, seq, latency = row
+        return {"timestamp": ts, "seq": seq, "latency_ms": latency,
+                "status": "ok" if latency is not None else "lost", "target": "8.8.8.8"}
+
+    path = str(tmp_path / "log.rtlog")
+    with log_writer.open_writer(path, to_record=to_record, flush_rows=2) as w:
+        for row in [(10.0, 0, 12.5), (11.0, 1, None), (12.0, 2, 14.0)]:
+            w.writerow(row)
+    assert isinstance(w, log_writer.BufferedProbeLogWriter)
+    frame = probe_log.read_frame(path)
+    assert frame["seq"].tolist() == [0, 1, 2]
+    assert frame["status"].tolist() == ["ok", "lost", "ok"]
+    assert frame["latency_ms"].isna().tolist() == [False, True, False]
+
+
+def test_probe_log_writer_mode_w_replaces_the_file(tmp_path):
+    path = str(tmp_path / "log.rtlog")
+
+    def to_record(row):
+        return {"timestamp": row[0], "seq": row[1], "latency_ms": 1.0, "status": "ok"}
+
+    for _ in range(2):
+        with log_writer.BufferedProbeLogWriter(path, to_record) as w:
+            w.writerow((1.0, 0))
+    assert len(probe_log.read_frame(path)) == 1
+    with log_writer.BufferedProbeLogWriter(path, to_record, mode="a") as w:
+        w.writerow((2.0, 1))
+    assert len(probe_log.read_frame(path)) == 2
@@ -0,0 +1,187 @@
+import json
+import socket
+import threading
+
+import pytest
+
+import monitor
+
+
+class ListWriter:
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+class Resource:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def write_config(path, jobs, defaults=None):
+    path.write_text(json.dumps({"defaults": defaults or {}, "jobs": jobs}))
+    return str(path)
+
+
+@pytest.fixture
+def mon(tmp_path):
+    m = monitor.Monitor(str(tmp_path / "monitor.json"), ListWriter(), workers=2)
+    yield m
+    m.close()
+
+
+@pytest.fixture
+def echo_server():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    s.settimeout(0.2)
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            try:
+                data, addr = s.recvfrom(65535)
+            except socket.timeout:
+                continue
+            s.sendto(data, addr)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield s.getsockname()[1]
+    stop.set()
+    thread.join()
+    s.close()
+
+
+def test_load_config_expands_targets_and_fills_defaults(tmp_path):
+    path = write_config(tmp_path / "c.json", [
+        {"targets": ["a.example", "b.example"], "mode": "tcp"},
+        {"target": "8.8.8.8", "mode": "dns", "interval": 0},
+    ], defaults={"timeout": 2.0})
+    specs = monitor.load_config(path)
+    assert [s["target"] for s in specs] == ["a.example", "b.example", "8.8.8.8"]
+    assert specs[0]["port"] == 443 and specs[2]["port"] == 53
+    assert specs[0]["timeout"] == 2.0 and specs[0]["interval"] == 10.0
+    assert specs[2]["interval"] == 0.01
+
+
+def test_load_config_rejects_unknown_modes(tmp_path):
+    with pytest.raises(ValueError):
+        monitor.load_config(write_config(tmp_path / "c.json", [{"target": "x", "mode": "ftp"}]))
+
+
+def test_job_key_ignores_timing():
+    spec = dict(monitor.DEFAULTS, target="x", mode="dns", port=53)
+    assert monitor.job_key(spec) == monitor.job_key(dict(spec, interval=1, jitter=0.5))
+    assert monitor.job_key(spec) != monitor.job_key(dict(spec, qname="other.example"))
+
+
+def test_next_due_stays_on_the_grid_and_skips_missed_slots():
+    job = monitor.Job(dict(monitor.DEFAULTS, target="x", mode="tcp", interval=10.0, jitter=0.0),
+                      start=0.0)
+    first = job.nominal
+    assert job.next_due(first) == pytest.approx(first + 10)
+    # Running 35 s late skips the slots that already passed.
+    assert job.next_due(first + 45) == pytest.approx(first + 50)
+
+
+def test_job_close_waits_for_the_probe_in_flight():
+    job = monitor.Job(dict(monitor.DEFAULTS, target="x", mode="udp"), start=0.0)
+    job.resource = res = Resource()
+    job.in_flight = True
+    job.close()
+    assert not job.active and not res.closed
+    job.release()
+    assert res.closed and job.resource is None
+
+
+def test_job_close_when_idle_closes_at_once():
+    job = monitor.Job(dict(monitor.DEFAULTS, target="x", mode="udp"), start=0.0)
+    job.resource = res = Resource()
+    job.close()
+    assert res.closed
+
+
+def test_reload_with_a_missing_config_keeps_running(mon, capsys):
+    mon.reload()
+    assert mon.jobs == {}
+    assert "config not applied" in capsys.readouterr().out
+    assert not mon._config_changed()
+
+
+def test_reload_keeps_unchanged_jobs_and_stops_removed_ones(mon, tmp_path):
+    path = tmp_path / "monitor.json"
+    keep = {"target": "127.0.0.1", "mode": "tcp", "port": 22}
+    drop = {"target": "127.0.0.1", "mode": "udp"}
+    write_config(path, [keep, drop])
+    mon.reload()
+    kept = mon.jobs[("tcp", "127.0.0.1", 22, None)]
+    dropped = mon.jobs[("udp", "127.0.0.1", 9999, None)]
+    dropped.resource = res = Resource()
+    write_config(path, [keep, {"target": "127.0.0.2", "mode": "tcp", "port": 22}])
+    mon.reload()
+    assert mon.jobs[("tcp", "127.0.0.1", 22, None)] is kept
+    assert ("tcp", "127.0.0.2", 22, None) in mon.jobs and len(mon.jobs) == 2
+    assert not dropped.active and res.closed
+
+
+def test_record_logs_counts_and_skips_stopped_jobs(mon):
+    job = monitor.Job(dict(monitor.DEFAULTS, target="t", mode="tcp"), start=0.0)
+    job.in_flight = True
+    mon.record(job, "ok", 12.5)
+    mon.record(job, "lost", None)
+    mon.record(job, "error", "refused")
+    assert not job.in_flight
+    assert [row[4:] for row in mon.writer.rows] == [["ok", 12.5], ["lost", None],
+                                                    ["error", "refused"]]
+    assert (mon.stats["ok"], mon.stats["lost"], mon.stats["error"]) == (1, 1, 1)
+    assert mon.sketches["tcp"].count == 1
+    job.close()
+    mon.record(job, "ok", 1.0)
+    assert len(mon.writer.rows) == 3
+
+
+def test_fire_skips_a_job_still_in_flight(mon):
+    job = monitor.Job(dict(monitor.DEFAULTS, target="t", mode="tcp"), start=0.0)
+    job.in_flight = True
+    mon.fire(job)
+    assert mon.stats["skipped"] == 1
+
+
+def test_udp_job_reuses_its_socket(mon, echo_server):
+    spec = dict(monitor.DEFAULTS, target="127.0.0.1", mode="udp", port=echo_server,
+                await_reply=True)
+    job = monitor.Job(spec, start=0.0)
+    first = monitor.udp_probe(job)
+    sock = job.resource
+    second = monitor.udp_probe(job)
+    assert first[0] == second[0] == "ok-reply"
+    assert job.resource is sock and job.seq == 2
+    job.close()
+    assert sock.fileno() == -1
+
+
+def test_tcp_and_udp_jobs_reach_ipv6_targets():
+    listener = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+    listener.bind(("::1", 0))
+    listener.listen()
+    echo = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+    echo.bind(("::1", 0))
+    try:
+        tcp = monitor.Job(dict(monitor.DEFAULTS, target="::1", mode="tcp",
+                               port=listener.getsockname()[1]), start=0.0)
+        assert monitor.tcp_probe(tcp)[0] == "ok"
+        udp = monitor.Job(dict(monitor.DEFAULTS, target="::1", mode="udp",
+                               port=echo.getsockname()[1]), start=0.0)
+        assert monitor.udp_probe(udp) == ("sent", None)
+        assert udp.resource.family == socket.AF_INET6
+        data, _addr = echo.recvfrom(65535)
+        assert len(data) == monitor.DEFAULTS["payload_size"]
+        udp.close()
+    finally:
+        listener.close()
+        echo.close()
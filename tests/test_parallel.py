@@ -0,0 +1,87 @@
+import glob
+import os
+from collections import Counter
+
+import pytest
+
+import analyze_pcap
+import pcap_parser
+from pcapgen import (LINKTYPE_ETHERNET, LINKTYPE_RAW, ROOT, echo_session, icmp_echo, ipv4,
+                     pcapng_section, write_pcap)
+
+BUNDLED = sorted(glob.glob(os.path.join(ROOT, "*.pcap")))
+
+
+def two_section_pcapng(path):
+    """Little-endian Ethernet section, then a big-endian raw-IP section with ns timestamps."""
+    first, _ = echo_session(40, start=100.0)
+    second = [(200.0 + i * 0.5 + (i % 2) * 0.004,
+               ipv4(1, icmp_echo(0 if i % 2 else 8, 3, i // 2))) for i in range(80)]
+    with open(path, "wb") as f:
+        f.write(pcapng_section(first, LINKTYPE_ETHERNET, "<")
+                + pcapng_section(second, LINKTYPE_RAW, ">", tsresol=9))
+    return path
+
+
+def scan_shards(path, shards):
+    return [row for start, stop, state in pcap_parser.shard_ranges(path, shards)
+            for row in pcap_parser.scan_mmap(path, start, stop, state=state)]
+
+
+@pytest.mark.parametrize("shards", [1, 2, 3, 7])
+def test_shards_cover_the_file_on_record_boundaries(tmp_path, shards):
+    packets, _ = echo_session(50)
+    path = write_pcap(tmp_path / "s.pcap", packets)
+    ranges = pcap_parser.shard_ranges(path, shards)
+    assert 1 <= len(ranges) <= shards
+    assert ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(path)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    record = 16 + len(packets[0][1])
+    assert all((start - 24) % record == 0 for start, _stop, _state in ranges[1:])
+    assert scan_shards(path, shards) == list(pcap_parser.scan_mmap(path))
+
+
+@pytest.mark.parametrize("shards", [2, 3, 7])
+def test_pcapng_shards_start_with_section_state(tmp_path, shards):
+    path = two_section_pcapng(tmp_path / "two.pcapng")
+    ranges = pcap_parser.shard_ranges(path, shards)
+    assert len(ranges) == shards
+    for start, _stop, state in ranges[1:]:
+        endian, interfaces = state
+        # The interface table travels with the shard, so the walk can start at `start`.
+        assert endian in "<>" and len(interfaces) == 1
+    assert scan_shards(path, shards) == list(pcap_parser.iter_packets(path))
+
+
+def test_pcapng_shard_state_reflects_its_section(tmp_path):
+    path = two_section_pcapng(tmp_path / "two.pcapng")
+    *_rest, (_start, _stop, (endian, interfaces)) = pcap_parser.shard_ranges(path, 7)
+    assert endian == ">"
+    assert interfaces[0][0] == LINKTYPE_RAW and interfaces[0][1] == pytest.approx(1e-9)
+
+
+def test_merge_shards_matches_replies_across_shard_boundaries():
+    first = (Counter({None: 2}), [], [], {(1, 0): 10.0, (1, 1): 11.0})
+    second = (Counter({None: 2}), [], [((1, 0), 10.02), ((1, 1), 11.03)], {})
+    counts, rtts = analyze_pcap.merge_shards([first, second])
+    assert counts == Counter({None: 4})
+    assert rtts == pytest.approx([20.0, 30.0])
+
+
+def test_merge_shards_latest_request_wins():
+    first = (Counter(), [], [], {(1, 0): 10.0})
+    second = (Counter(), [], [], {(1, 0): 12.0})
+    third = (Counter(), [], [((1, 0), 12.05)], {})
+    assert analyze_pcap.merge_shards([first, second, third])[1] == pytest.approx([50.0])
+
+
+@pytest.mark.parametrize("path", BUNDLED, ids=os.path.basename)
+def test_analyze_parallel_matches_native(path):
+    assert analyze_pcap.analyze_parallel(path, jobs=3) == analyze_pcap.analyze_native(path)
+
+
+def test_analyze_parallel_pcapng_matches_native(tmp_path):
+    path = two_section_pcapng(tmp_path / "two.pcapng")
+    counts, rtts = analyze_pcap.analyze_parallel(path, jobs=4)
+    assert (counts, rtts) == analyze_pcap.analyze_native(path)
+    assert len(rtts) == 80
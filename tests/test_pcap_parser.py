@@ -0,0 +1,159 @@
+import struct
+from collections import Counter
+
+import pytest
+
+import analyze_pcap
+import pcap_parser
+from pcapgen import (LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, LINKTYPE_NULL, LINKTYPE_RAW,
+                     bundled, echo_frame, echo_session, ethernet, icmp_echo, ipv4, ipv6,
+                     linux_sll, loopback, tcp, udp, write_pcap, write_pcapng)
+
+
+# -----------------------------------------------------------
+# decode_packet
+# -----------------------------------------------------------
+@pytest.mark.parametrize("linktype, frame", [
+    (LINKTYPE_ETHERNET, ethernet(ipv4(1, icmp_echo(8, 7, 3)))),
+    (LINKTYPE_ETHERNET, ethernet(ipv4(1, icmp_echo(8, 7, 3)), vlan=True)),
+    (LINKTYPE_LINUX_SLL, linux_sll(ipv4(1, icmp_echo(8, 7, 3)))),
+    (LINKTYPE_NULL, loopback(ipv4(1, icmp_echo(8, 7, 3)), "<")),
+    (LINKTYPE_NULL, loopback(ipv4(1, icmp_echo(8, 7, 3)), ">")),
+    (LINKTYPE_RAW, ipv4(1, icmp_echo(8, 7, 3))),
+])
+def test_decode_echo_request_on_every_link_layer(linktype, frame):
+    assert pcap_parser.decode_packet(linktype, frame) == (None, 8, 7, 3)
+
+
+def test_decode_icmpv6_echo_behind_extension_header():
+    frame = ethernet(ipv6(58, icmp_echo(129, 1, 65535), hop_by_hop=True))
+    assert pcap_parser.decode_packet(LINKTYPE_ETHERNET, frame) == (None, 129, 1, 65535)
+
+
+def test_decode_transport_names():
+    tcp_frame = ethernet(ipv4(6, tcp(1234, 80, 1, 0, 0x02)))
+    udp_frame = ethernet(ipv6(17, udp(5353, 53, b"q")))
+    assert pcap_parser.decode_packet(LINKTYPE_ETHERNET, tcp_frame) == ("TCP", None, None, None)
+    assert pcap_parser.decode_packet(LINKTYPE_ETHERNET, udp_frame) == ("UDP", None, None, None)
+
+
+def test_decode_ignores_non_ip_and_truncated_icmp():
+    arp = bytes(12) + b"\x08\x06" + bytes(28)
+    assert pcap_parser.decode_packet(LINKTYPE_ETHERNET, arp) == (None, None, None, None)
+    short = ethernet(ipv4(1, b"\x08\x00\x00"))
+    assert pcap_parser.decode_packet(LINKTYPE_ETHERNET, short)[1] is None
+
+
+def test_decode_in_place_with_offsets():
+    frame = echo_frame(0, 9, 4)
+    buf = b"junk" + frame + b"trailer"
+    assert (pcap_parser.decode_packet(LINKTYPE_ETHERNET, buf, 4, 4 + len(frame))
+            == pcap_parser.decode_packet(LINKTYPE_ETHERNET, frame))
+
+
+def test_decode_echo_payload_hash_tells_payloads_apart():
+    a = pcap_parser.decode_echo(LINKTYPE_ETHERNET, echo_frame(8, 1, 1, b"first"))
+    b = pcap_parser.decode_echo(LINKTYPE_ETHERNET, echo_frame(8, 1, 1, b"other"))
+    assert a[:4] == b[:4] == (None, 8, 1, 1)
+    assert a[4] != b[4]
+    assert pcap_parser.decode_echo(LINKTYPE_ETHERNET, ethernet(ipv4(17, udp(1, 2))))[4] is None
+
+
+def test_decode_segment_reports_tcp_fields():
+    frame = ethernet(ipv4(6, tcp(40000, 443, 1000, 2000, 0x18, b"x" * 100)))
+    proto, _t, _i, _s, segment = pcap_parser.decode_segment(LINKTYPE_ETHERNET, frame)
+    assert proto == "TCP"
+    src, dst, sport, dport, seq, ack, flags, payload = segment
+    assert pcap_parser.format_addr(src) == "10.0.0.1"
+    assert pcap_parser.format_addr(dst) == "10.0.0.2"
+    assert (sport, dport, seq, ack, flags, payload) == (40000, 443, 1000, 2000, 0x18, 100)
+
+
+# -----------------------------------------------------------
+# File readers
+# -----------------------------------------------------------
+@pytest.mark.parametrize("endian", ["<", ">"])
+@pytest.mark.parametrize("nanos", [False, True])
+def test_pcap_timestamps_and_byte_order(tmp_path, endian, nanos):
+    packets, _ = echo_session(3, start=1700000000.25)
+    path = write_pcap(tmp_path / "s.pcap", packets, endian=endian, nanos=nanos)
+    got = list(pcap_parser.iter_packets(path))
+    assert [p[1:] for p in got] == [(None, 8, 7, 0), (None, 0, 7, 0), (None, 8, 7, 1),
+                                    (None, 0, 7, 1), (None, 8, 7, 2), (None, 0, 7, 2)]
+    assert [p[0] for p in got] == pytest.approx([ts for ts, _ in packets], abs=1e-6)
+
+
+def test_pcap_truncated_final_record_is_dropped(tmp_path):
+    packets, _ = echo_session(2)
+    path = write_pcap(tmp_path / "t.pcap", packets)
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5)
+    assert len(list(pcap_parser.iter_packets(path))) == 3
+
+
+def test_pcapng_matches_pcap(tmp_path):
+    packets, _ = echo_session(4)
+    packets.append((2000.0, ethernet(ipv4(6, tcp(1, 2, 3, 4, 0x10)))))
+    pcap = list(pcap_parser.iter_packets(write_pcap(tmp_path / "a.pcap", packets)))
+    for endian in "<>":
+        path = write_pcapng(tmp_path / f"a{endian == '<'}.pcapng", packets, endian=endian)
+        ng = list(pcap_parser.iter_packets(path))
+        assert [p[1:] for p in ng] == [p[1:] for p in pcap]
+        assert [p[0] for p in ng] == pytest.approx([p[0] for p in pcap])
+
+
+def test_pcapng_tsresol_option(tmp_path):
+    path = write_pcapng(tmp_path / "ns.pcapng", [(12.000000123, echo_frame(8, 1, 1))], tsresol=9)
+    (ts, *_rest), = pcap_parser.iter_packets(path)
+    assert ts == pytest.approx(12.000000123, abs=1e-9)
+
+
+def test_pcapng_simple_packet_blocks_have_no_timestamp(tmp_path):
+    packets = [(None, echo_frame(8, 1, 0)), (5.0, echo_frame(0, 1, 0))]
+    path = write_pcapng(tmp_path / "spb.pcapng", packets)
+    assert list(pcap_parser.iter_packets(path)) == [(None, None, 8, 1, 0), (5.0, None, 0, 1, 0)]
+    assert pcap_parser.count_untimed(path) == 1
+
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / "x.pcap"
+    path.write_bytes(b"not a capture at all, just text")
+    with pytest.raises(pcap_parser.PcapFormatError):
+        list(pcap_parser.iter_packets(path))
+
+
+# -----------------------------------------------------------
+# analyze_native
+# -----------------------------------------------------------
+def test_analyze_native_matches_known_rtts(tmp_path):
+    packets, rtts = echo_session(5, rtt=0.0125)
+    packets.append((3000.0, ethernet(ipv4(17, udp(1, 2)))))
+    counts, got = analyze_pcap.analyze_native(write_pcap(tmp_path / "s.pcap", packets))
+    assert counts == Counter({None: 10, "UDP": 1})
+    assert got == pytest.approx(rtts)
+
+
+def test_analyze_native_skips_untimed_packets(tmp_path):
+    packets = [(None, echo_frame(8, 1, 0)), (None, echo_frame(0, 1, 0)),
+               (1.0, echo_frame(8, 1, 1)), (1.02, echo_frame(0, 1, 1))]
+    counts, rtts = analyze_pcap.analyze_native(write_pcapng(tmp_path / "m.pcapng", packets))
+    assert counts[None] == 4
+    assert rtts == pytest.approx([20.0])
+
+
+def test_bundled_capture_google():
+    counts, rtts = analyze_pcap.analyze_native(bundled("capture_google.pcap"))
+    assert counts == Counter({"TCP": 80, "UDP": 25, None: 16})
+    assert len(rtts) == 5
+    assert sum(rtts) / len(rtts) == pytest.approx(47.404, abs=1e-3)
+
+
+def test_bundled_capture_record_count():
+    # Every record in the file is decoded exactly once.
+    with open(bundled("icmp_capture.pcap"), "rb") as f:
+        data = f.read()
+    records, pos = 0, 24
+    while pos + 16 <= len(data):
+        pos += 16 + struct.unpack_from("<I", data, pos + 8)[0]
+        records += 1
+    assert sum(analyze_pcap.analyze_native(bundled("icmp_capture.pcap"))[0].values()) == records
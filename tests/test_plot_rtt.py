@@ -0,0 +1,105 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import plot_rtt
+
+
+def wave(n=10000):
+    x = np.arange(n, dtype=float)
+    return x, 20 + 10 * np.sin(x / 150)
+
+
+def runs(y):
+    """Number of NaN runs in y."""
+    nan = np.isnan(y).astype(int)
+    return int(np.count_nonzero(np.diff(np.r_[0, nan]) == 1))
+
+
+@pytest.fixture(autouse=True)
+def no_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        yield
+
+
+@pytest.mark.parametrize("method", [plot_rtt.minmax_decimate, plot_rtt.lttb])
+def test_decimation_keeps_the_point_budget_and_the_endpoints(method):
+    x, y = wave()
+    dx, dy = method(x, y, 500)
+    assert len(dx) == 500
+    assert (dx[0], dx[-1]) == (x[0], x[-1])
+    assert np.all(np.diff(dx) > 0)
+    # Peaks survive: the envelope is within a sample of the original one.
+    assert dy.max() == pytest.approx(y.max(), abs=0.01)
+    assert dy.min() == pytest.approx(y.min(), abs=0.01)
+
+
+@pytest.mark.parametrize("method", [plot_rtt.minmax_decimate, plot_rtt.lttb])
+def test_short_series_are_returned_as_is(method):
+    x, y = wave(100)
+    dx, dy = method(x, y, 500)
+    assert dx is x and dy is y
+
+
+def test_minmax_keeps_every_buckets_extremes():
+    x, y = wave()
+    y[1234], y[8765] = 500.0, -5.0
+    _dx, dy = plot_rtt.minmax_decimate(x, y, 200)
+    assert 500.0 in dy and -5.0 in dy
+
+
+@pytest.mark.parametrize("method", [plot_rtt.minmax_decimate, plot_rtt.lttb])
+def test_missing_timestamps_break_the_line(method):
+    x, y = wave()
+    keep = (x < 3000) | (x >= 6000)
+    dx, dy = method(x[keep], y[keep], 400)
+    # One NaN is inserted where the samples jump over the hole.
+    assert runs(dy) == 1
+    hole = np.flatnonzero(np.isnan(dy))[0]
+    assert dx[hole - 1] < 3000 and dx[hole + 1] >= 6000
+
+
+@pytest.mark.parametrize("method", [plot_rtt.minmax_decimate, plot_rtt.lttb])
+def test_nan_runs_stay_gaps(method):
+    x, y = wave()
+    y[:40] = np.nan
+    y[2000:4000] = np.nan
+    y[-300:] = np.nan
+    dx, dy = method(x, y, 500)
+    assert runs(dy) == 3
+    assert np.nanmax(dy) == pytest.approx(y[~np.isnan(y)].max(), abs=0.01)
+
+
+def test_lttb_follows_the_shape_next_to_a_gap():
+    # 20 buckets of 50 samples, every other one all NaN. Buckets with data
+    # must still choose by triangle area, though the bucket after them is
+    # empty: every other one picks its spike (the rest, anchored on a spike,
+    # pick the low point after it).
+    x = np.arange(1002, dtype=float)
+    y = np.full(1002, np.nan)
+    for start in range(1, 1001, 100):
+        y[start:start + 50] = 10.0
+        y[start + 25] = 50.0
+    _dx, dy = plot_rtt.lttb(x, y, 22)
+    assert np.count_nonzero(dy == 50.0) == 5
+    assert np.count_nonzero(~np.isnan(dy)) == 10
+
+
+def test_rolling_band():
+    x, y = wave(1000)
+    bx, (lo, hi) = plot_rtt.rolling_band(pd.Series(y, index=x), points=100)
+    assert len(bx) == len(lo) == len(hi) and 90 <= len(bx) <= 100
+    assert np.all(lo <= hi)
+    assert bx[0] == x[10]
+
+
+def test_rolling_band_over_gaps_and_empty_series():
+    x, y = wave(1000)
+    y[200:600] = np.nan
+    _bx, (lo, _hi) = plot_rtt.rolling_band(pd.Series(y, index=x), points=100)
+    assert np.isnan(lo).any() and not np.isnan(lo).all()
+    bx, bands = plot_rtt.rolling_band(pd.Series([], dtype=float))
+    assert bx.size == 0 and bands.shape == (2, 0)
@@ -0,0 +1,92 @@
+import struct
+import time
+import types
+
+import probe_engine
+from probe_engine import BatchPinger
+
+A, B, C = "192.0.2.1", "192.0.2.2", "192.0.2.3"
+
+
+def echo_reply(ident, seq, ip_header=False):
+    icmp = struct.pack("!BBHHH", probe_engine.ICMP_ECHO_REPLY, 0, 0, ident, seq)
+    return (b"\x45" + b"\0" * 19 if ip_header else b"") + icmp
+
+
+class FakeIcmpSocket:
+    """
+    ICMP socket that holds every reply until `total` echoes were sent and
+    then hands back whatever `answer(sent)` returns, as (data, src) pairs.
+    """
+
+    def __init__(self, total, answer):
+        self.total = total
+        self.answer = answer
+        self.sent = []
+        self.inbox = []
+
+    def setsockopt(self, *args):
+        pass
+
+    def sendto(self, data, addr):
+        _type, _code, _csum, ident, seq = struct.unpack_from("!BBHHH", data)
+        self.sent.append((addr[0], ident, seq))
+        if len(self.sent) == self.total:
+            self.inbox = list(self.answer(self.sent))
+
+    def recvfrom(self, size):
+        if not self.inbox:
+            raise BlockingIOError
+        data, src = self.inbox.pop(0)
+        return data, (src, 0)
+
+    def close(self):
+        pass
+
+
+def fake_select(r, w, x, timeout):
+    ready = [s for s in r if s.inbox]
+    if not ready:
+        time.sleep(min(timeout, 0.01))
+    return ready, [], []
+
+
+def use_socket(monkeypatch, sock, is_datagram=True):
+    monkeypatch.setattr(probe_engine, "open_icmp_socket", lambda: (sock, is_datagram))
+    monkeypatch.setattr(probe_engine, "select", types.SimpleNamespace(select=fake_select))
+
+
+def test_interleaved_replies_are_matched_by_source_and_seq(monkeypatch):
+    def answer(sent):
+        by_probe = {(addr, i // 3): seq for i, (addr, _ident, seq) in enumerate(sent)}
+        replies = [(echo_reply(0, seq), addr) for addr, _ident, seq in reversed(sent)
+                   if (addr, seq) != (A, by_probe[(A, 1)])]
+        # A's second echo is lost; its seq comes back from C and B's twice.
+        replies.insert(2, (echo_reply(0, by_probe[(A, 1)]), C))
+        replies.append((echo_reply(0, by_probe[(B, 0)]), B))
+        return replies
+
+    sock = FakeIcmpSocket(6, answer)
+    use_socket(monkeypatch, sock)
+    with BatchPinger(timeout=0.05) as pinger:
+        results = pinger.ping([A, B, C, A], count=2)
+
+    assert [addr for addr, _ident, _seq in sock.sent] == [A, B, C] * 2
+    assert len({seq for _addr, _ident, seq in sock.sent}) == 6
+    assert {addr: len(rtts) for addr, rtts in results.items()} == {A: 1, B: 2, C: 2}
+    assert all(rtt >= 0 for rtts in results.values() for rtt in rtts)
+
+
+def test_raw_socket_checks_the_identifier(monkeypatch):
+    def answer(sent):
+        (_a, ident, seq_a), (_b, _ident, seq_b) = sent
+        # Another pinger's reply for the same (source, seq), then ours for B only.
+        return [(echo_reply(ident ^ 1, seq_a, True), A),
+                (echo_reply(ident, seq_b, True), B)]
+
+    sock = FakeIcmpSocket(2, answer)
+    use_socket(monkeypatch, sock, is_datagram=False)
+    with BatchPinger(timeout=0.05) as pinger:
+        results = pinger.ping([A, B])
+
+    assert {addr: len(rtts) for addr, rtts in results.items()} == {A: 0, B: 1}
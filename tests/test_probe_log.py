@@ -0,0 +1,97 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+import probe_log
+
+ROWS = [
+    (1700000000.5, 0, 12.25, "ok", "8.8.8.8", "icmp", "", (3.5,)),
+    (1700000001.5, 1, None, "lost", "8.8.8.8", "icmp", "timeout", ()),
+    (1700000002.5, 2, 40.0, "ok", "example.com", "http", "", (21.0,)),
+]
+
+
+def write(path, rows, extra=("ttfb_ms",), chunk=2):
+    with probe_log.ProbeLogWriter(path, extra=extra) as log:
+        for i, (ts, seq, latency, status, target, tag, info, values) in enumerate(rows, 1):
+            log.append(ts, seq, latency, status, target=target, tag=tag, info=info, extra=values)
+            if i % chunk == 0:
+                log.flush()
+
+
+def test_round_trip_keeps_types_and_values(tmp_path):
+    path = str(tmp_path / "log.rtlog")
+    write(path, ROWS)
+    frame = probe_log.read_frame(path)
+    assert list(frame.columns) == ["timestamp", "seq", "latency_ms", "status", "target",
+                                   "tag", "info", "ttfb_ms"]
+    assert frame["timestamp"].dtype == np.float64 and frame["seq"].dtype == np.int64
+    assert frame["timestamp"].tolist() == [r[0] for r in ROWS]
+    assert frame["seq"].tolist() == [0, 1, 2]
+    assert frame["latency_ms"].tolist()[::2] == [12.25, 40.0]
+    assert math.isnan(frame["latency_ms"][1])
+    for col, i in (("status", 3), ("target", 4), ("tag", 5), ("info", 6)):
+        assert frame[col].dtype == "category"
+        assert frame[col].tolist() == [r[i] for r in ROWS]
+    # A missing extra value is stored as NaN.
+    assert frame["ttfb_ms"].isna().tolist() == [False, True, False]
+
+
+def test_read_columns_returns_codes_and_category_tables(tmp_path):
+    path = str(tmp_path / "log.rtlog")
+    write(path, ROWS, chunk=1)
+    cols = probe_log.read_columns(path)
+    assert cols["status_categories"] == ["ok", "lost"]
+    assert cols["status"].tolist() == [0, 1, 0]
+    assert cols["target_categories"] == ["8.8.8.8", "example.com"]
+
+
+def test_appending_reuses_the_category_tables(tmp_path):
+    path = str(tmp_path / "log.rtlog")
+    write(path, ROWS[:2])
+    write(path, ROWS[2:] + ROWS[:1])
+    frame = probe_log.read_frame(path)
+    assert frame["seq"].tolist() == [0, 1, 2, 0]
+    assert frame["target"].tolist() == ["8.8.8.8", "8.8.8.8", "example.com", "8.8.8.8"]
+    assert probe_log.read_columns(path)["target_categories"] == ["8.8.8.8", "example.com"]
+
+
+def test_appending_with_other_extra_columns_is_refused(tmp_path):
+    path = str(tmp_path / "log.rtlog")
+    write(path, ROWS)
+    with pytest.raises(probe_log.ProbeLogError):
+        probe_log.ProbeLogWriter(path, extra=())
+
+
+def test_interrupted_chunk_is_ignored_and_dropped_on_append(tmp_path):
+    path = str(tmp_path / "log.rtlog")
+    write(path, ROWS, chunk=2)
+    complete = os.path.getsize(path)
+    write(path, ROWS[:1])
+    # Cut the last chunk short, as if the writer died mid-write.
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 5)
+    assert len(probe_log.read_frame(path)) == 3
+    with probe_log.ProbeLogWriter(path, extra=("ttfb_ms",)):
+        pass
+    assert os.path.getsize(path) == complete
+
+
+def test_header_only_file_has_no_rows(tmp_path):
+    path = str(tmp_path / "log.rtlog")
+    probe_log.ProbeLogWriter(path).close()
+    cols = probe_log.read_columns(path)
+    assert cols["seq"].size == 0 and cols["seq"].dtype == np.int64
+    assert len(probe_log.read_frame(path)) == 0
+
+
+def test_category_overflow(tmp_path, monkeypatch):
+    monkeypatch.setattr(probe_log, "MAX_CATEGORIES", 3)
+    path = str(tmp_path / "log.rtlog")
+    with probe_log.ProbeLogWriter(path) as log:
+        for i in range(5):
+            log.append(float(i), i, 1.0, "ok", target=f"host{i}")
+    targets = probe_log.read_frame(path)["target"].tolist()
+    assert targets == ["host0", "host1", "host2", probe_log.OVERFLOW, probe_log.OVERFLOW]
@@ -0,0 +1,154 @@
+import asyncio
+import socket
+
+import pytest
+
+import resolver
+from resolver import ResolverCache
+
+HOSTS = {
+    "dual.example": [(socket.AF_INET6, ("2001:db8::1", 0, 0, 0)),
+                     (socket.AF_INET, ("192.0.2.1", 0))],
+    "v4.example": [(socket.AF_INET, ("192.0.2.2", 0)), (socket.AF_INET, ("192.0.2.2", 0))],
+}
+
+
+class FakeDns:
+    """getaddrinfo over HOSTS that counts calls; `answers` can be changed mid-test."""
+
+    def __init__(self):
+        self.calls = []
+        self.answers = dict(HOSTS)
+
+    def __call__(self, host, port, family=0, kind=0):
+        self.calls.append(host)
+        if host not in self.answers:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return [(fam, kind, 0, "", sa) for fam, sa in self.answers[host]
+                if family in (socket.AF_UNSPEC, fam)]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    fake = FakeDns()
+    monkeypatch.setattr(socket, "getaddrinfo", fake)
+    return fake
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(resolver.time, "monotonic", fake)
+    return fake
+
+
+def test_lookups_are_cached_until_the_ttl_expires(dns, clock):
+    cache = ResolverCache(ttl=60)
+    assert cache.address("dual.example") == "2001:db8::1"
+    clock.now += 59
+    assert cache.address("dual.example") == "2001:db8::1"
+    assert (dns.calls, cache.hits, cache.misses) == (["dual.example"], 1, 1)
+    dns.answers["dual.example"] = [(socket.AF_INET, ("192.0.2.9", 0))]
+    clock.now += 1
+    assert cache.address("dual.example") == "192.0.2.9"
+    assert (len(dns.calls), cache.hits, cache.misses) == (2, 1, 2)
+
+
+def test_duplicate_addresses_are_collapsed(dns, clock):
+    assert ResolverCache().lookup("v4.example") == [(socket.AF_INET, ("192.0.2.2", 0))]
+
+
+def test_family_is_part_of_the_key(dns, clock):
+    cache = ResolverCache()
+    assert cache.address("dual.example", socket.AF_INET) == "192.0.2.1"
+    assert cache.address("dual.example", socket.AF_INET6) == "2001:db8::1"
+    assert len(dns.calls) == 2
+
+
+def test_failures_are_cached_for_the_negative_ttl(dns, clock):
+    cache = ResolverCache(ttl=300, negative_ttl=30)
+    for _ in range(3):
+        with pytest.raises(socket.gaierror) as err:
+            cache.address("missing.example")
+    assert err.value.args[0] == socket.EAI_NONAME
+    assert dns.calls == ["missing.example"]
+    dns.answers["missing.example"] = [(socket.AF_INET, ("192.0.2.3", 0))]
+    clock.now += 30
+    assert cache.address("missing.example") == "192.0.2.3"
+
+
+def test_pin_keeps_expired_entries_but_not_failures(dns, clock):
+    cache = ResolverCache(ttl=10, negative_ttl=10)
+    cache.address("v4.example")
+    with pytest.raises(socket.gaierror):
+        cache.address("missing.example")
+    cache.pin()
+    clock.now += 1000
+    dns.answers["v4.example"] = [(socket.AF_INET, ("192.0.2.99", 0))]
+    assert cache.address("v4.example") == "192.0.2.2"
+    with pytest.raises(socket.gaierror):
+        cache.address("missing.example")
+    assert dns.calls == ["v4.example", "missing.example", "missing.example"]
+
+
+def test_resolve_fills_in_the_port(dns, clock):
+    cache = ResolverCache()
+    assert cache.resolve("dual.example", 443) == (socket.AF_INET6, ("2001:db8::1", 443, 0, 0))
+    assert cache.resolve("dual.example", 8080, socket.AF_INET) == (socket.AF_INET,
+                                                                    ("192.0.2.1", 8080))
+    assert cache.resolve("dual.example", 80)[1][1] == 80
+    assert len(dns.calls) == 2
+
+
+def test_socket_type_is_part_of_the_key(dns, clock):
+    cache = ResolverCache()
+    cache.resolve("v4.example", 53, kind=socket.SOCK_DGRAM)
+    cache.resolve("v4.example", 53, kind=socket.SOCK_STREAM)
+    assert len(dns.calls) == 2
+
+
+def test_peek_never_resolves(dns, clock):
+    cache = ResolverCache(ttl=10)
+    assert cache.peek("v4.example") is None
+    cache.address("v4.example")
+    assert cache.peek("v4.example") == "192.0.2.2"
+    clock.now += 10
+    assert cache.peek("v4.example") is None
+    assert dns.calls == ["v4.example"]
+
+
+def test_prefetch_resolves_each_name_once(dns, clock):
+    cache = ResolverCache()
+    got = cache.prefetch(["v4.example", "missing.example", "v4.example", "dual.example"],
+                         socket.AF_INET, concurrency=4)
+    assert got == {"v4.example": "192.0.2.2", "missing.example": None,
+                   "dual.example": "192.0.2.1"}
+    assert sorted(dns.calls) == ["dual.example", "missing.example", "v4.example"]
+    assert cache.prefetch([]) == {}
+
+
+def test_address_async(dns, clock):
+    cache = ResolverCache()
+
+    async def both():
+        return [await cache.address_async("v4.example") for _ in range(2)]
+
+    assert asyncio.run(both()) == ["192.0.2.2"] * 2
+    assert (len(dns.calls), cache.hits, cache.misses) == (1, 1, 1)
+
+
+def test_clear(dns, clock):
+    cache = ResolverCache()
+    cache.address("v4.example")
+    cache.clear()
+    cache.address("v4.example")
+    assert len(dns.calls) == 2
+    assert cache.format() == "1 names, 0 cache hits, 2 lookups"
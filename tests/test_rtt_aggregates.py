@@ -0,0 +1,173 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import rtt_aggregates
+import trace
+from rtt_aggregates import AggregateStore
+
+SITES = [f"site{i}.example" for i in range(12)]
+CONDITIONS = ["baseline", "VPN1", "VPN2"]
+
+
+def sweep_rows(rng, sweeps):
+    rows = []
+    for _ in range(sweeps):
+        for cond, scale in zip(CONDITIONS, (1.0, 1.8, 3.0)):
+            for i, site in enumerate(SITES):
+                rtt = rng.lognormal(np.log(10 + 5 * i), 0.3) * scale
+                rows.append([site, "NaN" if rng.random() < 0.1 else f"{rtt:.3f}", cond])
+    return rows
+
+
+def write_csv(path, rows, mode="w", header=True):
+    with open(path, mode, newline="") as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(["website", "rtt", "condition"])
+        writer.writerows(rows)
+
+
+def load(path):
+    df = pd.read_csv(path)
+    df = df[df["website"] != "website"]
+    df["rtt"] = pd.to_numeric(df["rtt"], errors="coerce")
+    return df
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(3)
+
+
+def test_sync_only_reads_appended_rows(tmp_path, rng):
+    path = str(tmp_path / "combined.csv")
+    first, second = sweep_rows(rng, 2), sweep_rows(rng, 1)
+    write_csv(path, first)
+    store = AggregateStore(rtt_aggregates.store_path(path))
+    assert store.sync(path) == len(first)
+    assert store.sync(path) == 0
+    # Older collector runs appended a header with every sweep; it is skipped.
+    write_csv(path, second, mode="a")
+    assert store.sync(path) == len(second)
+    cells = store.frame()
+    assert cells["count"].sum() + cells["missing"].sum() == len(first) + len(second)
+
+
+def test_partial_last_line_waits_for_the_next_sync(tmp_path):
+    path = str(tmp_path / "combined.csv")
+    write_csv(path, [["a", "1.0", "baseline"]])
+    with open(path, "a") as f:
+        f.write("b,2.0,base")
+    store = AggregateStore(rtt_aggregates.store_path(path))
+    assert store.sync(path) == 1
+    with open(path, "a") as f:
+        f.write("line\n")
+    assert store.sync(path) == 1
+    assert set(store.cells) == {("a", "baseline"), ("b", "baseline")}
+
+
+def test_rewritten_csv_rebuilds_the_store(tmp_path, rng):
+    path = str(tmp_path / "combined.csv")
+    write_csv(path, sweep_rows(rng, 2))
+    store = AggregateStore(rtt_aggregates.store_path(path))
+    store.sync(path)
+    # Same length or longer, but different content: not an append.
+    write_csv(path, [["other.example", "5.0", "baseline"]] * 200)
+    assert store.sync(path) == 200
+    assert list(store.cells) == [("other.example", "baseline")]
+    # Shorter than what was consumed.
+    write_csv(path, [["x", "1.0", "VPN1"]])
+    assert store.sync(path) == 1
+    assert list(store.cells) == [("x", "VPN1")]
+
+
+def test_frame_matches_pandas_groupby(tmp_path, rng):
+    path = str(tmp_path / "combined.csv")
+    write_csv(path, sweep_rows(rng, 20))
+    store = AggregateStore(rtt_aggregates.store_path(path))
+    store.sync(path)
+    df = load(path)
+    g = df.groupby(["website", "condition"])["rtt"]
+    got = store.frame((0.5, 0.9, 0.99)).sort_index()
+    want = g.agg(["count", "mean", "std", "min", "max"]).sort_index()
+    assert got.index.equals(want.index)
+    assert got["count"].tolist() == want["count"].tolist()
+    assert got["missing"].tolist() == g.apply(lambda s: s.isna().sum()).sort_index().tolist()
+    for col in ("mean", "std", "min", "max"):
+        assert got[col].to_numpy() == pytest.approx(want[col].to_numpy(), rel=1e-9)
+    for q in (0.5, 0.9, 0.99):
+        exact = g.quantile(q).sort_index().to_numpy()
+        assert np.all(np.abs(got[f"p{q * 100:g}"].to_numpy() - exact)
+                      <= store.layout.accuracy * exact * (1 + 1e-9))
+
+
+def test_condition_frame_matches_pandas_groupby(tmp_path, rng):
+    path = str(tmp_path / "combined.csv")
+    rows = sweep_rows(rng, 10)
+    # A site with no RTTs under VPN2 does not count towards its sites.
+    rows += [["down.example", "NaN", "VPN2"]] * 3
+    write_csv(path, rows)
+    store = AggregateStore(rtt_aggregates.store_path(path))
+    store.sync(path)
+    df = load(path)
+    g = df.groupby("condition")["rtt"]
+    got = store.condition_frame((0.5, 0.99))
+    assert list(got.index) == CONDITIONS
+    assert got["count"].tolist() == g.count()[CONDITIONS].tolist()
+    assert got["mean"].to_numpy() == pytest.approx(g.mean()[CONDITIONS].to_numpy())
+    assert got["sites"].tolist() == [len(SITES)] * 3
+    for q in (0.5, 0.99):
+        exact = g.quantile(q)[CONDITIONS].to_numpy()
+        assert np.all(np.abs(got[f"p{q * 100:g}"].to_numpy() - exact)
+                      <= store.layout.accuracy * exact * (1 + 1e-9))
+    # Same answer as merging the condition's cells into one sketch.
+    sketch = store.condition_sketch("VPN1")
+    assert got.loc["VPN1", "p99"] == pytest.approx(sketch.quantile(0.99))
+
+
+def test_store_survives_a_round_trip(tmp_path, rng):
+    path = str(tmp_path / "combined.csv")
+    write_csv(path, sweep_rows(rng, 3))
+    before = rtt_aggregates.open_for_csv(path).frame()
+    store = AggregateStore(rtt_aggregates.store_path(path))
+    assert not store.changed
+    pd.testing.assert_frame_equal(store.frame(), before)
+    assert store.sync(path) == 0
+
+
+def test_open_for_csv_only_writes_when_there_are_new_rows(tmp_path, rng):
+    path = str(tmp_path / "combined.csv")
+    agg = rtt_aggregates.store_path(path)
+    write_csv(path, sweep_rows(rng, 1))
+    rtt_aggregates.open_for_csv(path)
+    os.utime(agg, ns=(0, 0))
+    rtt_aggregates.open_for_csv(path)
+    assert os.stat(agg).st_mtime_ns == 0
+    write_csv(path, sweep_rows(rng, 1), mode="a", header=False)
+    store = rtt_aggregates.open_for_csv(path)
+    assert os.stat(agg).st_mtime_ns > 0
+    assert not store.changed and not store.save_if_changed()
+
+
+def test_empty_store(tmp_path):
+    store = AggregateStore(str(tmp_path / "none.agg.json"))
+    assert store.frame().empty and store.condition_frame().empty
+    assert store.save_if_changed()
+
+
+def test_aggregate_tables_match_the_full_groupby(tmp_path, rng):
+    path = str(tmp_path / "combined.csv")
+    write_csv(path, sweep_rows(rng, 8))
+    df = trace.load_rtts(path)
+    matrix, summary = trace.aggregate_tables(path)
+    exact = trace.site_condition_matrix(df)
+    assert matrix["count"].to_numpy() == pytest.approx(exact["count"].to_numpy())
+    assert matrix["mean"].to_numpy() == pytest.approx(exact["mean"].to_numpy())
+    assert matrix["p99"].to_numpy() == pytest.approx(exact["p99"].to_numpy(), rel=0.01)
+    expected = trace.condition_summary(df)
+    assert list(summary.index) == list(expected.index)
+    assert summary["sites"].tolist() == expected["sites"].tolist()
@@ -0,0 +1,176 @@
+import glob
+import math
+import os
+
+import numpy as np
+import pytest
+
+import analyze_pcap
+import rtt_stats
+from pcapgen import ROOT, bundled, echo_frame, write_pcap
+
+BUNDLED = sorted(glob.glob(os.path.join(ROOT, "*.pcap")))
+
+
+def match(packets, **kwargs):
+    """
+    packets: (ts, "req"/"rep", ident, seq[, payload]) in file order.
+    Payloads are only passed when every packet has one.
+    """
+    payloads = None
+    if all(len(p) == 5 for p in packets):
+        payloads = [p[4] for p in packets]
+    return rtt_stats.match_echoes(
+        np.arange(len(packets)),
+        [p[0] for p in packets],
+        [p[1] == "rep" for p in packets],
+        [rtt_stats.echo_key(p[2], p[3]) for p in packets],
+        payloads=payloads, **kwargs)
+
+
+# -----------------------------------------------------------
+# match_echoes
+# -----------------------------------------------------------
+def test_pairs_each_reply_with_its_request():
+    echo = match([(0.0, "req", 1, 0), (0.5, "req", 1, 1), (0.02, "rep", 1, 0),
+                  (0.53, "rep", 1, 1)])
+    assert echo.rtts == pytest.approx([20.0, 30.0])
+    assert (echo.sent, echo.answered, echo.duplicates, echo.retransmits) == (2, 2, 0, 0)
+
+
+def test_rtts_are_in_request_order_even_when_replies_are_not():
+    echo = match([(0.0, "req", 1, 0), (0.1, "req", 1, 1), (0.15, "rep", 1, 1),
+                  (0.5, "rep", 1, 0)])
+    assert echo.rtts == pytest.approx([500.0, 50.0])
+
+
+def test_sequence_wraparound():
+    seqs = [65534, 65535, 0, 1]
+    packets = []
+    for i, seq in enumerate(seqs):
+        packets += [(float(i), "req", 4, seq), (i + 0.01, "rep", 4, seq)]
+    echo = match(packets)
+    assert echo.rtts == pytest.approx([10.0] * 4)
+    assert echo.answered == 4
+
+
+def test_reused_sequence_number_pairs_with_the_latest_request():
+    # seq 5 comes round again after the 16-bit space wraps; the reply belongs to the new request.
+    echo = match([(0.0, "req", 1, 5), (40.0, "req", 1, 5), (40.02, "rep", 1, 5)])
+    assert echo.rtts == pytest.approx([20.0])
+    assert (echo.sent, echo.answered) == (2, 1)
+
+
+def test_stale_request_beyond_max_rtt_is_not_matched():
+    echo = match([(0.0, "req", 1, 5), (31.0, "rep", 1, 5)])
+    assert echo.answered == 0 and echo.rtts.size == 0
+    assert match([(0.0, "req", 1, 5), (31.0, "rep", 1, 5)], max_rtt=60).answered == 1
+
+
+def test_duplicate_replies_count_once():
+    echo = match([(0.0, "req", 1, 0), (0.01, "rep", 1, 0), (0.02, "rep", 1, 0),
+                  (0.03, "rep", 1, 0)])
+    assert echo.rtts == pytest.approx([10.0])
+    assert (echo.answered, echo.duplicates) == (1, 2)
+
+
+def test_reply_without_request_is_ignored():
+    echo = match([(0.0, "rep", 1, 0), (1.0, "req", 1, 1), (1.01, "rep", 1, 1)])
+    assert echo.rtts == pytest.approx([10.0])
+
+
+def test_quick_resend_of_the_same_payload_is_a_retransmission():
+    packets = []
+    for seq in range(5):
+        packets += [(float(seq), "req", 1, seq, 100 + seq), (seq + 0.01, "rep", 1, seq, 100 + seq)]
+    # seq 2 is re-sent 50 ms later with the same payload; only the re-send is answered.
+    packets[4:6] = [(2.0, "req", 1, 2, 102), (2.05, "req", 1, 2, 102), (2.06, "rep", 1, 2, 102)]
+    echo = match(packets)
+    assert (echo.sent, echo.answered, echo.retransmits) == (6, 5, 1)
+    assert echo.sent - echo.retransmits == 5
+    assert echo.rtts == pytest.approx([10.0, 10.0, 10.0, 10.0, 10.0])
+
+
+def test_same_key_every_interval_is_a_new_probe_not_a_retransmission():
+    # ping3 sends every probe with seq 0; an unanswered one is lost, not re-sent.
+    packets = []
+    for i in range(10):
+        packets.append((float(i), "req", 77, 0, 555))
+        if i not in (3, 7):
+            packets.append((i + 0.02, "rep", 77, 0, 555))
+    echo = match(packets)
+    assert (echo.sent, echo.answered, echo.retransmits) == (10, 8, 0)
+    summary = rtt_stats.summarize(echo.rtts, sent=echo.sent - echo.retransmits)
+    assert summary["loss"] == pytest.approx(0.2)
+
+
+def test_different_payload_is_a_new_probe():
+    echo = match([(0.0, "req", 1, 0, 1), (0.05, "req", 1, 0, 2), (0.06, "rep", 1, 0, 2),
+                  (1.0, "req", 1, 1, 3), (1.01, "rep", 1, 1, 3)])
+    assert echo.retransmits == 0
+
+
+def test_without_payloads_nothing_is_a_retransmission():
+    echo = match([(0.0, "req", 1, 0), (0.05, "req", 1, 0), (0.06, "rep", 1, 0),
+                  (1.0, "req", 1, 1), (1.01, "rep", 1, 1)])
+    assert echo.retransmits == 0 and echo.sent == 3
+
+
+def test_no_requests():
+    assert match([(0.0, "rep", 1, 0)]).sent == 0
+
+
+# -----------------------------------------------------------
+# summarize / format_summary
+# -----------------------------------------------------------
+def test_summarize_statistics():
+    s = rtt_stats.summarize([10.0, 20.0, 30.0, 40.0], sent=5)
+    assert s["count"] == 4 and s["mean"] == 25.0
+    assert (s["min"], s["max"]) == (10.0, 40.0)
+    assert s["p50"] == pytest.approx(25.0)
+    assert s["p90"] == pytest.approx(np.percentile([10, 20, 30, 40], 90))
+    assert s["jitter"] == 10.0
+    assert s["loss"] == pytest.approx(0.2)
+    assert "loss=20.0% of 5" in rtt_stats.format_summary(s)
+
+
+def test_summarize_without_numpy_agrees(monkeypatch):
+    rtts = [12.5, 9.0, 30.25, 11.0, 14.0, 80.0]
+    expected = rtt_stats.summarize(rtts, sent=8)
+    monkeypatch.setattr(rtt_stats, "np", None)
+    got = rtt_stats.summarize(rtts, sent=8)
+    assert got.keys() == expected.keys()
+    for key in expected:
+        assert got[key] == pytest.approx(expected[key])
+
+
+def test_summarize_empty():
+    s = rtt_stats.summarize([], sent=3)
+    assert s == {"count": 0, "sent": 3, "loss": 1.0}
+    assert rtt_stats.format_summary(s).startswith("no RTTs")
+    assert math.isnan(rtt_stats._percentile([], 50))
+
+
+# -----------------------------------------------------------
+# Columnar engine
+# -----------------------------------------------------------
+@pytest.mark.parametrize("path", BUNDLED, ids=os.path.basename)
+def test_columnar_engine_agrees_with_native(path):
+    counts, rtts = analyze_pcap.analyze_native(path)
+    col_counts, echo = analyze_pcap.analyze_columnar(path)
+    assert col_counts == counts
+    assert sorted(echo.rtts.tolist()) == pytest.approx(sorted(rtts))
+
+
+def test_columnar_engine_on_icmp_capture():
+    _counts, echo = analyze_pcap.analyze_columnar(bundled("icmp_capture.pcap"))
+    assert (echo.sent, echo.answered, echo.duplicates, echo.retransmits) == (25, 19, 0, 0)
+
+
+def test_columnar_engine_counts_a_retransmission(tmp_path):
+    packets = [(0.0, echo_frame(8, 1, 0, b"same")), (0.05, echo_frame(8, 1, 0, b"same")),
+               (0.06, echo_frame(0, 1, 0, b"same")), (1.0, echo_frame(8, 1, 1, b"next")),
+               (1.01, echo_frame(0, 1, 1, b"next")), (1.02, echo_frame(0, 1, 1, b"next"))]
+    _counts, echo = analyze_pcap.analyze_columnar(write_pcap(tmp_path / "r.pcap", packets))
+    assert (echo.sent, echo.answered, echo.duplicates, echo.retransmits) == (3, 2, 1, 1)
+    assert echo.rtts == pytest.approx([10.0, 10.0])
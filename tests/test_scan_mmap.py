@@ -0,0 +1,67 @@
+import glob
+import os
+
+import pytest
+
+import analyze_pcap
+import pcap_parser
+from pcapgen import ROOT, echo_frame, echo_session, write_pcap, write_pcapng
+
+BUNDLED = sorted(glob.glob(os.path.join(ROOT, "*.pcap")))
+
+
+@pytest.mark.parametrize("path", BUNDLED, ids=os.path.basename)
+def test_scan_mmap_matches_iter_packets_on_bundled_captures(path):
+    assert list(pcap_parser.scan_mmap(path)) == list(pcap_parser.iter_packets(path))
+
+
+@pytest.mark.parametrize("path", BUNDLED, ids=os.path.basename)
+def test_analyze_mmap_matches_native(path):
+    assert analyze_pcap.analyze_mmap(path) == analyze_pcap.analyze_native(path)
+
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+def test_scan_mmap_pcapng(tmp_path, endian):
+    packets, _ = echo_session(3)
+    packets.insert(2, (None, echo_frame(8, 9, 9)))
+    path = write_pcapng(tmp_path / "s.pcapng", packets, endian=endian)
+    assert list(pcap_parser.scan_mmap(path)) == list(pcap_parser.iter_packets(path))
+
+
+def test_scan_mmap_byte_range_selects_records_starting_in_it(tmp_path):
+    packets, _ = echo_session(4)
+    path = write_pcap(tmp_path / "s.pcap", packets)
+    frame_len = len(packets[0][1])
+    record = 16 + frame_len
+    everything = list(pcap_parser.scan_mmap(path))
+    # Records start at 24, 24 + record, ...; [24 + record, 24 + 3 * record) holds two of them.
+    assert list(pcap_parser.scan_mmap(path, 24 + record, 24 + 3 * record)) == everything[1:3]
+    # Without `stop` the scan runs to the end of the file.
+    assert list(pcap_parser.scan_mmap(path, 24 + 7 * record)) == everything[7:]
+
+
+def test_scan_mmap_decoder_is_pluggable(tmp_path):
+    packets, _ = echo_session(2)
+    path = write_pcap(tmp_path / "s.pcap", packets)
+    rows = list(pcap_parser.scan_mmap(path, decode=pcap_parser.decode_echo))
+    assert all(len(row) == 6 for row in rows)
+    assert rows[0][1:5] == (None, 8, 7, 0)
+
+
+def test_scan_mmap_releases_pages_without_changing_output(tmp_path, monkeypatch):
+    packets = [(i * 0.01, echo_frame(8 if i % 2 == 0 else 0, 1, i // 2, bytes(1400)))
+               for i in range(400)]
+    path = write_pcap(tmp_path / "big.pcap", packets)
+    expected = list(pcap_parser.iter_packets(path))
+    monkeypatch.setattr(pcap_parser, "RELEASE_EVERY", 8192)
+    assert list(pcap_parser.scan_mmap(path)) == expected
+
+
+def test_scan_mmap_empty_and_invalid_files(tmp_path):
+    empty = tmp_path / "empty.pcap"
+    empty.write_bytes(b"")
+    assert list(pcap_parser.scan_mmap(empty)) == []
+    bogus = tmp_path / "bogus.pcap"
+    bogus.write_bytes(bytes(64))
+    with pytest.raises(pcap_parser.PcapFormatError):
+        list(pcap_parser.scan_mmap(bogus))
@@ -0,0 +1,203 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import socket_engine
+from socket_engine import TcpConnectScanner, UdpEchoProber
+
+
+class EchoServer:
+    """
+    UDP echo that swaps every pair of datagrams (so replies arrive out of
+    order), drops every `drop_every`-th one and sends a runt datagram that
+    carries no sequence number before each reply pair.
+    """
+
+    def __init__(self, drop_every=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.02)
+        self.port = self.sock.getsockname()[1]
+        self.drop_every = drop_every
+        self.received = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        held = None
+        while not self._stop.is_set():
+            try:
+                data, addr = self.sock.recvfrom(65535)
+            except socket.timeout:
+                if held:
+                    self.sock.sendto(*held)
+                    held = None
+                continue
+            self.received += 1
+            if self.drop_every and self.received % self.drop_every == 0:
+                continue
+            if held is None:
+                held = (data, addr)
+                continue
+            self.sock.sendto(b"\x00", addr)
+            self.sock.sendto(data, addr)
+            self.sock.sendto(*held)
+            held = None
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def echo():
+    srv = EchoServer()
+    yield srv
+    srv.close()
+
+
+@pytest.fixture
+def lossy_echo():
+    srv = EchoServer(drop_every=4)
+    yield srv
+    srv.close()
+
+
+@pytest.fixture
+def listener():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    s.listen(128)
+    yield s.getsockname()[1]
+    s.close()
+
+
+@pytest.fixture
+def closed_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_parse_ports():
+    assert socket_engine.parse_ports("22, 80,8000-8003") == [22, 80, 8000, 8001, 8002, 8003]
+    assert socket_engine.parse_ports(443) == [443]
+    assert socket_engine.parse_ports("") == []
+
+
+# -----------------------------------------------------------
+# TCP
+# -----------------------------------------------------------
+def test_scanner_reports_open_and_closed_ports(listener, closed_port):
+    results = {}
+    endpoints = [("127.0.0.1", listener), ("127.0.0.1", closed_port)]
+    with TcpConnectScanner(timeout=1.0, concurrency=3) as scanner:
+        started, elapsed = scanner.run(endpoints, 20, on_result=lambda i, endpoint, status, value,
+                                       lag: results.setdefault(i, (endpoint, status, value)))
+        assert scanner.inflight == {}
+    assert started == 20 and elapsed > 0
+    assert sorted(results) == list(range(20))
+    for i, (endpoint, status, value) in results.items():
+        assert endpoint == endpoints[i % 2]
+        if i % 2:
+            assert status == "error" and "refused" in value.lower()
+        else:
+            assert status == "ok" and value > 0
+
+
+def test_scanner_open_loop_rate(listener):
+    lags = []
+    with TcpConnectScanner() as scanner:
+        _started, elapsed = scanner.run([("127.0.0.1", listener)], 10, rate=100,
+                                        on_result=lambda *r: lags.append(r[4]))
+    # Ten handshakes at 100/s: the last one is due 90 ms after the first.
+    assert elapsed >= 0.09 and len(lags) == 10 and all(lag >= 0 for lag in lags)
+
+
+def test_unanswered_handshakes_are_lost():
+    # A listener whose accept queue is full drops further SYNs.
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    s.listen(0)
+    statuses = []
+    try:
+        with TcpConnectScanner(timeout=0.3) as scanner:
+            scanner.run([("127.0.0.1", s.getsockname()[1])], 4,
+                        on_result=lambda *r: statuses.append(r[2]))
+    finally:
+        s.close()
+    assert statuses[0] == "ok" and statuses[1:] == ["lost"] * 3
+
+
+# -----------------------------------------------------------
+# UDP
+# -----------------------------------------------------------
+def test_query_reuses_one_socket(echo):
+    with UdpEchoProber("127.0.0.1", echo.port, timeout=0.5) as prober:
+        sock = prober.sock
+        results = [prober.query(64) for _ in range(3)]
+        assert prober.sock is sock
+        assert prober.query(64, wait=False) == ("sent", None)
+    # Each query waits alone, so the server's held datagram is flushed on its idle timer.
+    assert [r[0] for r in results] == ["ok-reply"] * 3
+    assert all(r[1] > 0 for r in results)
+
+
+def test_out_of_order_and_lost_echoes_are_matched_by_sequence(lossy_echo):
+    results = {}
+    with UdpEchoProber("127.0.0.1", lossy_echo.port, timeout=0.3) as prober:
+        prober.run(40, 128, rate=2000,
+                   on_result=lambda i, status, value, lag: results.setdefault(i, status))
+        assert prober.inflight == {}
+    assert sorted(results) == list(range(40))
+    assert list(results.values()).count("no-reply") == 10
+    assert [i for i, s in results.items() if s == "no-reply"] == list(range(3, 40, 4))
+
+
+def test_run_without_waiting_reports_sent(echo):
+    results = []
+    with UdpEchoProber("127.0.0.1", echo.port) as prober:
+        prober.run(5, 64, rate=1000, wait=False,
+                   on_result=lambda i, status, value, lag: results.append(status))
+        assert prober.inflight == {}
+    assert results == ["sent"] * 5
+
+
+def test_payload_sweep(echo):
+    with UdpEchoProber("127.0.0.1", echo.port, timeout=0.5) as prober:
+        rows = socket_engine.payload_sweep(prober, sizes=(4, 1400), count=60, window=8)
+    assert [r["size"] for r in rows] == [4, 1400]
+    for row in rows:
+        assert (row["sent"], row["answered"], row["loss"]) == (60, 60, 0.0)
+        assert row["p99"] >= row["p50"] > 0 and row["msgs_per_s"] > 0
+    assert "1400" in socket_engine.format_sweep(rows)
+
+
+def test_fire_and_forget_to_a_closed_port_keeps_sending():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    with UdpEchoProber("127.0.0.1", port) as prober:
+        results = []
+        for _ in range(6):
+            results.append(prober.query(64, wait=False))
+            # Give the kernel time to queue the port-unreachable for the next send.
+            time.sleep(0.01)
+    assert results == [("sent", None)] * 6
+
+
+def test_awaited_probes_to_a_closed_port_are_no_reply():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    with UdpEchoProber("127.0.0.1", port, timeout=0.05) as prober:
+        results = [prober.query(64)[0] for _ in range(4)]
+    assert results == ["no-reply"] * 4
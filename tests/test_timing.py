@@ -0,0 +1,106 @@
+import socket
+import time
+
+import pytest
+
+import timing
+
+MS = 1_000_000
+
+
+class FakeClock:
+    """perf_counter_ns that ticks 1 µs per read; sleep() jumps ahead."""
+
+    def __init__(self):
+        self.now = 10_000 * MS
+        self.sleeps = []
+
+    def perf_counter_ns(self):
+        self.now += 1000
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += int(seconds * 1e9)
+
+    def advance(self, ms):
+        self.now += int(ms * MS)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(timing.time, "perf_counter_ns", fake.perf_counter_ns)
+    monkeypatch.setattr(timing.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_schedule_keeps_absolute_deadlines(clock):
+    schedule = timing.Schedule(0.1)
+    assert schedule.wait() == 0.0
+    start = schedule.start_ns
+    for k in range(1, 6):
+        clock.advance(30)                       # the probe takes 30 ms
+        lag = schedule.wait()
+        assert 0 <= lag < 0.01
+        # Woken at the deadline, not 100 ms after the probe finished.
+        assert clock.now - (start + k * 100 * MS) < 10_000
+    assert schedule.skipped == 0
+    # Coarse sleep up to SPIN_NS before the deadline, then spin.
+    assert clock.sleeps[0] == pytest.approx(0.07 - timing.SPIN_NS / 1e9, abs=1e-5)
+
+
+def test_schedule_runs_late_slots_at_once_without_skipping(clock):
+    schedule = timing.Schedule(0.1)
+    schedule.wait()
+    start = schedule.start_ns
+    clock.advance(150)                          # 50 ms past slot 1, within one interval
+    assert schedule.wait() == pytest.approx(50, abs=0.01)
+    assert schedule.skipped == 0
+    schedule.wait()
+    assert clock.now - (start + 200 * MS) < 10_000
+
+
+def test_schedule_skips_slots_missed_by_more_than_an_interval(clock):
+    schedule = timing.Schedule(0.1)
+    schedule.wait()
+    start = schedule.start_ns
+    clock.advance(350)                          # slots 1 and 2 are long gone
+    assert schedule.wait() == pytest.approx(50, abs=0.01)
+    assert (schedule.k, schedule.skipped) == (3, 2)
+    schedule.wait()
+    assert clock.now - (start + 400 * MS) < 10_000
+
+
+def test_schedule_without_interval_never_sleeps(clock):
+    schedule = timing.Schedule(0)
+    for _ in range(5):
+        schedule.wait()
+        clock.advance(7)
+    assert clock.sleeps == [] and schedule.skipped == 0
+
+
+def test_rtt_prefers_a_plausible_kernel_stamp():
+    sent = (time.perf_counter_ns() - 5 * MS, time.time_ns() - 5 * MS)
+    assert timing.rtt_ms(sent, sent[1] + 2 * MS) == pytest.approx(2.0)
+    # Later than the perf_counter RTT, or before the send: not trusted.
+    assert timing.rtt_ms(sent, sent[1] + 60_000 * MS) == pytest.approx(5.0, abs=1.0)
+    assert timing.rtt_ms(sent, sent[1] - MS) == pytest.approx(5.0, abs=1.0)
+    assert timing.rtt_ms(sent) == pytest.approx(5.0, abs=1.0)
+
+
+def test_kernel_receive_timestamps_on_loopback():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as rx, \
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as tx:
+        rx.bind(("127.0.0.1", 0))
+        rx.settimeout(2)
+        enabled = timing.enable_rx_timestamps(rx)
+        sent = timing.send_stamp()
+        tx.sendto(b"ping", rx.getsockname())
+        data, _addr, stamp = timing.recv_timestamped(rx)
+    assert data == b"ping"
+    if enabled:
+        assert sent[1] <= stamp <= time.time_ns()
+        assert 0 <= timing.rtt_ms(sent, stamp) < 1000
+    else:
+        assert stamp is None
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import trace
+
+NAN = np.nan
+
+
+def bridges(y, x=None):
+    y = np.asarray(y, dtype=float)
+    return trace.gap_bridges(np.arange(len(y)) if x is None else x, y).tolist()
+
+
+def test_interior_nan_runs_are_bridged_between_their_neighbours():
+    assert bridges([1, 2, NAN, NAN, 5, NAN, 7]) == [[[1, 2], [4, 5]], [[4, 5], [6, 7]]]
+
+
+def test_leading_and_trailing_nan_runs_are_not_bridged():
+    assert bridges([NAN, NAN, 3, NAN, 5, NAN]) == [[[2, 3], [4, 5]]]
+
+
+def test_no_bridges():
+    for y in ([1, 2, 3], [NAN, NAN], [NAN, 4, NAN], []):
+        segments = trace.gap_bridges(np.arange(len(y)), np.asarray(y, dtype=float))
+        assert segments.shape == (0, 2, 2)
+
+
+def test_bridges_use_the_given_x():
+    assert bridges([10, NAN, 30], x=np.array([0.5, 1.5, 4.0])) == [[[0.5, 10], [4.0, 30]]]
+
+
+def test_plot_draws_one_collection_for_every_gap():
+    fig, ax = trace.plt.subplots()
+    try:
+        trace.plot_with_gap_dotted(np.arange(6), np.array([1, NAN, 3, NAN, NAN, 6.0]), "VPN1",
+                                   "red", ax=ax)
+        [collection] = ax.collections
+        assert len(collection.get_segments()) == 2
+        trace.plot_with_gap_dotted(np.arange(3), np.array([1, 2, 3.0]), "baseline", "blue",
+                                   ax=ax)
+        assert len(ax.collections) == 1 and len(ax.lines) == 2
+    finally:
+        trace.plt.close(fig)
+
+
+def test_site_condition_matrix_has_gaps_for_missing_sites():
+    df = pd.DataFrame({"website": ["a", "b", "a", "c"], "rtt": [1.0, 2.0, 3.0, 4.0],
+                       "condition": ["baseline", "baseline", "VPN1", "VPN1"]})
+    matrix = trace.site_condition_matrix(df)
+    assert list(matrix["mean"].columns) == ["baseline", "VPN1"]
+    assert bridges(matrix["mean"]["VPN1"].to_numpy()) == [[[0, 3.0], [2, 4.0]]]
@@ -0,0 +1,142 @@
+import json
+import math
+import socket
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+import rtt_stats
+import ts_store
+from ts_store import RingSeries, TimeSeriesStore
+
+
+@pytest.fixture
+def server():
+    store = TimeSeriesStore(capacity=100)
+    srv = ts_store.serve(store, port=0)
+    yield store, f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def test_ring_overwrites_the_oldest_samples():
+    ring = RingSeries(5)
+    for i in range(8):
+        ring.append(float(i), i * 10.0, "ok")
+    ts, latency, status = ring.window(0.0)
+    assert ts.tolist() == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert latency.tolist() == [30.0, 40.0, 50.0, 60.0, 70.0]
+    assert ring.size == 5
+
+
+def test_ring_window_before_it_fills():
+    ring = RingSeries(5)
+    ring.append(1.0, None, "lost")
+    ring.append(2.0, 5.0, "bogus")
+    ts, latency, status = ring.window(1.5)
+    assert ts.tolist() == [2.0]
+    assert [ts_store.STATUSES[c] for c in status] == ["error"]
+    assert math.isnan(ring.window(0.0)[1][0])
+
+
+def test_stats_over_a_window():
+    store = TimeSeriesStore()
+    now = time.time()
+    rtts = [10.0, 12.0, 11.0, 30.0, 14.0]
+    for i, rtt in enumerate(rtts):
+        store.append("8.8.8.8", "icmp", now - 10 + i, rtt, "ok")
+    store.append("8.8.8.8", "icmp", now - 4, None, "lost")
+    store.append("8.8.8.8", "icmp", now - 3, None, "error")
+    # Older than the window: ignored.
+    store.append("8.8.8.8", "icmp", now - 500, 999.0, "ok")
+    store.append("example.com", "http", now, 50.0, "ok")
+    [stats] = store.stats("8.8.8.8", "icmp", window=60)
+    expected = rtt_stats.summarize(rtts)
+    assert stats["count"] == 5 and stats["p50"] == pytest.approx(expected["p50"])
+    assert stats["mean"] == pytest.approx(np.mean(rtts))
+    assert (stats["samples"], stats["lost"], stats["errors"]) == (7, 1, 1)
+    assert stats["loss"] == pytest.approx(1 / 6)
+    assert stats["first"] == pytest.approx(now - 10) and stats["last"] == pytest.approx(now - 3)
+    assert len(store.stats(window=60)) == 2
+    assert [s["target"] for s in store.stats(mode="http")] == ["example.com"]
+
+
+def test_retention_caps_the_window():
+    store = TimeSeriesStore(retention=60)
+    now = time.time()
+    store.append("t", "tcp", now - 120, 5.0, "ok")
+    store.append("t", "tcp", now - 1, 6.0, "ok")
+    [samples] = store.samples(window=3600)
+    assert samples["latency_ms"] == [6.0]
+
+
+def test_extend_and_keys():
+    store = TimeSeriesStore(capacity=3)
+    now = time.time()
+    store.extend([(now + i, "t", "udp", "ok-reply", 1.0 + i) for i in range(5)])
+    assert store.keys() == [{"target": "t", "mode": "udp", "size": 3}]
+    [samples] = store.samples()
+    assert samples["latency_ms"] == [3.0, 4.0, 5.0]
+    assert samples["status"] == ["ok-reply"] * 3
+
+
+def test_push_and_query_over_http(server):
+    store, url = server
+    now = time.time()
+    rows = [(now - 2, "8.8.8.8", "dns", "ok", 20.0), (now - 1, "8.8.8.8", "dns", "lost", None),
+            (now, "8.8.8.8", "dns", "ok", math.nan)]
+    assert ts_store.push(url, rows) == {"ingested": 3}
+    assert get(url + "/series") == [{"target": "8.8.8.8", "mode": "dns", "size": 3}]
+    [stats] = get(url + "/stats?target=8.8.8.8&mode=dns&window=30")
+    assert (stats["count"], stats["lost"], stats["samples"]) == (1, 1, 3)
+    [samples] = get(url + "/samples?mode=dns")
+    # NaN travels as null.
+    assert samples["latency_ms"] == [20.0, None, None]
+    assert get(url + "/stats?target=other") == []
+
+
+@pytest.mark.parametrize("path, code", [("/stats?window=abc", 400), ("/nothing", 404)])
+def test_bad_queries(server, path, code):
+    _store, url = server
+    with pytest.raises(urllib.error.HTTPError) as err:
+        get(url + path)
+    assert err.value.code == code
+
+
+def test_bad_posts(server):
+    _store, url = server
+    for path, body, code in [("/samples", b"not json", 400), ("/samples", b"[[1, 2]]", 400),
+                             ("/stats", b"[]", 404)]:
+        req = urllib.request.Request(url + path, data=body)
+        with pytest.raises(urllib.error.HTTPError) as err:
+            urllib.request.urlopen(req, timeout=5)
+        assert err.value.code == code
+
+
+def test_unix_socket_api(tmp_path):
+    store = TimeSeriesStore()
+    store.append("t", "tcp", time.time(), 3.0, "ok")
+    path = str(tmp_path / "store.sock")
+    srv = ts_store.serve(store, unix_path=path)
+    try:
+        with socket.socket(socket.AF_UNIX) as s:
+            s.settimeout(5)
+            s.connect(path)
+            s.sendall(b"GET /series HTTP/1.0\r\n\r\n")
+            data = b""
+            while chunk := s.recv(4096):
+                data += chunk
+    finally:
+        srv.shutdown()
+        srv.server_close()
+    head, body = data.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.0 200")
+    assert json.loads(body) == [{"target": "t", "mode": "tcp", "size": 1}]
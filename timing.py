@@ -0,0 +1,130 @@
+"""
+timing.py
+---------
+Clocks, probe schedules and kernel receive timestamps.
+
+Three things keep sub-millisecond measurements honest:
+
+    • Latency from time.perf_counter_ns() deltas. time.time() is the wall
+      clock: NTP can step or slew it in the middle of a probe, and its
+      float seconds lose resolution. perf_counter_ns is monotonic, integer
+      nanoseconds.
+    • Schedule: sample k is due at start + k × interval (absolute
+      deadlines), so the time a probe takes does not push every later
+      probe back the way `probe(); sleep(interval)` does. It sleeps until
+      just before a deadline and spins the last SPIN_NS, since sleep()
+      alone wakes up 50–100 µs late. Slots already missed by more than one
+      interval are skipped instead of fired in a burst.
+    • Kernel receive timestamps. With SO_TIMESTAMPNS enabled (Linux), the
+      kernel stamps every datagram when it arrives and recv_timestamped()
+      returns that stamp, so the RTT ends when the reply reached the host,
+      not when Python got around to reading it. The stamp is wall-clock
+      (CLOCK_REALTIME), so it is compared with a wall-clock send stamp
+      taken right next to the perf_counter one (send_stamp()); rtt_ms()
+      only uses it when it is positive and no larger than the perf_counter
+      RTT, otherwise (clock step, no timestamp) the perf_counter RTT is
+      returned.
+"""
+
+import socket
+import struct
+import sys
+import time
+
+# Not every Python build exports the constant; it is 35 on Linux.
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35 if sys.platform.startswith("linux") else None)
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+_TIMESPEC = struct.Struct("@qq")
+SPIN_NS = 200_000           # busy-wait the last 0.2 ms before a deadline
+
+
+def elapsed_ms(start_ns):
+    """Milliseconds since a time.perf_counter_ns() reading."""
+    return (time.perf_counter_ns() - start_ns) / 1e6
+
+
+def sleep_until(deadline_ns, spin_ns=SPIN_NS):
+    """Sleep until perf_counter_ns() reaches deadline_ns (coarse sleep, then spin)."""
+    remaining = deadline_ns - time.perf_counter_ns()
+    if remaining > spin_ns:
+        time.sleep((remaining - spin_ns) / 1e9)
+    while time.perf_counter_ns() < deadline_ns:
+        pass
+
+
+class Schedule:
+    """
+    Absolute deadlines start + k × interval on the perf_counter_ns clock.
+    wait() returns immediately for the first sample.
+    """
+
+    def __init__(self, interval, spin_ns=SPIN_NS):
+        self.interval_ns = int(interval * 1e9)
+        self.spin_ns = spin_ns
+        self.start_ns = None
+        self.k = 0
+        self.skipped = 0
+
+    def wait(self):
+        """Block until the next deadline; returns how late it was woken (ms)."""
+        now = time.perf_counter_ns()
+        if self.start_ns is None:
+            self.start_ns = now
+            return 0.0
+        self.k += 1
+        due = self.start_ns + self.k * self.interval_ns
+        if self.interval_ns and now - due > self.interval_ns:
+            missed = (now - due) // self.interval_ns
+            self.k += missed
+            self.skipped += missed
+            due += missed * self.interval_ns
+        sleep_until(due, self.spin_ns)
+        return (time.perf_counter_ns() - due) / 1e6
+
+
+# -----------------------------------------------------------
+# KERNEL RECEIVE TIMESTAMPS
+# -----------------------------------------------------------
+def enable_rx_timestamps(sock):
+    """Turn on SO_TIMESTAMPNS for sock; returns False where unsupported."""
+    if SO_TIMESTAMPNS is None or not hasattr(sock, "recvmsg"):
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+    except OSError:
+        return False
+    return True
+
+
+def recv_timestamped(sock, bufsize=65535):
+    """
+    recvfrom() that also returns the kernel receive time (time.time_ns()
+    scale), or None when the socket has no timestamp for this datagram.
+    """
+    if SO_TIMESTAMPNS is None or not hasattr(sock, "recvmsg"):
+        data, addr = sock.recvfrom(bufsize)
+        return data, addr, None
+    data, ancdata, _flags, addr = sock.recvmsg(bufsize, socket.CMSG_SPACE(_TIMESPEC.size))
+    for level, kind, cdata in ancdata:
+        if level == socket.SOL_SOCKET and kind == SCM_TIMESTAMPNS and len(cdata) >= _TIMESPEC.size:
+            sec, nsec = _TIMESPEC.unpack_from(cdata)
+            return data, addr, sec * 1_000_000_000 + nsec
+    return data, addr, None
+
+
+def send_stamp():
+    """(perf_counter_ns, time_ns) taken back to back just before sending."""
+    return time.perf_counter_ns(), time.time_ns()
+
+
+def rtt_ms(sent, rx_kernel_ns=None):
+    """
+    RTT for a probe sent at `sent` (from send_stamp()). Uses the kernel
+    receive timestamp when it is plausible, else the perf_counter delta.
+    """
+    perf = elapsed_ms(sent[0])
+    if rx_kernel_ns is not None:
+        kernel = (rx_kernel_ns - sent[1]) / 1e6
+        if 0 < kernel <= perf:
+            return kernel
+    return perf
@@ -2,45 +2,122 @@
 trace.py
 -------------------
 This script loads RTT measurements for Baseline and multiple VPN conditions,
-computes the average RTT per website, and generates a comparison plot. Missing
-RTT values (common with unstable VPN routes) are shown using dotted lines to
-indicate gaps without hiding the overall trend. The final figure helps compare
-how different VPN endpoints affect latency across many websites.
+computes per-website RTT statistics for every condition, and generates a
+comparison plot. Missing RTT values (common with unstable VPN routes) are
+shown using dotted lines to indicate gaps without hiding the overall trend.
+The final figure helps compare how different VPN endpoints affect latency
+across many websites.
+
+All statistics come from one groupby over (website, condition), pivoted into
+a website × condition matrix per statistic (mean, median, count and
+percentiles). Conditions are discovered from the data, so new VPN endpoints
+need no code changes.
+
+For collector CSVs the matrix is read from the incremental aggregate store
+next to the CSV (rtt_aggregates.py): only rows appended since the last run
+are parsed, and the statistics come from per-cell running sums and sketches
+(percentiles within 1%). --raw re-reads the whole CSV for exact
+percentiles.
+
+Usage:
+    python3 trace.py [combined_rtt_clean.csv | combined_rtt.rtlog]
+                     [--metric {mean,median,p90,...}] [--summary-csv PATH]
+                     [--out PNG] [--raw]
 """
 
+import argparse
+import os
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import os
+from matplotlib.collections import LineCollection
 
-# Load CSV
-df = pd.read_csv("csv_files/combined_rtt_clean.csv")
-df["rtt"] = pd.to_numeric(df["rtt"], errors="coerce")
+import probe_log
+import rtt_aggregates
 
-baseline = df[df["condition"].str.lower() == "baseline"]
-vpn1 = df[df["condition"].str.contains("vpn1", case=False, na=False)]
-vpn2 = df[df["condition"].str.contains("vpn2", case=False, na=False)]
-vpn3= df[df["condition"].str.contains("vpn3", case=False, na=False)]
+DEFAULT_INPUT = "csv_files/combined_rtt_clean.csv"
+DEFAULT_OUTPUT = "graphs/rtt_multiline_dotted_correct.png"
+PERCENTILES = (90, 99)
+# Above this many websites only every n-th x label is drawn.
+MAX_XTICKS = 150
+# Point markers are dropped above this many websites per series.
+MAX_MARKERS = 500
 
-websites = sorted(df["website"].unique())
-x = np.arange(len(websites))
 
 # ================================================================
-# HELPER: Extract average RTT per website for a given VPN group
+# LOADING
 # ---------------------------------------------------------------
-# For each website, compute the mean RTT under that condition.
-# Missing values remain NaN, allowing us to interpolate visually.
+# Accepts collector.py's CSV or a columnar .rtlog log and returns a
+# frame with website / rtt / condition columns. collector.py appends a
+# header row on every run, so repeated header lines are dropped here.
 # ================================================================
-def get_rtts(group):
-    return np.array([
-        group[group["website"] == site]["rtt"].mean()
-        for site in websites
-    ], dtype=float)
+def load_rtts(path):
+    if probe_log.is_probe_log(path):
+        log = probe_log.read_frame(path)
+        df = pd.DataFrame({
+            "website": log["target"].astype(str),
+            "rtt": log["latency_ms"],
+            "condition": log["tag"].astype(str),
+        })
+    else:
+        df = pd.read_csv(path, dtype={"website": str, "condition": str})
+        df = df[df["website"] != "website"]
+        df["rtt"] = pd.to_numeric(df["rtt"], errors="coerce")
+    df["condition"] = df["condition"].str.strip()
+    return df.dropna(subset=["website", "condition"])
+
+
+def conditions_in_order(df):
+    """Conditions in order of first appearance, with baseline first."""
+    conds = list(pd.unique(df["condition"]))
+    return sorted(conds, key=lambda c: c.lower() != "baseline")
+
+
+# ================================================================
+# AGGREGATION
+# ---------------------------------------------------------------
+# One groupby over (website, condition) computes every statistic, then
+# unstack() turns it into columns of (statistic, condition). Websites with
+# no data for a condition are NaN, which the plot shows as dotted gaps.
+# ================================================================
+def site_condition_matrix(df, percentiles=PERCENTILES):
+    g = df.groupby(["website", "condition"], sort=True)["rtt"]
+    stats = g.agg(["mean", "median", "count"])
+    for q in percentiles:
+        stats[f"p{q}"] = g.quantile(q / 100.0)
+    matrix = stats.unstack("condition")
+    return matrix.reindex(columns=conditions_in_order(df), level="condition")
+
+
+def condition_summary(df, percentiles=PERCENTILES):
+    """One row per condition across all websites."""
+    g = df.groupby("condition")["rtt"]
+    summary = g.agg(["count", "mean", "median"])
+    for q in percentiles:
+        summary[f"p{q}"] = g.quantile(q / 100.0)
+    summary["sites"] = df.dropna(subset=["rtt"]).groupby("condition")["website"].nunique()
+    return summary.reindex(conditions_in_order(df))
+
+
+# ---------------------------------------------------------------
+# Same matrix and summary from the aggregate store, in O(sites × conditions).
+# ---------------------------------------------------------------
+def aggregate_tables(path, percentiles=PERCENTILES):
+    store = rtt_aggregates.open_for_csv(path)
+    quantiles = [0.5] + [q / 100.0 for q in percentiles]
+    labels = ["median"] + [f"p{q}" for q in percentiles]
+    rename = dict(zip([f"p{q * 100:g}" for q in quantiles], labels))
+    conds = sorted(store.conditions(), key=lambda c: c.lower() != "baseline")
+
+    cells = store.frame(quantiles).rename(columns=rename).sort_index()
+    matrix = cells[["mean", "median", "count"] + labels[1:]].unstack("condition")
+    matrix = matrix.reindex(columns=conds, level="condition")
+
+    summary = store.condition_frame(quantiles).rename(columns=rename)
+    summary = summary[["count", "mean", "median"] + labels[1:] + ["sites"]].reindex(conds)
+    return matrix, summary
 
-baseline_rtts = get_rtts(baseline)
-vpn1_rtts = get_rtts(vpn1)
-vpn2_rtts = get_rtts(vpn2)
-vpn3_rtts= get_rtts(vpn3)
 
 # ================================================================
 # CUSTOM PLOTTING FUNCTION
@@ -51,57 +128,93 @@ vpn3_rtts= get_rtts(vpn3)
 #   • Draws dotted lines interpolating across gaps so the trend is
 #     still visible while acknowledging missing measurements.
 #
+# Gaps are found in one pass: the bridges are exactly the pairs of
+# consecutive real points whose indices differ by more than one. All of a
+# series' bridges are drawn as a single LineCollection, so the figure has
+# two artists per series no matter how many sites are missing.
+#
 # This makes VPN comparisons clearer and avoids misleading drops.
 # ================================================================
-def plot_with_gap_dotted(x, y, label, color):
-    # Plot real (solid)
-    plt.plot(x, y, color=color, marker="o", linestyle="-", linewidth=2, label=label)
-
-    # Add dotted lines where data is missing
-    for i in range(len(y) - 1):
-        left = y[i]
-        right = y[i+1]
-
-        # One of them missing → dotted line
-        if np.isnan(left) or np.isnan(right):
-            # Find previous real point
-            prev_idx = i
-            while prev_idx >= 0 and np.isnan(y[prev_idx]):
-                prev_idx -= 1
-
-            # Find next real point
-            next_idx = i + 1
-            while next_idx < len(y) and np.isnan(y[next_idx]):
-                next_idx += 1
-
-            if prev_idx >= 0 and next_idx < len(y):
-                # Draw dotted line between real points around the missing region
-                plt.plot(
-                    [x[prev_idx], x[next_idx]],
-                    [y[prev_idx], y[next_idx]],
-                    linestyle="dotted",
-                    color=color,
-                    linewidth=2,
-                    alpha=0.7
-                )
-
-plt.figure(figsize=(22, 7))
-
-plot_with_gap_dotted(x, baseline_rtts, "Baseline", "blue")
-plot_with_gap_dotted(x, vpn1_rtts, "VPN1 (Argentina)", "orange")
-plot_with_gap_dotted(x, vpn2_rtts, "VPN2 (NewyYork)", "red")
-plot_with_gap_dotted(x, vpn3_rtts, "VPN3(france)", "purple")
-
-
-plt.xticks(x, websites, rotation=90)
-plt.ylabel("RTT (ms)")
-plt.title("Baseline vs VPN1 vs VPN2 RTT Comparison (Dotted = Missing Segment Interpolation)")
-plt.grid(alpha=0.3)
-plt.legend()
-
-os.makedirs("graphs", exist_ok=True)
-plt.tight_layout()
-plt.savefig("graphs/rtt_multiline_dotted_correct.png", dpi=300)
-
-print("SAVED → graphs/rtt_multiline_dotted_correct.png")
-
+def gap_bridges(x, y):
+    """(n, 2, 2) array of [[x0, y0], [x1, y1]] segments spanning each NaN run."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    real = np.flatnonzero(~np.isnan(y))
+    gaps = np.flatnonzero(np.diff(real) > 1)
+    left, right = real[gaps], real[gaps + 1]
+    return np.stack([np.column_stack([x[left], y[left]]),
+                     np.column_stack([x[right], y[right]])], axis=1)
+
+
+def plot_with_gap_dotted(x, y, label, color, ax=None):
+    ax = ax or plt.gca()
+    marker = "o" if len(y) <= MAX_MARKERS else None
+
+    # Plot real (solid); NaNs break the line by themselves
+    ax.plot(x, y, color=color, marker=marker, linestyle="-", linewidth=2, label=label)
+
+    # Dotted bridges between the real points around every missing region
+    segments = gap_bridges(x, y)
+    if len(segments):
+        ax.add_collection(LineCollection(segments, colors=color, linestyles="dotted",
+                                         linewidths=2, alpha=0.7))
+
+
+def plot_matrix(matrix, metric, outfile):
+    values = matrix[metric]
+    websites = list(values.index)
+    x = np.arange(len(websites))
+    colors = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+
+    plt.figure(figsize=(22, 7))
+    for i, cond in enumerate(values.columns):
+        plot_with_gap_dotted(x, values[cond].to_numpy(dtype=float), cond, colors[i % len(colors)])
+
+    step = max(1, -(-len(websites) // MAX_XTICKS))
+    plt.xticks(x[::step], websites[::step], rotation=90)
+    plt.ylabel(f"RTT {metric} (ms)")
+    plt.title(f"{' vs '.join(values.columns)} RTT Comparison (Dotted = Missing Segment Interpolation)")
+    plt.grid(alpha=0.3)
+    plt.legend(loc="upper left", ncol=max(1, len(values.columns) // 12))
+
+    os.makedirs(os.path.dirname(outfile) or ".", exist_ok=True)
+    plt.tight_layout()
+    plt.savefig(outfile, dpi=300)
+    plt.close()
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("input", nargs="?", default=DEFAULT_INPUT)
+    p.add_argument("--metric", default="mean",
+                   help="statistic to plot: mean, median or p<percentile>")
+    p.add_argument("--percentiles", type=int, nargs="*", default=list(PERCENTILES))
+    p.add_argument("--summary-csv", default=None,
+                   help="write the website × condition statistics matrix to this CSV")
+    p.add_argument("--out", default=DEFAULT_OUTPUT)
+    p.add_argument("--raw", action="store_true",
+                   help="re-read the whole CSV instead of the incremental aggregate store")
+    args = p.parse_args()
+
+    if args.raw or probe_log.is_probe_log(args.input):
+        df = load_rtts(args.input)
+        matrix = site_condition_matrix(df, args.percentiles)
+        summary = condition_summary(df, args.percentiles)
+    else:
+        matrix, summary = aggregate_tables(args.input, args.percentiles)
+    if args.metric not in matrix.columns.get_level_values(0):
+        p.error(f"unknown metric {args.metric}; choose from {sorted(set(matrix.columns.get_level_values(0)))}")
+
+    print(summary.round(2).to_string())
+    if args.summary_csv:
+        flat = matrix.copy()
+        flat.columns = [f"{cond}_{stat}" for stat, cond in flat.columns]
+        flat.to_csv(args.summary_csv)
+        print(f"SAVED → {args.summary_csv}")
+
+    plot_matrix(matrix, args.metric, args.out)
+    print(f"SAVED → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+ts_store.py
+-----------
+In-memory ring-buffer store for recent probe results, with a small local
+HTTP query API for dashboards.
+
+Everything else in this project writes CSVs that plotting scripts have to
+re-parse. TimeSeriesStore instead keeps the last `capacity` samples of
+every (target, mode) series in fixed, preallocated columns:
+
+    ts        array('d')   UNIX time
+    latency   array('d')   ms, NaN when the probe had no latency
+    status    array('B')   index into STATUSES
+
+so memory is 17 bytes per sample regardless of how long a monitor runs,
+and samples older than `retention` seconds are ignored by queries.
+Windowed aggregates (count, mean, p50/p90/p99, jitter, loss, errors) are
+computed with NumPy over the ring and take well under a millisecond per
+series.
+
+HTTP API (serve(), bound to 127.0.0.1 or a Unix socket):
+
+    GET  /series                                   every (target, mode) and its size
+    GET  /stats?target=T&mode=M&window=SECONDS     aggregates per matching series
+    GET  /samples?target=T&mode=M&window=SECONDS   raw recent samples
+    POST /samples   [[ts, target, mode, status, latency_ms], ...]   ingest
+
+monitor.py --serve PORT feeds a store directly; Trafficgen.py and
+collector.py can --push their results into a running store, and
+`python3 ts_store.py --port PORT` runs a standalone one.
+"""
+
+import argparse
+import json
+import math
+import os
+import socketserver
+import threading
+import time
+import urllib.request
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+import rtt_stats
+
+STATUSES = ("ok", "ok-reply", "lost", "no-reply", "sent", "error", "redirect")
+LOST = {"lost", "no-reply"}
+DEFAULT_CAPACITY = 4096         # samples per (target, mode)
+DEFAULT_RETENTION = 3600.0      # seconds
+DEFAULT_WINDOW = 60.0           # seconds
+DEFAULT_PORT = 8765
+
+_STATUS_CODE = {s: i for i, s in enumerate(STATUSES)}
+_LOST_CODES = [_STATUS_CODE[s] for s in LOST]
+
+
+class RingSeries:
+    """Fixed-capacity columns for one (target, mode); the oldest sample is overwritten."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = array("d", [0.0]) * capacity
+        self.latency = array("d", [math.nan]) * capacity
+        self.status = array("B", [0]) * capacity
+        self.head = 0       # next slot to write
+        self.size = 0
+
+    def append(self, ts, latency, status):
+        i = self.head
+        self.ts[i] = ts
+        self.latency[i] = math.nan if latency is None else latency
+        self.status[i] = _STATUS_CODE.get(status, _STATUS_CODE["error"])
+        self.head = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def window(self, since):
+        """(ts, latency, status) NumPy copies of samples newer than `since`, oldest first."""
+        start = (self.head - self.size) % self.capacity
+        order = np.r_[start:self.capacity, 0:start] if self.size == self.capacity \
+            else np.arange(start, start + self.size)
+        ts = np.frombuffer(self.ts, dtype=np.float64)[order]
+        keep = ts >= since
+        return (ts[keep],
+                np.frombuffer(self.latency, dtype=np.float64)[order][keep],
+                np.frombuffer(self.status, dtype=np.uint8)[order][keep])
+
+
+class TimeSeriesStore:
+    def __init__(self, capacity=DEFAULT_CAPACITY, retention=DEFAULT_RETENTION):
+        if np is None:
+            raise RuntimeError("numpy not installed")
+        self.capacity = capacity
+        self.retention = retention
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def append(self, target, mode, ts, latency, status):
+        key = (target, mode)
+        with self._lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = RingSeries(self.capacity)
+            s.append(ts, latency, status)
+
+    def extend(self, rows):
+        """rows: iterable of (ts, target, mode, status, latency_ms)."""
+        for ts, target, mode, status, latency in rows:
+            self.append(target, mode, ts, latency, status)
+
+    def _select(self, target=None, mode=None, window=DEFAULT_WINDOW):
+        since = time.time() - min(window or self.retention, self.retention)
+        with self._lock:
+            return [(key, s.window(since)) for key, s in self.series.items()
+                    if (target is None or key[0] == target) and (mode is None or key[1] == mode)]
+
+    def stats(self, target=None, mode=None, window=DEFAULT_WINDOW):
+        """Aggregates over the last `window` seconds for every matching series."""
+        out = []
+        for (t, m), (ts, latency, status) in self._select(target, mode, window):
+            rtts = latency[~np.isnan(latency)]
+            lost = int(np.isin(status, _LOST_CODES).sum())
+            summary = rtt_stats.summarize(rtts)
+            summary.update(
+                target=t, mode=m, samples=int(ts.size), lost=lost,
+                errors=int((status == _STATUS_CODE["error"]).sum()),
+                loss=lost / (rtts.size + lost) if rtts.size + lost else None,
+                first=float(ts[0]) if ts.size else None,
+                last=float(ts[-1]) if ts.size else None,
+            )
+            out.append(summary)
+        return out
+
+    def samples(self, target=None, mode=None, window=DEFAULT_WINDOW):
+        out = []
+        for (t, m), (ts, latency, status) in self._select(target, mode, window):
+            out.append({"target": t, "mode": m, "ts": ts.tolist(), "latency_ms": latency.tolist(),
+                        "status": [STATUSES[c] for c in status]})
+        return out
+
+    def keys(self):
+        with self._lock:
+            return [{"target": t, "mode": m, "size": s.size} for (t, m), s in self.series.items()]
+
+
+# -----------------------------------------------------------
+# HTTP QUERY API
+# -----------------------------------------------------------
+def _clean(value):
+    """NaN/inf are not valid JSON; send null instead."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _clean(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clean(v) for v in value]
+    return value
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _reply(self, code, body):
+        data = json.dumps(_clean(body)).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        store = self.server.store
+        try:
+            window = float(q.get("window", DEFAULT_WINDOW))
+        except ValueError:
+            return self._reply(400, {"error": "window must be a number"})
+        if url.path == "/series":
+            return self._reply(200, store.keys())
+        if url.path == "/stats":
+            return self._reply(200, store.stats(q.get("target"), q.get("mode"), window))
+        if url.path == "/samples":
+            return self._reply(200, store.samples(q.get("target"), q.get("mode"), window))
+        self._reply(404, {"error": f"unknown path {url.path}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/samples":
+            return self._reply(404, {"error": "POST only to /samples"})
+        try:
+            rows = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            self.server.store.extend(rows)
+        except (ValueError, TypeError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(200, {"ingested": len(rows)})
+
+    def log_message(self, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def serve(store, port=DEFAULT_PORT, host="127.0.0.1", unix_path=None):
+    """Start the query API on a daemon thread; returns the server (call shutdown() to stop)."""
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = _UnixHTTPServer(unix_path, _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+    server.store = store
+    threading.Thread(target=server.serve_forever, name="ts-store-api", daemon=True).start()
+    return server
+
+
+def push(url, rows, timeout=2.0):
+    """POST rows [(ts, target, mode, status, latency_ms), ...] to a running store."""
+    body = json.dumps(_clean([list(r) for r in rows])).encode()
+    req = urllib.request.Request(url.rstrip("/") + "/samples", data=body,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def main():
+    p = argparse.ArgumentParser(description="standalone ring-buffer store + query API")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--unix-socket", default=None, help="serve on this Unix socket instead")
+    p.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="samples kept per series")
+    p.add_argument("--retention", type=float, default=DEFAULT_RETENTION, help="seconds")
+    args = p.parse_args()
+    store = TimeSeriesStore(args.capacity, args.retention)
+    server = serve(store, args.port, unix_path=args.unix_socket)
+    print(f"Serving on {args.unix_socket or f'http://127.0.0.1:{args.port}'} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()